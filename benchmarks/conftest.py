@@ -0,0 +1,39 @@
+from pathlib import Path
+
+import docker
+import pytest
+
+from starpack.client import StarpackClient
+from starpack.testing import use_app_dir
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+pytest.importorskip("pytest_benchmark")
+
+ENGINE_LATENCY = 0.001
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path: Path, monkeypatch) -> Path:
+    app_dir = tmp_path / "app_dir"
+    use_app_dir(monkeypatch, app_dir)
+    return app_dir
+
+
+@pytest.fixture
+def fake_docker(monkeypatch) -> FakeDockerClient:
+    docker_client = FakeDockerClient()
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    return docker_client
+
+
+@pytest.fixture
+def local_engine(fake_docker: FakeDockerClient):
+    with LocalEngine(latency=ENGINE_LATENCY) as engine:
+        fake_docker.add_engine(engine)
+        yield engine
+
+
+@pytest.fixture
+def engine_client(local_engine: LocalEngine) -> StarpackClient:
+    return StarpackClient(start=True, docker=True)
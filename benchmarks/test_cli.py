@@ -0,0 +1,35 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from starpack.testing.importtime import (
+    COMMAND_BUDGETS,
+    CommandBudget,
+    profile_command,
+    starpack_command,
+)
+
+SOURCE_DIR = Path(__file__).resolve().parents[1] / "src"
+
+
+@pytest.mark.parametrize(
+    "budget", COMMAND_BUDGETS, ids=[budget.name for budget in COMMAND_BUDGETS]
+)
+def test_cli_cold_start(benchmark, budget: CommandBudget, tmp_path: Path):
+    """Wall time of a fresh `starpack` process, up to where it would reach Docker, with its import time alongside"""
+    command, env = starpack_command(budget.args, tmp_path)
+
+    benchmark.pedantic(
+        subprocess.run,
+        args=(command,),
+        kwargs={
+            "cwd": SOURCE_DIR,
+            "env": env,
+            "stdout": subprocess.DEVNULL,
+            "stderr": subprocess.DEVNULL,
+        },
+        rounds=5,
+        warmup_rounds=1,
+    )
+    benchmark.extra_info["import_ms"] = profile_command(budget.args, tmp_path).total_ms
@@ -0,0 +1,154 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import shutil
+
+import pytest
+
+from starpack import core
+from starpack._config import settings
+from starpack.client import StarpackClient
+from starpack.testing import fake_docker
+from starpack.testing.engine import LocalEngine
+
+EXAMPLE_DIR = (
+    Path(__file__).resolve().parents[1] / "examples" / "starpack_basic_example"
+)
+
+TREES = {
+    # name: (number of files, size of each file)
+    "many_small_files": (2000, 4 * 1024),
+    "few_huge_files": (2, 64 * 1024 * 1024),
+}
+
+
+@pytest.fixture(params=list(TREES))
+def artifact_tree(request, tmp_path: Path) -> Path:
+    files, size = TREES[request.param]
+    tree = tmp_path / request.param
+    for index in range(files):
+        path = tree / f"dir_{index % 20}" / f"file_{index}.bin"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(size))
+    return tree
+
+
+def test_upload_artifacts_throughput(
+    benchmark, engine_client: StarpackClient, artifact_tree: Path
+):
+    """Full uploads of a whole tree through the streaming archive into a container that discards the data"""
+    engine_client.engine.keep_files = False
+
+    benchmark.pedantic(
+        engine_client.upload_artifacts,
+        args=(artifact_tree,),
+        kwargs={"full": True},
+        rounds=3,
+    )
+
+    if benchmark.stats:
+        total_bytes = sum(
+            path.stat().st_size for path in artifact_tree.rglob("*") if path.is_file()
+        )
+        benchmark.extra_info["MB/s"] = total_bytes / benchmark.stats.stats.mean / 2**20
+
+
+def test_chunked_upload_throughput(
+    benchmark, local_engine: LocalEngine, artifact_tree: Path
+):
+    """Full uploads of a whole tree over HTTP in checksummed chunks, as to a remote engine"""
+    client = StarpackClient(host=local_engine.url, port=None)
+
+    benchmark.pedantic(
+        client.upload_artifacts, args=(artifact_tree,), kwargs={"full": True}, rounds=3
+    )
+
+    if benchmark.stats:
+        total_bytes = sum(
+            path.stat().st_size for path in artifact_tree.rglob("*") if path.is_file()
+        )
+        benchmark.extra_info["MB/s"] = total_bytes / benchmark.stats.stats.mean / 2**20
+
+
+def test_upload_artifacts_unchanged(
+    benchmark, engine_client: StarpackClient, artifact_tree: Path
+):
+    """Repeated uploads of a tree that did not change, which only compare manifests"""
+    engine_client.upload_artifacts(artifact_tree)
+
+    benchmark(engine_client.upload_artifacts, artifact_tree)
+
+
+@pytest.mark.parametrize("unrelated_containers", [0, 500])
+@pytest.mark.parametrize("registered", [True, False], ids=["registry", "discovery"])
+def test_engine_discovery(
+    benchmark,
+    fake_docker: fake_docker.FakeDockerClient,
+    local_engine: LocalEngine,
+    unrelated_containers: int,
+    registered: bool,
+    app_dir: Path,
+):
+    """Connecting to an already running engine on a busy host"""
+    fake_docker.add_unrelated_containers(unrelated_containers)
+    StarpackClient(start=True, docker=True)
+
+    def connect():
+        if not registered:
+            (app_dir / "engines.json").unlink()
+        return StarpackClient(start=True, docker=True)
+
+    client = benchmark(connect)
+    assert client.port == str(local_engine.port)
+
+
+def test_deploy_directory_end_to_end(
+    benchmark, local_engine: LocalEngine, tmp_path: Path
+):
+    """`deploy_directory` on the basic example against an engine with a millisecond of latency per request"""
+    project = tmp_path / "starpack_basic_example"
+    shutil.copytree(EXAMPLE_DIR, project)
+
+    benchmark(core.deploy_directory, project)
+
+    posted = [path for method, path, _ in local_engine.requests if method == "POST"]
+    assert "/deploy" in posted
+
+
+@pytest.mark.parametrize("replicas", [1, 4])
+def test_package_throughput_by_replicas(
+    benchmark, fake_docker: fake_docker.FakeDockerClient, replicas: int, monkeypatch
+):
+    """Eight package jobs at a time against a pool of engines that each build one package at a time"""
+    monkeypatch.setattr(settings, "pull_image", False)
+    engines = [
+        LocalEngine(step_seconds=0.05, max_jobs=1).start() for _ in range(replicas)
+    ]
+    fake_docker.engine_ports.extend(engine.port for engine in engines[1:])
+    client = StarpackClient(
+        port=engines[0].port, start=True, docker=True, replicas=replicas
+    )
+    payloads = [
+        {
+            "package": {
+                "metadata": {"name": f"model_{index}"},
+                "steps": [{"name": "fastapi"}],
+            }
+        }
+        for index in range(8)
+    ]
+
+    def package_all():
+        with ThreadPoolExecutor(max_workers=len(payloads)) as executor:
+            return list(executor.map(client.package, payloads))
+
+    try:
+        results = benchmark.pedantic(package_all, rounds=3)
+    finally:
+        client.close()
+        for engine in engines:
+            engine.stop()
+
+    assert all(results)
+    if benchmark.stats:
+        benchmark.extra_info["jobs/s"] = len(payloads) / benchmark.stats.stats.mean
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pytest
+import requests
+
+from starpack.prediction import PredictionClient
+from starpack.scoring import BatchScorer
+from starpack.tabular import TableWriter, read_chunks
+from starpack.wire import encode_csv
+from starpack.testing.model import LocalModel
+
+ROWS = 20_000
+CHUNK_ROWS = 500
+MODEL_LATENCY = 0.01
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_predict_throughput_by_concurrency(benchmark, tmp_path: Path, concurrency: int):
+    """Scores a 20,000 row CSV against a model that takes 10ms a request"""
+    input_path = tmp_path / "input.csv"
+    input_path.write_text(
+        "id,x,y\n" + "".join(f"{row},{row * 0.5},{row % 7}\n" for row in range(ROWS))
+    )
+
+    def score():
+        with BatchScorer(model.predict_url, concurrency=concurrency) as scorer:
+            with TableWriter(tmp_path / "output.csv") as writer:
+                return scorer.score(read_chunks(input_path, CHUNK_ROWS), writer)
+
+    with LocalModel(latency=MODEL_LATENCY) as model:
+        report = benchmark.pedantic(score, rounds=3)
+
+    assert report.rows == ROWS
+    if benchmark.stats:
+        benchmark.extra_info["rows/s"] = ROWS / benchmark.stats.stats.mean
+
+
+@pytest.mark.parametrize("client", ["fresh-csv-upload", "prediction-client"])
+def test_single_row_latency(benchmark, client: str):
+    """One row predicted at a time, as interfaces do for each click"""
+    record = {"age": 62, "sex": 0, "cp": 0, "trestbps": 124, "chol": 209}
+    body = encode_csv(list(record), [list(record.values())])
+
+    with LocalModel() as model, PredictionClient(model.predict_url) as prediction:
+        if client == "prediction-client":
+            result = benchmark(prediction.predict, record)
+            assert result["prediction"] == 395
+        else:
+            # A new connection and a CSV upload per row, as the interface scripts used to
+            response = benchmark(
+                requests.post,
+                model.predict_url,
+                files={"file": ("test.csv", body, "application/vnd.ms-excel")},
+            )
+            assert response.ok
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from starpack.tabular import decode_table, encode_table
+from starpack.wire import ARROW_TYPE, CSV_TYPE, JSON_TYPE, PARQUET_TYPE
+
+ROWS = 100_000
+# The features of the heart disease example, all numeric
+COLUMNS = [
+    "age",
+    "sex",
+    "cp",
+    "trestbps",
+    "chol",
+    "fbs",
+    "restecg",
+    "thalach",
+    "exang",
+    "oldpeak",
+    "slope",
+    "ca",
+    "thal",
+]
+
+
+@pytest.fixture(scope="module")
+def rows():
+    generator = random.Random(1976)
+    return [
+        [generator.randint(0, 300) for _ in COLUMNS[:9]]
+        + [round(generator.uniform(0, 6), 1)]
+        + [generator.randint(0, 4) for _ in COLUMNS[10:]]
+        for _ in range(ROWS)
+    ]
+
+
+@pytest.mark.parametrize(
+    "media_type",
+    [CSV_TYPE, JSON_TYPE, ARROW_TYPE, PARQUET_TYPE],
+    ids=["csv", "json", "arrow", "parquet"],
+)
+def test_wire_format_round_trip(benchmark, rows, media_type: str):
+    """Encodes and decodes 100,000 rows of the heart disease features, as a prediction request does"""
+    if media_type in (ARROW_TYPE, PARQUET_TYPE):
+        pytest.importorskip("pyarrow")
+
+    def round_trip():
+        data = encode_table(COLUMNS, rows, media_type)
+        return data, decode_table(data, media_type)
+
+    data, (columns, decoded) = benchmark.pedantic(round_trip, rounds=3)
+
+    assert columns == COLUMNS and len(decoded) == ROWS
+    if benchmark.stats:
+        benchmark.extra_info["seconds per 1M rows"] = (
+            benchmark.stats.stats.mean * 1_000_000 / ROWS
+        )
+        benchmark.extra_info["bytes per row"] = len(data) / ROWS
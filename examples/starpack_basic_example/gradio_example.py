@@ -1,35 +1,32 @@
+import os
+
 import gradio as gr
-import pandas as pd
-import requests
-import io
+from starpack.prediction import PREDICT_URL_ENV, PredictionClient
+
+# One client for the whole app: it keeps its connection to the model open, and sends the rows of clicks that come in
+# within 5ms of each other together
+client = PredictionClient(os.environ.get(PREDICT_URL_ENV, "http://localhost/models/predict/starpack_deployment"),
+                          batch_window=0.005)
 
 
 def predict(age, sex, chest_pain, resting_blood_pressure, cholesterol, fbs, restecg, thalach, exang, oldpeak, slope, ca,
             thal):
-    df = pd.DataFrame([{"age": age,
-                        "sex": int(sex[0]),
-                        "cp": int(chest_pain[0]),
-                        "trestbps": resting_blood_pressure,
-                        "chol": cholesterol,
-                        "fbs": int(fbs),
-                        "restecg": int(restecg[0]),
-                        "thalach": thalach,
-                        "exang": int(exang),
-                        "oldpeak": oldpeak,
-                        "slope": int(slope[0]),
-                        "ca": ca,
-                        "thal": int(thal[0]),
-                        }])
-
-    bytes_input = df.to_csv(index=False).encode()
-    request_file = {"file": (f"test.csv", bytes_input, "application/vnd.ms-excel")}
-
-    output_response = requests.post("http://localhost/models/predict/starpack_deployment", files=request_file)
-    print(output_response.text)
-
-    prediction = bool(pd.read_csv(io.StringIO(output_response.text))["tgt_heart_disease"][0])
-
-    return str(prediction)
+    prediction = client.predict({"age": age,
+                                 "sex": int(sex[0]),
+                                 "cp": int(chest_pain[0]),
+                                 "trestbps": resting_blood_pressure,
+                                 "chol": cholesterol,
+                                 "fbs": int(fbs),
+                                 "restecg": int(restecg[0]),
+                                 "thalach": thalach,
+                                 "exang": int(exang),
+                                 "oldpeak": oldpeak,
+                                 "slope": int(slope[0]),
+                                 "ca": ca,
+                                 "thal": int(thal[0]),
+                                 })
+
+    return str(bool(prediction["tgt_heart_disease"]))
 
 
 gradio_app = gr.Interface(fn=predict,
@@ -1,10 +1,23 @@
 __version__ = "0.2.1"
 
-from starpack.core import (
-    upload,
-    initialize_directory,
-    terminate,
-    package_directory,
-    deploy_directory,
-    initialize_engine,
-)
+# The public API is imported from its module the first time one of these names is used, so that importing
+# `starpack` (and running commands that don't need the Docker and HTTP clients) stays fast.
+_LAZY_EXPORTS = {
+    "upload": "starpack.core",
+    "initialize_directory": "starpack.initialize",
+    "terminate": "starpack.core",
+    "package_directory": "starpack.core",
+    "deploy_directory": "starpack.core",
+    "initialize_engine": "starpack.core",
+}
+
+__all__ = ["__version__", *_LAZY_EXPORTS]
+
+
+def __getattr__(name: str):
+    if name in _LAZY_EXPORTS:
+        from importlib import import_module
+
+        return getattr(import_module(_LAZY_EXPORTS[name]), name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
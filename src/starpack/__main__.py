@@ -1,19 +1,16 @@
 from pathlib import Path
+from typing import List, Optional
 from rich import print
-from rich.pretty import pprint
 
 import typer
 
-from starpack import (
-    __version__,
-    upload,
-    initialize_directory,
-    initialize_engine,
-    terminate,
-    package_directory,
-    deploy_directory,
-)
-from starpack._config import settings
+from starpack import __version__
+from starpack.scoring import DEFAULT_CONCURRENCY, DEFAULT_RETRIES
+from starpack.tabular import DEFAULT_CHUNK_ROWS
+
+# Each command imports what it needs when it runs, so that commands such as `--version` and `init` don't pay for
+# loading the Docker and HTTP clients. Only the defaults of options come from modules imported up front, and those
+# modules are quick to import.
 
 app = typer.Typer(pretty_exceptions_show_locals=False)
 
@@ -25,6 +22,17 @@ app.add_typer(
     help="Commands to control and manipulate the Starpack Engine itself.",
 )
 
+# Proxies in front of replicated deployments, which deploy starts in the background
+
+proxy_app = typer.Typer(pretty_exceptions_show_locals=False)
+
+app.add_typer(
+    proxy_app,
+    name="proxy",
+    help="Proxies spreading connections across the replicas of a deployment.",
+    hidden=True,
+)
+
 # Config app for changing config
 
 config_app = typer.Typer(pretty_exceptions_show_locals=False)
@@ -42,6 +50,9 @@ def cmd_view_config():
     """
     View a pretty-printed version of the config, found
     """
+    from rich.pretty import pprint
+    from starpack._config import settings
+
     pprint(settings, expand_all=True)
 
 
@@ -52,14 +63,69 @@ def cmd_start_engine(
         "--force",
         "-F",
         help="Force a removal of all older starpack-engine containers",
-    )
+    ),
+    replicas: Optional[int] = typer.Option(
+        None,
+        "--replicas",
+        "-r",
+        min=1,
+        help="Number of engines to run as a pool, between which package and deploy jobs are spread",
+    ),
 ):
     """
     Starts the Starpack Engine. If given a custom Docker image name, will attempt to run it instead.
     If `force` is passed, will remove any existing containers and ensure that the latest version is pulled.
+    With `replicas`, starts a pool of engines sharing the artifacts volume.
     """
+    from starpack.core import initialize_engine
 
-    initialize_engine(force=force)
+    initialize_engine(force=force, replicas=replicas)
+
+
+@engine_app.command(name="status")
+def cmd_engine_status() -> None:
+    """
+    Shows the Starpack Engine containers, including the standby kept ready for the next start, and how long the
+    engine took to start.
+    """
+    from starpack.core import engine_status
+
+    engine_status()
+
+
+@engine_app.command(name="standby", hidden=True)
+def cmd_engine_standby() -> None:
+    """
+    Prepares a standby Starpack Engine for the next start, as set by the engine_standby setting.
+    """
+    from starpack.core import prepare_standby
+
+    prepare_standby()
+
+
+@engine_app.command(name="reap", hidden=True)
+def cmd_engine_reap(
+    wait: bool = typer.Option(
+        True, help="Wait out the idle timeout before looking for idle engines"
+    )
+) -> None:
+    """
+    Shuts down the Starpack Engines that no Starpack process has used for the engine_idle_timeout setting.
+    """
+    from starpack.core import reap_idle_engines
+
+    reap_idle_engines(wait=wait)
+
+
+@engine_app.command(name="pull")
+def cmd_engine_pull() -> None:
+    """
+    Checks the registry for a newer Starpack Engine image and pulls it if there is one. The next start of the engine
+    uses it.
+    """
+    from starpack.core import pull_engine_image
+
+    pull_engine_image()
 
 
 @engine_app.command(name="terminate")
@@ -71,10 +137,57 @@ def cmd_engine_terminate(
     """
     Terminates and removes the Starpack Engine container and optionally removes all associated data.
     """
+    from starpack.core import terminate
 
     terminate(all_resources=all_resources)
 
 
+def size_callback(size: Optional[str]) -> Optional[int]:
+    """
+    Parses a size option such as "10GB" into bytes
+    """
+    from starpack.store import parse_size
+
+    if size is None:
+        return None
+    try:
+        return parse_size(size)
+    except ValueError as error:
+        raise typer.BadParameter(str(error))
+
+
+def compression_callback(compression: Optional[str]) -> Optional[str]:
+    """
+    Checks the upload compression mode
+    """
+    from starpack.compression import COMPRESSION_MODES
+
+    if compression is not None and compression not in COMPRESSION_MODES:
+        raise typer.BadParameter(f"must be one of {', '.join(COMPRESSION_MODES)}")
+    return compression
+
+
+@engine_app.command(name="gc")
+def cmd_engine_gc(
+    max_size: Optional[str] = typer.Option(
+        None,
+        "--max-size",
+        callback=size_callback,
+        help="Size the artifact store should fit in, such as 10GB. Defaults to the artifact_store_max_size setting.",
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Only report what would be removed"
+    ),
+) -> None:
+    """
+    Removes artifacts that no project uses anymore from the Starpack Engine, least recently used first, until the
+    artifact store fits in its quota, and reports how much space each project uses.
+    """
+    from starpack.core import collect_garbage
+
+    collect_garbage(max_size=max_size, dry_run=dry_run)
+
+
 def version_callback(give_version: bool) -> None:
     """
     Returns the current version of Starpack
@@ -99,13 +212,45 @@ def main(
 
 
 @app.command(name="upload")
-def cmd_upload(directory: Path = typer.Argument(Path("."))) -> None:
+def cmd_upload(
+    directory: Path = typer.Argument(Path(".")),
+    full: bool = typer.Option(
+        False,
+        "--full",
+        help="Upload every file instead of only the files changed since the last upload",
+    ),
+    strict: bool = typer.Option(
+        False,
+        "--strict",
+        help="Only upload the files referenced by the artifacts of the `starpack.yaml`",
+    ),
+    chunked: bool = typer.Option(
+        False,
+        "--chunked",
+        help="Send files over HTTP in resumable, checksummed chunks, as is done for remote engines",
+    ),
+    compression: Optional[str] = typer.Option(
+        None,
+        "--compression",
+        callback=compression_callback,
+        help="Compression for files sent over HTTP: auto, zstd, gzip, or none. Defaults to the upload_compression setting.",
+    ),
+) -> None:
     """
     Command to upload the contents of a local directory to the Starpack Engine
 
-    `directory` should be a path that exists on your local host machine.
+    `directory` should be a path that exists on your local host machine. Files matching the patterns of a
+    `.starpackignore` are left out.
     """
-    upload(directory=directory)
+    from starpack.core import upload
+
+    upload(
+        directory=directory,
+        full=full,
+        strict=strict,
+        chunked=chunked or None,
+        compression=compression,
+    )
 
 
 @app.command(name="init")
@@ -119,6 +264,7 @@ def cmd_init(
     Initializes the given directory with starter code, an example
     requirements.txt, and an example starpack.yaml
     """
+    from starpack.initialize import initialize_directory
 
     initialize_directory(
         directory=directory,
@@ -127,20 +273,265 @@ def cmd_init(
 
 
 @app.command(name="package")
-def cmd_package(package_path: Path = typer.Argument(Path("."))) -> None:
+def cmd_package(
+    package_paths: Optional[List[Path]] = typer.Argument(
+        None,
+        help="Directories, glob patterns of directories, or a starpack.yaml to package. Defaults to the current directory.",
+    ),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        help="Number of projects to upload and package at once when given several directories",
+    ),
+    detach: bool = typer.Option(
+        False,
+        "--detach",
+        "-d",
+        help="Submit the package job without following its logs, for a single project",
+    ),
+    attach: Optional[str] = typer.Option(
+        None,
+        "--attach",
+        help="Reattach to a running package job by ID ('last' for the most recent one) instead of packaging",
+    ),
+    strict: bool = typer.Option(
+        False,
+        "--strict",
+        help="Only upload the files referenced by the artifacts of the `starpack.yaml`",
+    ),
+    force: bool = typer.Option(
+        False,
+        "--force",
+        "-F",
+        help="Package even if an image was already built from the same spec and artifacts",
+    ),
+) -> None:
     """
     Given a directory, uploads the contents and passes through the contained `starpack.yaml`; given a file, passes as a
-    payload as the `yaml` file.
+    payload as the `yaml` file. Given several directories, packages them all against one engine and prints a summary.
     """
-    package_directory(package_path)
+    from starpack.core import (
+        attach_package_job,
+        package_directories,
+        package_directory,
+    )
+    from starpack.utils import is_glob
+
+    if attach:
+        if not attach_package_job(None if attach == "last" else attach):
+            raise typer.Exit(1)
+        return
+
+    package_paths = package_paths or [Path(".")]
+
+    if len(package_paths) == 1 and not is_glob(package_paths[0]):
+        package_directory(package_paths[0], detach=detach, strict=strict, force=force)
+        return
+    if detach:
+        # Only one job is kept to reattach to, and the summary needs every build to finish
+        raise typer.BadParameter(
+            "can only be given with a single project", param_hint="--detach"
+        )
+
+    results = package_directories(package_paths, jobs=jobs, strict=strict, force=force)
+    if not all(result.succeeded for result in results):
+        raise typer.Exit(1)
 
 
 @app.command(name="deploy")
-def cmd_deploy(deploy_path: Path = typer.Argument(Path("."))) -> None:
+def cmd_deploy(
+    deploy_path: Path = typer.Argument(Path(".")),
+    strict: bool = typer.Option(
+        False,
+        "--strict",
+        help="Only upload the files referenced by the artifacts of the `starpack.yaml`",
+    ),
+    force: bool = typer.Option(
+        False,
+        "--force",
+        "-F",
+        help="Package and redeploy even if nothing changed since the last deploy",
+    ),
+    plan: bool = typer.Option(
+        False,
+        "--plan",
+        help="Only show what would change in the running deployment",
+    ),
+    replicas: Optional[int] = typer.Option(
+        None,
+        "--replicas",
+        "-r",
+        min=1,
+        help="Number of containers to run for each wrapper, behind a local proxy on the wrapper's port",
+    ),
+) -> None:
     """
     Given a starpack.yaml, deploys a Starpack Package into the environment designated within.
     """
-    deploy_directory(deploy_path)
+    if plan:
+        from starpack.core import plan_deploy
+
+        plan_deploy(deploy_path, strict=strict, force=force, replicas=replicas)
+        return
+
+    from starpack.core import deploy_directory
+
+    deploy_directory(deploy_path, strict=strict, force=force, replicas=replicas)
+
+
+@app.command(name="predict")
+def cmd_predict(
+    deployment: str = typer.Argument(
+        ..., help="Name of a local deployment, or the URL of a deployment"
+    ),
+    input_path: Path = typer.Argument(
+        ...,
+        exists=True,
+        dir_okay=False,
+        help="CSV, JSON Lines, or Parquet file to score",
+    ),
+    output_path: Optional[Path] = typer.Option(
+        None,
+        "--output",
+        "-o",
+        help="Where to write the predictions, as CSV, JSON Lines, or Parquet by its extension",
+    ),
+    model: Optional[str] = typer.Option(
+        None,
+        "--model",
+        "-m",
+        help="Package name of the model, if the URL doesn't give it",
+    ),
+    chunk_rows: int = typer.Option(
+        DEFAULT_CHUNK_ROWS, "--chunk-rows", min=1, help="Rows sent in each request"
+    ),
+    concurrency: int = typer.Option(
+        DEFAULT_CONCURRENCY,
+        "--concurrency",
+        "-c",
+        min=1,
+        help="Requests in flight at once",
+    ),
+    retries: int = typer.Option(
+        DEFAULT_RETRIES, "--retries", min=0, help="Times to try a failed chunk again"
+    ),
+    wire_format: str = typer.Option(
+        "auto",
+        "--wire-format",
+        help="Format to send rows in: csv, json, arrow, parquet, or auto for Arrow when pyarrow is installed",
+    ),
+) -> None:
+    """
+    Scores a file against a deployed model in chunks, writing the predictions in the order of the input.
+    """
+    from starpack.core import predict
+
+    predict(
+        deployment,
+        input_path,
+        output_path=output_path,
+        model=model,
+        chunk_rows=chunk_rows,
+        concurrency=concurrency,
+        retries=retries,
+        wire_format=wire_format,
+    )
+
+
+@app.command(name="bench")
+def cmd_bench(
+    deployment: str = typer.Argument(
+        ..., help="Name of a local deployment, or the URL of a deployment"
+    ),
+    project_dir: Path = typer.Option(
+        Path("."),
+        "--project",
+        "-p",
+        help="Project whose `validation_data` artifact holds the rows to send",
+    ),
+    data_path: Optional[Path] = typer.Option(
+        None,
+        "--data",
+        "-d",
+        exists=True,
+        dir_okay=False,
+        help="CSV, JSON Lines, or Parquet file of rows to send instead",
+    ),
+    model: Optional[str] = typer.Option(
+        None,
+        "--model",
+        "-m",
+        help="Package name of the model, if the URL doesn't give it",
+    ),
+    rate: Optional[float] = typer.Option(
+        None,
+        "--rate",
+        "-r",
+        min=0.1,
+        help="Requests to send per second, whatever the latency. Without it, requests are sent closed loop",
+    ),
+    concurrency: Optional[int] = typer.Option(
+        None,
+        "--concurrency",
+        "-c",
+        min=1,
+        help="Requests in flight at once, closed loop",
+    ),
+    duration: Optional[float] = typer.Option(
+        None, "--duration", min=0.1, help="Seconds to send requests for"
+    ),
+    requests: Optional[int] = typer.Option(
+        None, "--requests", "-n", min=1, help="Stop after this many requests"
+    ),
+    output_path: Optional[Path] = typer.Option(
+        None,
+        "--output",
+        "-o",
+        help="Where to save the JSON report, <deployment>_bench.json by default",
+    ),
+    compare_path: Optional[Path] = typer.Option(
+        None,
+        "--compare",
+        exists=True,
+        dir_okay=False,
+        help="JSON report of an earlier run to compare with",
+    ),
+    label: Optional[str] = typer.Option(
+        None,
+        "--label",
+        "-l",
+        help="Name of this run in reports, like a build or commit",
+    ),
+) -> None:
+    """
+    Load tests a deployment with rows of validation data, reporting its throughput, error rate, and latency percentiles.
+    """
+    from starpack.core import bench
+
+    bench(
+        deployment,
+        project_dir=project_dir,
+        data_path=data_path,
+        model=model,
+        rate=rate,
+        concurrency=concurrency,
+        duration=duration,
+        requests=requests,
+        output_path=output_path,
+        compare_path=compare_path,
+        label=label,
+    )
+
+
+@proxy_app.command(name="serve")
+def cmd_proxy_serve(name: str = typer.Argument(...)) -> None:
+    """
+    Serves the proxy of a replicated wrapper until its deployment stops it.
+    """
+    from starpack.proxy import ProxyServer
+
+    ProxyServer(name).run()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,9 @@
 from pathlib import Path
 import typer
-from pydantic import BaseSettings, root_validator
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from starpack._settings import Settings
 
 # Configuration for the app name
 APP_NAME = "starpack"
@@ -9,30 +11,32 @@ APP_DIR = Path(typer.get_app_dir(APP_NAME))
 ENV_FILE = APP_DIR / "starpack.config"
 BASE_DIR = Path(__file__).resolve().parent
 
-# Generate the configuration folder and file if it doesn't exist
-APP_DIR.mkdir(exist_ok=True, parents=True)
-ENV_FILE.touch()
+_settings: Optional["Settings"] = None
+
+
+def get_settings() -> "Settings":
+    """
+    Loads the settings on first use, generating the configuration folder and file if they don't exist
+    """
+    global _settings
 
+    if _settings is None:
+        from starpack._settings import Settings
 
-class Settings(BaseSettings):
-    engine_port: int = 1976
-    engine_image: str = "starpack/starpack-engine:latest"
-    pull_image: bool = True
-    app_name: str = APP_NAME
-    app_dir: Path = APP_DIR
-    plugins_dir: Optional[Path] = None
+        APP_DIR.mkdir(exist_ok=True, parents=True)
+        ENV_FILE.touch()
+        _settings = Settings()
 
-    @root_validator
-    def ensure_plugins_dir(cls, values):
-        if not values["plugins_dir"]:
-            values["plugins_dir"] = values["app_dir"] / "plugins"
-        values["plugins_dir"].mkdir(exist_ok=True, parents=True)
+    return _settings
 
-        return values
 
-    class Config:
-        env_file = str(ENV_FILE)
-        env_file_encoding = "utf-8"
+def __getattr__(name: str):
+    # `settings` and `Settings` are resolved lazily to keep pydantic and the filesystem out of import time
+    if name == "settings":
+        return get_settings()
+    if name == "Settings":
+        from starpack._settings import Settings
 
+        return Settings
 
-settings = Settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,63 @@
+from pathlib import Path
+from pydantic import BaseSettings, root_validator, validator
+from typing import Optional
+
+from starpack._config import APP_DIR, APP_NAME, ENV_FILE
+
+# How a standby engine is kept ready for the next start: not at all, as a created container, or as a started and
+# paused one
+STANDBY_MODES = ("off", "created", "paused")
+
+
+class Settings(BaseSettings):
+    engine_port: int = 1976
+    engine_image: str = "starpack/starpack-engine:latest"
+    pull_image: bool = True
+    pull_policy: str = "ttl"
+    pull_ttl: float = 24 * 60 * 60
+    pull_in_background: bool = True
+    engine_startup_timeout: float = 60.0
+    engine_standby: str = "off"
+    engine_idle_timeout: float = 0.0
+    engine_replicas: int = 1
+    proxy_drain_timeout: float = 30.0
+    artifact_store_max_size: str = "10GB"
+    upload_compression: str = "auto"
+    app_name: str = APP_NAME
+    app_dir: Path = APP_DIR
+    plugins_dir: Optional[Path] = None
+
+    @validator("pull_policy")
+    def check_pull_policy(cls, value):
+        from starpack.pulls import PULL_POLICIES
+
+        if value not in PULL_POLICIES:
+            raise ValueError(f"must be one of {', '.join(PULL_POLICIES)}")
+
+        return value
+
+    @validator("engine_standby")
+    def check_engine_standby(cls, value):
+        if value not in STANDBY_MODES:
+            raise ValueError(f"must be one of {', '.join(STANDBY_MODES)}")
+
+        return value
+
+    @validator("engine_replicas")
+    def check_engine_replicas(cls, value):
+        if value < 1:
+            raise ValueError("must be at least 1")
+
+        return value
+
+    @root_validator
+    def ensure_plugins_dir(cls, values):
+        if not values["plugins_dir"]:
+            values["plugins_dir"] = values["app_dir"] / "plugins"
+        values["plugins_dir"].mkdir(exist_ok=True, parents=True)
+
+        return values
+
+    class Config:
+        env_file = str(ENV_FILE)
+        env_file_encoding = "utf-8"
@@ -0,0 +1,158 @@
+from io import BytesIO
+from pathlib import Path
+from queue import Empty, Full, Queue
+import tarfile
+from threading import Event, Thread
+from time import perf_counter, time
+from typing import Any, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+CHUNK_SIZE = 1024 * 1024
+MAX_QUEUED_CHUNKS = 8
+
+
+class HardLink(NamedTuple):
+    """
+    Archive member contents that link to another path, relative to where the archive is extracted
+    """
+
+    target: str
+
+
+# Archive members are given as (name in archive, file on disk, in-memory contents, or a hard link)
+ArchiveMember = Tuple[str, Union[Path, bytes, HardLink]]
+
+
+class _QueueWriter:
+    """
+    File-like object that hands written data over to a bounded queue in fixed-size chunks
+    """
+
+    def __init__(self, queue: Queue, cancelled: Event, chunk_size: int) -> None:
+        self.queue = queue
+        self.cancelled = cancelled
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.chunk_size:
+            self._put(bytes(self.buffer[: self.chunk_size]))
+            del self.buffer[: self.chunk_size]
+        return len(data)
+
+    def flush(self) -> None:
+        if self.buffer:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+
+    def _put(self, item: Optional[bytes]) -> None:
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+        raise InterruptedError("The archive stream was closed")
+
+
+class TarStream:
+    """
+    Builds a tar archive in a background thread and yields it in chunks while it is being written, so that archiving
+    overlaps with the transfer and only a bounded number of chunks is held in memory, regardless of the archive size.
+    Once iterated, `bytes_sent`, `elapsed`, and `throughput` describe the transfer.
+    """
+
+    def __init__(
+        self,
+        members: Iterable[ArchiveMember],
+        chunk_size: int = CHUNK_SIZE,
+        max_queued_chunks: int = MAX_QUEUED_CHUNKS,
+    ) -> None:
+        self.members = members
+        self.chunk_size = chunk_size
+        self.bytes_sent = 0
+        self.elapsed = 0.0
+
+        self._queue: Queue = Queue(maxsize=max_queued_chunks)
+        self._cancelled = Event()
+        self._error: Optional[BaseException] = None
+        self._thread = Thread(target=self._write_archive, daemon=True)
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._thread.start()
+        start = perf_counter()
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    break
+                self.bytes_sent += len(chunk)
+                yield chunk
+        finally:
+            self.elapsed = perf_counter() - start
+            self.close()
+
+        if self._error is not None:
+            raise self._error
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second sent through the stream
+        """
+        return self.bytes_sent / self.elapsed if self.elapsed else 0.0
+
+    def close(self) -> None:
+        """
+        Stops the background archiving if the stream is abandoned before it is fully consumed
+        """
+        self._cancelled.set()
+        # Drain anything left so a blocked writer notices the cancellation
+        try:
+            while True:
+                self._queue.get_nowait()
+        except Empty:
+            pass
+
+    def _write_archive(self) -> None:
+        writer = _QueueWriter(self._queue, self._cancelled, self.chunk_size)
+        try:
+            with tarfile.open(
+                fileobj=writer, mode="w|", bufsize=self.chunk_size
+            ) as tar:
+                for name, source in self.members:
+                    if isinstance(source, HardLink):
+                        info = tarfile.TarInfo(name)
+                        info.type = tarfile.LNKTYPE
+                        info.linkname = source.target
+                        info.mtime = time()
+                        tar.addfile(info)
+                    elif isinstance(source, bytes):
+                        info = tarfile.TarInfo(name)
+                        info.size = len(source)
+                        info.mtime = time()
+                        tar.addfile(info, BytesIO(source))
+                    else:
+                        tar.add(source, arcname=name, recursive=False)
+            writer.flush()
+        except InterruptedError:
+            return
+        except BaseException as error:
+            self._error = error
+
+        try:
+            writer._put(None)
+        except InterruptedError:
+            pass
+
+
+def format_throughput(transfer: Any) -> str:
+    """
+    Human-readable summary of a finished transfer, given a `TarStream` or anything else with the same `bytes_sent`,
+    `elapsed`, and `throughput`
+    """
+    megabytes = transfer.bytes_sent / (1024 * 1024)
+    return (
+        f"{megabytes:.1f} MB in {transfer.elapsed:.2f}s "
+        f"({transfer.throughput / (1024 * 1024):.1f} MB/s)"
+    )
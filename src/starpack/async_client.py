@@ -0,0 +1,81 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from starpack.client import StarpackClient
+
+T = TypeVar("T")
+
+
+class AsyncStarpackClient:
+    """
+    asyncio interface to the Starpack Engine. Calls run on a bounded pool of worker threads that share the pooled,
+    keep-alive HTTP session of a single `StarpackClient`, so many package and deploy operations can be in flight
+    against one engine from one event loop.
+    """
+
+    def __init__(
+        self,
+        host: str = "http://localhost",
+        port: Optional[int] = 1976,
+        max_concurrency: int = 10,
+        timeout: Optional[float] = None,
+        client: Optional[StarpackClient] = None,
+    ) -> None:
+        self.client = client or StarpackClient(
+            host=host, port=port, pool_size=max_concurrency, timeout=timeout
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="starpack-client"
+        )
+
+    @property
+    def url(self) -> str:
+        return self.client.url
+
+    async def check_health(self) -> bool:
+        """
+        Tries to run a healthcheck to see if a server is up.
+        """
+        return await self._run(self.client.check_health)
+
+    async def package(self, payload: Dict[str, Any]) -> bool:
+        """
+        Packages model artifacts, given a starpack YAML/JSON payload. Returns whether the packaging succeeded.
+        """
+        return await self._run(self.client.package, payload)
+
+    async def deploy(self, payload: Dict[str, Any]) -> bool:
+        """
+        Deploys a packaged model image. Returns whether the deployment succeeded.
+        """
+        return await self._run(self.client.deploy, payload)
+
+    async def upload_artifacts(self, directory: Path, full: bool = False) -> None:
+        """
+        Uploads the contents of a directory to the engine's artifacts volume.
+        """
+        await self._run(self.client.upload_artifacts, directory, full=full)
+
+    async def close(self) -> None:
+        """
+        Waits for in-flight calls to finish and closes the pooled connections
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(self._executor.shutdown, wait=True)
+        )
+        self.client.close()
+
+    async def __aenter__(self) -> "AsyncStarpackClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _run(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(function, *args, **kwargs)
+        )
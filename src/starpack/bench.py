@@ -0,0 +1,443 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+import json
+import math
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+from starpack import __version__
+from starpack.wire import CSV_TYPE, encode_csv
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DURATION = 10.0
+# Connections a fixed-rate run opens at most, after which requests wait for one to free up, and the wait counts
+# towards their latency
+MAX_CONNECTIONS = 256
+REQUEST_TIMEOUT = 30.0
+# Latencies are recorded to within 1/1024 of their value, like an HDR histogram with three significant figures
+SUB_BUCKETS = 1024
+PERCENTILES = (50.0, 90.0, 95.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Latencies in microseconds, in buckets whose width grows with their value, so that every latency from a
+    microsecond to minutes is kept to the same relative precision in little memory, and histograms of several runs
+    can be added up and compared
+    """
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+        self.total = 0
+        self.min = 0
+        self.max = 0
+        self.sum = 0
+
+    def record(self, seconds: float) -> None:
+        value = max(0, int(round(seconds * 1_000_000)))
+        self.counts[_bucket(value)] += 1
+        self.min = value if not self.total else min(self.min, value)
+        self.max = max(self.max, value)
+        self.sum += value
+        self.total += 1
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if other.total:
+            self.min = other.min if not self.total else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.counts.update(other.counts)
+        self.sum += other.sum
+        self.total += other.total
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    def percentile(self, percentile: float) -> int:
+        """
+        The latency in microseconds that `percentile` percent of the recorded ones are at or below
+        """
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(percentile / 100 * self.total))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(_highest_value(bucket), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "unit": "us",
+            "sub_buckets": SUB_BUCKETS,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "sum": self.sum,
+            "counts": {
+                str(bucket): count for bucket, count in sorted(self.counts.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.counts.update(
+            {int(bucket): count for bucket, count in data["counts"].items()}
+        )
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        histogram.sum = data["sum"]
+        return histogram
+
+
+class BenchReport:
+    """
+    The results of a load test against a deployment: throughput, errors, and a histogram of the latencies of the
+    requests that succeeded
+    """
+
+    def __init__(
+        self,
+        deployment: str,
+        url: str,
+        mode: str,
+        target: float,
+        label: Optional[str] = None,
+    ) -> None:
+        self.deployment = deployment
+        self.url = url
+        self.mode = mode
+        self.target = target
+        self.label = label
+        self.created = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.seconds = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.statuses: Counter = Counter()
+        self.latency = LatencyHistogram()
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        The figures to compare runs by, latencies in milliseconds
+        """
+        metrics = {
+            "throughput": self.throughput,
+            "error_rate": self.error_rate,
+            "mean_ms": self.latency.mean / 1000,
+        }
+        for percentile in PERCENTILES:
+            metrics[f"p{percentile:g}_ms"] = self.latency.percentile(percentile) / 1000
+        metrics["max_ms"] = self.latency.max / 1000
+        return metrics
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "deployment": self.deployment,
+            "url": self.url,
+            "label": self.label,
+            "created": self.created,
+            "starpack_version": __version__,
+            "mode": self.mode,
+            "target": self.target,
+            "seconds": self.seconds,
+            "requests": self.requests,
+            "errors": self.errors,
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "metrics": self.metrics(),
+            "latency": self.latency.to_dict(),
+        }
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2))
+
+    @classmethod
+    def load(cls, path: Path) -> "BenchReport":
+        data = json.loads(path.read_text())
+        report = cls(
+            data["deployment"], data["url"], data["mode"], data["target"], data["label"]
+        )
+        report.created = data["created"]
+        report.seconds = data["seconds"]
+        report.requests = data["requests"]
+        report.errors = data["errors"]
+        report.statuses.update(
+            {int(status): count for status, count in data["statuses"].items()}
+        )
+        report.latency = LatencyHistogram.from_dict(data["latency"])
+        return report
+
+
+class PreparedRequest:
+    """
+    An HTTP request for one row, serialized before the run so that building it doesn't count towards its latency
+    """
+
+    def __init__(self, path: str, content_type: str, body: bytes) -> None:
+        self.path = path
+        self.content_type = content_type
+        self.body = body
+
+    def encode(self, host: str) -> bytes:
+        head = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            f"Content-Type: {self.content_type}\r\n"
+            f"Content-Length: {len(self.body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        return head.encode() + self.body
+
+
+def record_request(url: str, record: Dict[str, Any]) -> PreparedRequest:
+    """
+    A prediction for one row sent as a JSON record, for deployments that answer records
+    """
+    path = urlsplit(url).path.rstrip("/") + "/record"
+    return PreparedRequest(path, "application/json", json.dumps([record]).encode())
+
+
+def table_request(url: str, record: Dict[str, Any]) -> PreparedRequest:
+    """
+    A prediction for one row sent as a one-row CSV upload, for deployments that only answer tables
+    """
+    boundary = uuid4().hex
+    table = encode_csv(list(record), [list(record.values())])
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="row.csv"\r\n'
+        f"Content-Type: {CSV_TYPE}\r\n\r\n"
+    ).encode()
+    body += table + f"\r\n--{boundary}--\r\n".encode()
+    return PreparedRequest(
+        urlsplit(url).path, f"multipart/form-data; boundary={boundary}", body
+    )
+
+
+class LoadGenerator:
+    """
+    Sends prepared requests to a deployment from one asyncio event loop over kept-alive connections, either closed
+    loop, with `concurrency` requests in flight and each sent as soon as the previous one is answered, or at a fixed
+    `rate` per second whatever the deployment's latency. At a fixed rate, latency is measured from when each request
+    was due rather than when it went out, so that a deployment falling behind shows in the latency instead of
+    slowing the run down. A run stops after `duration` seconds, or after `requests` requests.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        requests: List[PreparedRequest],
+        rate: Optional[float] = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        duration: Optional[float] = DEFAULT_DURATION,
+        max_requests: Optional[int] = None,
+    ) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = parts.scheme == "https"
+        self.payloads = [request.encode(parts.netloc) for request in requests]
+        self.rate = rate
+        self.concurrency = max(1, concurrency)
+        self.duration = duration
+        self.max_requests = max_requests
+        self._idle: List[_Connection] = []
+        self._open = 0
+        self._freed: Optional[asyncio.Condition] = None
+
+    def run(self, report: BenchReport) -> BenchReport:
+        return asyncio.run(self.drive(report))
+
+    async def drive(self, report: BenchReport) -> BenchReport:
+        self._freed = asyncio.Condition()
+        start = perf_counter()
+        deadline = start + self.duration if self.duration else math.inf
+        sequence = self._sequence()
+        try:
+            if self.rate:
+                await self._fixed_rate(report, sequence, start, deadline)
+            else:
+                workers = [
+                    self._closed_loop(report, sequence, deadline)
+                    for _ in range(self.concurrency)
+                ]
+                await asyncio.gather(*workers)
+        finally:
+            report.seconds = perf_counter() - start
+            for connection in self._idle:
+                connection.close()
+        return report
+
+    def _sequence(self) -> Iterator[bytes]:
+        """
+        The payloads to send, cycling through the rows until the run ends
+        """
+        sent = 0
+        while self.max_requests is None or sent < self.max_requests:
+            yield self.payloads[sent % len(self.payloads)]
+            sent += 1
+
+    async def _closed_loop(
+        self, report: BenchReport, sequence: Iterator[bytes], deadline: float
+    ) -> None:
+        connection = _Connection(self.host, self.port, self.ssl)
+        try:
+            for payload in sequence:
+                if perf_counter() >= deadline:
+                    return
+                sent = perf_counter()
+                status = await connection.send(payload)
+                self._record(report, status, perf_counter() - sent)
+        finally:
+            connection.close()
+
+    async def _fixed_rate(
+        self,
+        report: BenchReport,
+        sequence: Iterator[bytes],
+        start: float,
+        deadline: float,
+    ) -> None:
+        pending = set()
+        for index, payload in enumerate(sequence):
+            due = start + index / self.rate
+            if due >= deadline:
+                break
+            delay = due - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            pending.add(asyncio.ensure_future(self._send_due(report, payload, due)))
+            pending = {task for task in pending if not task.done()}
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _send_due(self, report: BenchReport, payload: bytes, due: float) -> None:
+        connection = await self._acquire()
+        try:
+            status = await connection.send(payload)
+        finally:
+            await self._release(connection)
+        self._record(report, status, perf_counter() - due)
+
+    async def _acquire(self) -> "_Connection":
+        async with self._freed:
+            while not self._idle and self._open >= MAX_CONNECTIONS:
+                await self._freed.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        return _Connection(self.host, self.port, self.ssl)
+
+    async def _release(self, connection: "_Connection") -> None:
+        async with self._freed:
+            self._idle.append(connection)
+            self._freed.notify()
+
+    def _record(self, report: BenchReport, status: int, seconds: float) -> None:
+        report.requests += 1
+        report.statuses[status] += 1
+        if 200 <= status < 300:
+            report.latency.record(seconds)
+        else:
+            report.errors += 1
+
+
+class _Connection:
+    """
+    One kept-alive HTTP/1.1 connection, opened on first use and again whenever the deployment closes it. A request
+    that fails to get an answer has status 0.
+    """
+
+    def __init__(self, host: str, port: int, ssl: bool) -> None:
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def send(self, payload: bytes) -> int:
+        try:
+            return await asyncio.wait_for(self._exchange(payload), REQUEST_TIMEOUT)
+        except (
+            OSError,
+            EOFError,
+            ValueError,
+            asyncio.TimeoutError,
+            asyncio.LimitOverrunError,
+        ):
+            self.close()
+            return 0
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def _exchange(self, payload: bytes) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl or None
+            )
+        self.writer.write(payload)
+        await self.writer.drain()
+
+        status, headers = _parse_head(await self.reader.readuntil(b"\r\n\r\n"))
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            await self._read_chunked()
+        elif "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            await self.reader.read()
+            self.close()
+            return status
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status
+
+    async def _read_chunked(self) -> None:
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0].strip(), 16)
+            await self.reader.readexactly(size + 2)
+            if not size:
+                return
+
+
+def _parse_head(head: bytes) -> Tuple[int, Dict[str, str]]:
+    status_line, *lines = head.decode("latin-1").split("\r\n")
+    status = int(status_line.split(" ", 2)[1])
+    headers = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+def _bucket(value: int) -> int:
+    """
+    Values below `2 * SUB_BUCKETS` get a bucket of their own, and above that, each doubling of the value is split into
+    `SUB_BUCKETS` buckets
+    """
+    shift = max(0, value.bit_length() - SUB_BUCKETS.bit_length())
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def _highest_value(bucket: int) -> int:
+    shift = max(0, bucket // SUB_BUCKETS - 1)
+    return ((bucket - shift * SUB_BUCKETS) << shift) + (1 << shift) - 1
@@ -0,0 +1,43 @@
+from copy import deepcopy
+import hashlib
+import json
+from typing import Any, Dict
+
+from starpack.manifest import Manifest
+
+# Label the engine puts on the images it builds, given in the package metadata's `labels`, so that a later package
+# of the same spec and artifacts can find the image and skip the build
+BUILD_DIGEST_LABEL = "io.starpack.build-digest"
+SPEC_FILE = "starpack.yaml"
+
+
+def package_digest(payload: Dict[str, Any], manifest: Manifest) -> str:
+    """
+    Digest of everything that goes into building a package: the package section of the starpack.yaml, in canonical
+    form, and the content hash of every other artifact. The starpack.yaml itself is left out, so that editing its
+    deployment section doesn't call for a new image.
+    """
+    spec = deepcopy(payload["package"])
+    (spec.get("metadata") or {}).pop("labels", None)
+    document = {
+        "package": spec,
+        "artifacts": {
+            path: entry["sha256"]
+            for path, entry in manifest.items()
+            if path != SPEC_FILE
+        },
+    }
+    canonical = json.dumps(document, sort_keys=True, separators=(",", ":"), default=str)
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def label_payload(payload: Dict[str, Any], digest: str) -> Dict[str, Any]:
+    """
+    Copy of a payload asking the engine to label the image it builds with the build digest
+    """
+    labelled = deepcopy(payload)
+    metadata = labelled["package"].setdefault("metadata", {})
+    metadata.setdefault("labels", {})[BUILD_DIGEST_LABEL] = digest
+
+    return labelled
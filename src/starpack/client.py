@@ -1,17 +1,60 @@
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+import json
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from time import sleep, time
-from typing import Any, Dict, List, Optional
+import posixpath
+import tarfile
+from threading import Lock, Thread, local
+from time import perf_counter, sleep, time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from uuid import uuid4
 import requests
+import requests.adapters
 import docker
 from docker.models.containers import Container
-import shutil
+from typer import Exit
 
 from rich import print
-from rich.progress import track
+from rich.console import Console
+from rich.table import Table
 
+from starpack import leases, registry
 from starpack._config import settings, APP_DIR
+from starpack.archive import ArchiveMember, HardLink, TarStream, format_throughput
+from starpack.build_cache import BUILD_DIGEST_LABEL
+from starpack.compression import negotiate_codecs
+from starpack.deploy_plan import DEPLOYMENT_LABEL, RunningContainer
 from starpack.errors import *
+from starpack.jobs import JobProgress, save_last_job
+from starpack.pool import POOL_SIZE_LABEL, EnginePool, PoolMember
+from starpack.pulls import ensure_engine_image
+from starpack.manifest import (
+    MANIFEST_NAME,
+    Manifest,
+    diff_manifests,
+    directory_manifest,
+    local_manifest_path,
+    save_manifest,
+)
+from starpack.readiness import record_startup_latency, wait_for_engine
+from starpack.store import INDEX_NAME, StoreIndex, blob_path, format_size
+from starpack.uploads import BlobUpload, ChunkedUploader
+from starpack.utils import run_detached
+
+HEALTHCHECK_TIMEOUT = 2
+CONNECT_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 10
+# Statuses from engines that predate the package job protocol
+UNSUPPORTED_STATUSES = {404, 405, 501}
+# Names of the active engine containers and of the standby kept ready to replace them
+ENGINE_PREFIX = "starpack-engine-"
+STANDBY_PREFIX = "starpack-engine-standby-"
+# Paths given to each `rm` run inside the engine, to stay under the command line length limit
+REMOVE_BATCH_SIZE = 500
+
+T = TypeVar("T")
 
 
 class StarpackClient:
@@ -34,17 +77,40 @@ class StarpackClient:
         start: bool = False,
         docker: bool = False,
         force: bool = False,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: Optional[float] = None,
+        replicas: Optional[int] = None,
     ) -> None:
 
         # Generate the URL based on the provided host and port
         self.host = host
         self.port = port
 
+        # Share keep-alive connections to the engine across calls and threads
+        self.timeout = timeout
+        self.jobs_supported = True
+        self.engine: Optional[Container] = None
+        self.docker_client = None
+        # Lease held on each engine this client uses, by engine ID
+        self.leases: Dict[str, str] = {}
+        # Engines that requests are spread between when several replicas run, and the one each thread's current
+        # request goes to
+        self.pool: Optional[EnginePool] = None
+        self._local = local()
+        # Serializes updates to the artifact store index between threads sharing this client
+        self._store_lock = Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
         if docker:
             self._init_docker_client()
 
         if start:
-            self.start_server(force=force)
+            self.start_server(force=force, replicas=replicas)
 
     def check_health(self) -> bool:
         """
@@ -52,8 +118,10 @@ class StarpackClient:
         """
 
         try:
-            health_response = requests.get(f"{self.url}/healthcheck")
-        except requests.ConnectionError:
+            health_response = self.session.get(
+                f"{self.url}/healthcheck", timeout=HEALTHCHECK_TIMEOUT
+            )
+        except (requests.ConnectionError, requests.Timeout):
             return False
 
         if health_response.status_code != 200:
@@ -62,15 +130,32 @@ class StarpackClient:
         print(f"Successfully connected to server at {self.url}")
         return True
 
-    def deploy(self, payload: Dict[str, Any]) -> None:
+    def close(self) -> None:
         """
-        Deploys a packaged model image or if the image does not exist, attempts to run the packaging in the YAML file
+        Closes the pooled connections to the engine and releases this client's leases on its engines
+        """
+        self.session.close()
+        self.release_lease()
+
+    def __enter__(self) -> "StarpackClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def deploy(self, payload: Dict[str, Any]) -> bool:
         """
+        Deploys a packaged model image or if the image does not exist, attempts to run the packaging in the YAML file.
+        Returns whether the deployment succeeded.
+        """
+        return self._dispatched(self._deploy, payload)
+
+    def _deploy(self, payload: Dict[str, Any]) -> bool:
         deploy_url = f"{self.url}/deploy"
 
-        output = requests.post(deploy_url, json=payload)
+        output = self.session.post(deploy_url, json=payload, timeout=self._timeouts)
 
-        if output.status_code / 100 == 2:
+        if output.status_code // 100 == 2:
             endpoints = output.json().get("endpoints")
             deployment_name = payload["deployment"]["metadata"]["name"]
             if not endpoints:
@@ -80,75 +165,587 @@ class StarpackClient:
                 )
             else:
                 for wrapper, url in endpoints.items():
+                    if isinstance(url, list):
+                        print(
+                            f"Deployed {deployment_name} using wrapper {wrapper} as {len(url)} replicas "
+                            f"at {', '.join(url)}."
+                        )
+                        continue
                     print(
                         f"Deployed {deployment_name} using wrapper {wrapper} at {url}."
                     )
 
-        else:
-            print(output.status_code)
-            print(output.text)
+            return True
+
+        print(output.status_code)
+        print(output.text)
+        return False
 
-    def package(self, payload: Dict[str, Any]) -> None:
+    def package(self, payload: Dict[str, Any], detach: bool = False) -> bool:
         """
-        Packages model artifacts, given a starpack YAML/JSON payload
+        Packages model artifacts, given a starpack YAML/JSON payload. Returns whether the packaging succeeded.
+        On engines that support package jobs, the build logs and step progress are streamed while the job runs;
+        with `detach`, the job is only submitted. Older engines package in a single blocking request.
         """
+        return self._dispatched(self._package, payload, detach)
+
+    def _package(self, payload: Dict[str, Any], detach: bool = False) -> bool:
+        job_id = self.submit_package_job(payload)
+        if job_id is not None:
+            if detach:
+                print(f"Submitted package job {job_id}")
+                return True
+
+            succeeded = self.follow_job(job_id)
+            if succeeded:
+                print(f"Successfully packaged {payload['package']['metadata']['name']}")
+            return succeeded
+
         package_url = f"{self.url}/package"
 
-        output = requests.post(package_url, json=payload)
+        output = self.session.post(package_url, json=payload, timeout=self._timeouts)
 
-        if output.status_code / 100 == 2:
+        if output.status_code // 100 == 2:
             print(f"Successfully packaged {payload['package']['metadata']['name']}")
-        else:
-            print(output.status_code)
-            print(output.text)
+            return True
 
-    def remove_engines(self) -> None:
+        print(output.status_code)
+        print(output.text)
+        return False
+
+    def find_built_image(self, digest: str) -> Optional[str]:
         """
-        Finds all instances of starpack engine applications and removes them.
+        Looks for an image the engine already built with the given build digest, returning its name. Engines that
+        aren't reachable through the local Docker daemon can't be checked, and never have a built image.
         """
-        engines = self._find_engines()
-        if engines:
+        if self.docker_client is None:
+            return None
+
+        try:
+            images = self.docker_client.images.list(
+                filters={"label": f"{BUILD_DIGEST_LABEL}={digest}"}
+            )
+        except docker.errors.APIError:
+            return None
+        if not images:
+            return None
+
+        return images[0].tags[0] if images[0].tags else images[0].id
+
+    def find_deployed_containers(
+        self, deployment: str
+    ) -> Optional[List[RunningContainer]]:
+        """
+        Lists the containers the engine started for a deployment, stopped ones included. Returns None when they can't
+        be seen, on engines that aren't reachable through the local Docker daemon.
+        """
+        if self.docker_client is None:
+            return None
+
+        try:
+            containers = self.docker_client.containers.list(
+                all=True, filters={"label": f"{DEPLOYMENT_LABEL}={deployment}"}
+            )
+        except docker.errors.APIError:
+            return None
+
+        return [
+            RunningContainer.from_container(container)
+            for container in containers
+            if (container.labels or {}).get(DEPLOYMENT_LABEL) == deployment
+        ]
+
+    def find_deployment_endpoint(self, deployment: str) -> Optional[Tuple[str, str]]:
+        """
+        Finds where a local deployment answers predictions: the base URL of its first running wrapper, on the port of
+        the wrapper, or of its proxy, along with the name of the package it serves. Returns None if it isn't running.
+        """
+        if self.docker_client is None:
+            return None
+
+        try:
+            containers = self.docker_client.containers.list(
+                filters={"label": f"{DEPLOYMENT_LABEL}={deployment}"}
+            )
+        except docker.errors.APIError:
+            return None
+
+        for container in containers:
+            if (container.labels or {}).get(DEPLOYMENT_LABEL) != deployment:
+                continue
+            running = RunningContainer.from_container(container)
+            port = running.port or running.published
+            if not running.running or not port:
+                continue
+            # Packages are tagged with their name, possibly behind a registry and with a version
+            image = container.attrs.get("Config", {}).get("Image") or ""
+            model = image.rsplit("/", 1)[-1].split(":", 1)[0]
+            return f"http://localhost:{port}", model
+
+        return None
+
+    def remove_containers(self, containers: List[RunningContainer]) -> None:
+        """
+        Stops and removes deployed containers, skipping those that are already gone
+        """
+        for container in containers:
+            try:
+                self.docker_client.containers.get(container.id).remove(force=True)
+            except docker.errors.NotFound:
+                continue
+            print(f"Removed container {container.name} ({container.wrapper})")
+
+    def submit_package_job(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Submits a package job, returning its ID, or nothing if the engine does not support package jobs
+        """
+        if not self.jobs_supported:
+            return None
+
+        output = self.session.post(
+            f"{self.url}/jobs/package", json=payload, timeout=self._timeouts
+        )
+        if output.status_code in UNSUPPORTED_STATUSES:
+            self.jobs_supported = False
+            return None
+        output.raise_for_status()
+
+        job_id = output.json()["job_id"]
+        save_last_job(job_id, self.url)
+        return job_id
+
+    def follow_job(
+        self, job_id: str, max_reconnects: int = 5, url: Optional[str] = None
+    ) -> bool:
+        """
+        Streams the logs and step progress of a package job until it finishes, reattaching from the last event seen
+        if the connection drops. The job is followed on the engine at `url`, by default this client's. Returns
+        whether the job succeeded.
+        """
+        url = url or self.url
+        progress = JobProgress(job_id)
+        reconnects = 0
+
+        while not progress.finished:
+            try:
+                with self.session.get(
+                    f"{url}/jobs/{job_id}/events",
+                    params={"offset": progress.offset},
+                    stream=True,
+                    timeout=self._timeouts,
+                ) as response:
+                    if response.status_code == 404:
+                        print(f"The engine at {url} has no job {job_id}")
+                        return False
+                    response.raise_for_status()
+
+                    for line in response.iter_lines():
+                        if line:
+                            progress.handle(json.loads(line))
+                            reconnects = 0
+            except (
+                requests.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+            ):
+                pass
+
+            if not progress.finished:
+                reconnects += 1
+                if reconnects > max_reconnects:
+                    print(
+                        f"Lost the connection to package job {job_id}. "
+                        f"Reattach with `starpack package --attach {job_id}`"
+                    )
+                    return False
+                sleep(min(2 ** (reconnects - 1) * 0.1, 5))
+
+        print(progress.step_table())
+        return progress.succeeded
+
+    def remove_engines(self) -> List[Container]:
+        """
+        Finds all instances of starpack engine applications and removes them, except for those that other Starpack
+        processes hold a lease on. Returns the engines that were kept.
+        """
+        kept = []
+        for engine in self._find_engines():
+            if leases.lease_count(engine.id):
+                print(f"Keeping {engine.name}, which another Starpack process is using")
+                kept.append(engine)
+                continue
+            engine.remove(force=True)
+            registry.forget_engine(engine.id)
+            leases.forget_engine(engine.id)
+
+        return kept
+
+    def start_server(self, force: bool = False, replicas: Optional[int] = None):
+        """
+        Starts the Starpack Engine locally after removing all other instances. When a standby engine is ready, it is
+        promoted instead of starting a new container, and a new standby is prepared in the background.
+
+        With `replicas` above one, or the `engine_replicas` setting, a pool of that many engines is started instead,
+        and package and deploy requests are spread between them. A pool that is already running is used as is, unless
+        a different number of replicas is asked for.
+
+        Engines are started and chosen while holding the engine lock, so that concurrent Starpack processes share
+        engines, and this client holds a lease on each of its engines until it is closed or the process exits.
+        """
+        with leases.engine_lock():
+            self._start_server(force, replicas)
+            if self.pool is not None:
+                engines = [member.engine for member in self.pool.members]
+            else:
+                engines = [self.engine] if self.engine is not None else []
             for engine in engines:
-                engine.remove(force=True)
+                self.leases[engine.id] = leases.acquire_lease(engine.id)
+        atexit.register(self.release_lease)
+        if self.pool is not None:
+            self.pool.start_monitor()
 
-    def start_server(self, force: bool = False):
+    def release_lease(self) -> None:
         """
-        Starts the Starpack Engine locally after removing all other instances.
+        Releases this client's leases on its engines. Once no process uses an engine, the reaper is started in the
+        background to shut it down after the `engine_idle_timeout` setting, if one is set.
         """
-        if force:
-            self.remove_engines()
-        else:
-            engines = self._find_engines()
-            if len(engines) == 1:
-                # Grab the singular engine if we're not forcing a new start
-                self.engine = engines[0]
-                if self.engine.status != "running":
-                    self.engine.start()
-                self.port = self.engine.attrs["HostConfig"]["PortBindings"]["1976/tcp"][
-                    0
-                ]["HostPort"]
-                self._engine_startup_check()
-                print(f"Connected to existing engine running at {self.url}")
-                return
-            elif engines:
-                # Case with many engines: Just clean it all out and start again
-                self.remove_engines()
+        if self.pool is not None:
+            self.pool.stop()
+        if not self.leases:
+            return
+
+        lease_ids, self.leases = list(self.leases.values()), {}
+        remaining = [leases.release_lease(lease_id) for lease_id in lease_ids]
+        atexit.unregister(self.release_lease)
+        if not all(remaining) and settings.engine_idle_timeout > 0:
+            run_detached("engine", "reap")
+
+    def reap_idle_engines(self, idle_timeout: float) -> List[str]:
+        """
+        Removes the engines that no process has used for `idle_timeout` seconds, returning their names
+        """
+        removed = []
+        with leases.engine_lock():
+            for engine in self._find_engines():
+                idle = leases.idle_seconds(engine.id)
+                if idle is None or idle < idle_timeout:
+                    continue
+                engine.remove(force=True)
+                registry.forget_engine(engine.id)
+                leases.forget_engine(engine.id)
+                removed.append(engine.name)
+
+        return removed
+
+    def _start_server(
+        self, force: bool = False, replicas: Optional[int] = None
+    ) -> None:
+        if not force and replicas in (None, 1) and self._connect_registered_engine():
+            print(f"Connected to existing engine running at {self.url}")
+            return
+
+        engines = [] if force else self._find_engines()
+        pool_size = self._pool_size(engines)
+        if pool_size is None or replicas not in (None, pool_size):
+            # Forcing a new start, or other engines than asked for: clean out all the engines no one is using and
+            # start again
+            engines = self.remove_engines()
+        if engines:
+            # Grab the singular engine or pool, or the engines another process is using
+            self._connect_engines(engines)
+            return
 
         # Ensure that we have the Docker Volume to hold saved artifacts and
         # the latest version of our Starpack Engine image from Docker Hub
         self.docker_client.volumes.create(
             name=self.volumes["artifacts"]["host"], labels={"app": self.app_label}
         )
-        if settings.pull_image:
-            self.docker_client.images.pull(settings.engine_image)
-
-        print(f"Starting Starpack Engine at {self.url}")
-        self.engine = self.docker_client.containers.run(
-            image=settings.engine_image,
-            name=f"starpack-engine-{round(time())}",
-            tty=True,
-            ports={1976: self.port},
-            volumes={
+        ensure_engine_image(self.docker_client, force=force)
+
+        replicas = replicas or settings.engine_replicas
+        if replicas > 1:
+            self._start_pool(replicas)
+            return
+
+        if not self._promote_standby():
+            print(f"Starting Starpack Engine at {self.url}")
+            self.engine = self.docker_client.containers.run(
+                image=settings.engine_image,
+                name=f"{ENGINE_PREFIX}{round(time())}",
+                ports={1976: self.port},
+                **self._engine_options(),
+            )
+
+            self._engine_startup_check()
+            registry.record_engine(self.engine, self.port)
+
+        if settings.engine_standby != "off":
+            run_detached("engine", "standby")
+
+    def _connect_engines(self, engines: List[Container]) -> None:
+        """
+        Connects to engines that are already there, as a pool if there are several
+        """
+        for engine in engines:
+            if engine.status != "running":
+                engine.start()
+
+        self.engine = engines[0]
+        self.port = self._engine_port(self.engine)
+        if len(engines) == 1:
+            self._engine_startup_check(mode="existing")
+            registry.record_engine(self.engine, self.port)
+            print(f"Connected to existing engine running at {self.url}")
+            return
+
+        self._use_pool(engines, mode="existing")
+        print(f"Connected to a pool of {len(engines)} engines")
+
+    def _start_pool(self, replicas: int) -> None:
+        """
+        Starts a pool of engines sharing the artifacts volume, the first on the usual port and the others on ports
+        Docker picks, and waits for all of them at once
+        """
+        print(f"Starting a pool of {replicas} Starpack Engines")
+        started = round(time())
+        engines = []
+        for index in range(replicas):
+            engine = self.docker_client.containers.run(
+                image=settings.engine_image,
+                name=f"{ENGINE_PREFIX}{started}-{index}",
+                ports={1976: self.port if index == 0 else None},
+                **self._engine_options({POOL_SIZE_LABEL: str(replicas)}),
+            )
+            engine.reload()
+            engines.append(engine)
+
+        self.engine = engines[0]
+        self.port = self._engine_port(self.engine)
+        self._use_pool(engines)
+
+    def _use_pool(self, engines: List[Container], mode: str = "cold") -> None:
+        """
+        Waits for every engine of a pool to answer its healthcheck, and spreads requests between them from then on
+        """
+        ports = [self._engine_port(engine) for engine in engines]
+        with Console().status(f"Waiting for {len(engines)} engines to come up..."):
+            with ThreadPoolExecutor(max_workers=len(engines)) as executor:
+                latencies = list(executor.map(self._wait_for_container, engines, ports))
+
+        members = []
+        for engine, port, latency in zip(engines, ports, latencies):
+            url = f"{self.host}:{port}"
+            record_startup_latency(url, latency, mode=mode)
+            registry.record_engine(engine, port)
+            members.append(PoolMember(engine, url))
+
+        self.startup_latency = max(latencies)
+        self.pool = EnginePool(members, self.session, on_evict=self._replace_member)
+
+    def _replace_member(self, member: PoolMember) -> None:
+        """
+        Replaces an engine evicted from the pool in the background, while the other engines take its requests
+        """
+        print(f"Replacing the unhealthy engine at {member.url}")
+        Thread(
+            target=self._start_replacement,
+            args=(member,),
+            name="starpack-pool-replace",
+            daemon=True,
+        ).start()
+
+    def _start_replacement(self, member: PoolMember) -> Optional[PoolMember]:
+        """
+        Removes an evicted engine and adds a new one to the pool once it is healthy, returning it
+        """
+        try:
+            with leases.engine_lock():
+                try:
+                    member.engine.remove(force=True)
+                except docker.errors.APIError:
+                    pass
+                registry.forget_engine(member.engine.id)
+                leases.forget_engine(member.engine.id)
+                self.leases.pop(member.engine.id, None)
+
+                engine = self.docker_client.containers.run(
+                    image=settings.engine_image,
+                    name=f"{ENGINE_PREFIX}{round(time())}-{uuid4().hex[:6]}",
+                    ports={1976: None},
+                    **self._engine_options(
+                        {POOL_SIZE_LABEL: member.engine.labels.get(POOL_SIZE_LABEL, "")}
+                    ),
+                )
+                engine.reload()
+                self.leases[engine.id] = leases.acquire_lease(engine.id)
+
+            port = self._engine_port(engine)
+            self._wait_for_container(engine, port)
+        except (Exit, docker.errors.APIError) as error:
+            print(f"Could not replace the engine at {member.url}: {error}")
+            return None
+
+        registry.record_engine(engine, port)
+        replacement = PoolMember(engine, f"{self.host}:{port}")
+        if self.engine is member.engine:
+            self.engine = engine
+        self.pool.add(replacement)
+        return replacement
+
+    def _wait_for_container(self, engine: Container, port: str) -> float:
+        """
+        Waits for an engine other than this client's own to answer its healthcheck, returning how long it took
+        """
+        probe = StarpackClient(host=self.host, port=port)
+        try:
+            return wait_for_engine(
+                probe.check_health,
+                timeout=settings.engine_startup_timeout,
+                docker_client=self.docker_client,
+                container=engine,
+            )
+        finally:
+            probe.close()
+
+    @staticmethod
+    def _pool_size(engines: List[Container]) -> Optional[int]:
+        """
+        Size of the pool the engines make up, or None if they aren't one: a single engine, or every engine of a pool
+        """
+        sizes = {engine.labels.get(POOL_SIZE_LABEL) or "1" for engine in engines}
+        if sizes != {str(len(engines))}:
+            return None
+        return len(engines)
+
+    def prepare_standby(self) -> Optional[Container]:
+        """
+        Makes sure a standby engine is ready for the next start, according to the `engine_standby` setting: "created"
+        keeps a container created but not started, and "paused" one that was started, answered its healthcheck, and
+        was paused, so that it resumes in milliseconds. Standbys of an older engine image are replaced. Returns the
+        standby, if any.
+        """
+        mode = settings.engine_standby
+        with leases.engine_lock():
+            standbys = self._find_standby_engines()
+            current = [engine for engine in standbys if self._is_current(engine)]
+            for engine in standbys:
+                if engine not in current[:1] or mode == "off":
+                    engine.remove(force=True)
+            if mode == "off":
+                return None
+            if current:
+                return current[0]
+
+            name = f"{STANDBY_PREFIX}{round(time())}"
+            if mode == "created":
+                # A container that never started doesn't hold on to its port, so it can claim the engine's usual one
+                return self.docker_client.containers.create(
+                    image=settings.engine_image,
+                    name=name,
+                    ports={1976: self.port},
+                    **self._engine_options(),
+                )
+
+            # A running standby can't share the active engine's port, so Docker picks one
+            standby = self.docker_client.containers.run(
+                image=settings.engine_image,
+                name=name,
+                ports={1976: None},
+                **self._engine_options(),
+            )
+            standby.reload()
+
+        # The lock isn't held while the standby boots, and only running standbys can't be promoted
+        try:
+            self._wait_for_container(standby, self._engine_port(standby))
+        except EngineInitializationError:
+            standby.remove(force=True)
+            raise
+        with leases.engine_lock():
+            standby.reload()
+            if standby.name.startswith(STANDBY_PREFIX):
+                standby.pause()
+
+        return standby
+
+    def status_table(self) -> Table:
+        """
+        Table of the engine containers and standbys, with their state and where they listen
+        """
+        table = Table(title="Starpack Engine")
+        table.add_column("Container")
+        table.add_column("Role")
+        table.add_column("Status")
+        table.add_column("URL")
+        table.add_column("Image")
+        table.add_column("Leases", justify="right")
+
+        for role, engines in (
+            ("active", self._find_engines()),
+            ("standby", self._find_standby_engines()),
+        ):
+            for engine in engines:
+                try:
+                    url = f"{self.host}:{self._engine_port(engine)}"
+                except EngineInitializationError:
+                    url = "-"
+                table.add_row(
+                    engine.name,
+                    role,
+                    engine.status,
+                    url if engine.status == "running" else "-",
+                    "current" if self._is_current(engine) else "outdated",
+                    str(leases.lease_count(engine.id)),
+                )
+
+        return table
+
+    def _promote_standby(self) -> bool:
+        """
+        Turns a standby engine of the current image into the active engine. Returns whether there was one.
+        """
+        standbys = [
+            engine
+            for engine in self._find_standby_engines()
+            if engine.status in ("paused", "created") and self._is_current(engine)
+        ]
+        if not standbys:
+            return False
+
+        start = perf_counter()
+        self.engine = standbys[0]
+        if self.engine.status == "paused":
+            self.engine.unpause()
+        elif self.engine.status != "running":
+            self.engine.start()
+        self.engine.rename(f"{ENGINE_PREFIX}{round(time())}")
+        self.engine.reload()
+        self.port = self._engine_port(self.engine)
+
+        print(f"Promoted a standby Starpack Engine at {self.url}")
+        self._engine_startup_check(mode="standby", start=start)
+        registry.record_engine(self.engine, self.port)
+        return True
+
+    def _is_current(self, engine: Container) -> bool:
+        """
+        Whether an engine container runs the local copy of the engine image
+        """
+        try:
+            image = self.docker_client.images.get(settings.engine_image)
+        except docker.errors.APIError:
+            return False
+
+        return engine.attrs.get("Image") == image.id
+
+    def _engine_options(
+        self, labels: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Options for running an engine container, other than its image, name, and ports, with any extra labels
+        """
+        return {
+            "tty": True,
+            "volumes": {
                 # Docker-in-Docker mounting
                 "/var/run/docker.sock": {
                     "bind": "/var/run/docker.sock",
@@ -163,60 +760,375 @@ class StarpackClient:
                     "mode": "rw",
                 },
             },
-            stdin_open=True,
-            detach=True,
-            labels={"app": self.app_label},
-        )
-
-        self._engine_startup_check()
+            "stdin_open": True,
+            "detach": True,
+            "labels": {"app": self.app_label, **(labels or {})},
+        }
 
     def terminate(self, all: bool = False) -> None:
         """
-        Terminates a local Docker instance of Starpack Engine and optionally deletes the associated volumes.
+        Terminates a local Docker instance of Starpack Engine and optionally deletes the associated volumes. Engines
+        that other Starpack processes hold a lease on are kept, along with the volumes they use.
         """
         self._init_docker_client()
-        self.remove_engines()
-        print("Removed all instances of the Starpack Engine")
+        kept = self.remove_engines()
+        for standby in self._find_standby_engines():
+            standby.remove(force=True)
+        if kept:
+            names = ", ".join(engine.name for engine in kept)
+            print(
+                f"Removed the Starpack Engine, except for {names}, which other Starpack processes are using"
+            )
+        else:
+            print("Removed all instances of the Starpack Engine")
 
-        if all:
-            volume = self.docker_client.volumes.get(self.volume_name)
+        if all and kept:
+            print(
+                "Kept the associated Starpack Engine data, which the engines still running use. Run this again once "
+                "they are done with it."
+            )
+        elif all:
+            volume = self.docker_client.volumes.get(self.volumes["artifacts"]["host"])
 
             volume.remove(force=True)
 
             print("Removed associated Starpack Engine data")
 
-    def upload_artifacts(self, directory: Path) -> None:
+    def upload_artifacts(
+        self,
+        directory: Path,
+        full: bool = False,
+        current_manifest: Optional[Manifest] = None,
+        chunked: Optional[bool] = None,
+        compression: Optional[str] = None,
+    ) -> None:
         """
-        Given a directory, uploads the contents to our artifacts docker volume.
+        Given a directory, uploads the contents to our artifacts docker volume. Only files that were added or changed
+        since the last upload are sent, and files removed locally are removed from the volume, unless `full` is given.
+        A `current_manifest` that was already computed for the directory can be passed to skip hashing it again.
+
+        File contents go into the volume's content-addressed store, and the project directory links to them, so
+        contents that are already stored, from this project or any other, are linked to instead of sent again.
+
+        Engines without a local container, such as remote engines, are sent files over HTTP in resumable, checksummed
+        chunks, which `chunked` can also turn on for local engines, for instance for very large models. Files sent
+        over HTTP are compressed according to `compression` ("auto", "zstd", "gzip", or "none"), which defaults to
+        the `upload_compression` setting.
         """
 
         directory = directory.resolve()
+        name = directory.name
 
-        # Create a temporary directory to hold our packed up files and create a tarball
-        with TemporaryDirectory() as temp_dir:
-            dir_archive = shutil.make_archive(
-                f"../{directory.name}",
-                "tar",
-                str(directory.parent),
-                str(directory.name),
+        manifest_path = local_manifest_path(directory)
+        if current_manifest is None:
+            current_manifest = directory_manifest(directory)
+
+        if chunked is None:
+            chunked = self.engine is None
+        if chunked:
+            if self._upload_over_http(
+                directory,
+                current_manifest,
+                full,
+                compression or settings.upload_compression,
+            ):
+                return
+            if self.engine is None:
+                raise UploadsUnsupportedError(self.url)
+            print(f"The engine at {self.url} does not accept chunked uploads")
+
+        store = self._fetch_store_index()
+        # Projects uploaded before the store existed hold plain copies, so they are moved into it with a full upload
+        if full or name not in store.projects:
+            remote_manifest: Manifest = {}
+        else:
+            remote_manifest = self._fetch_remote_manifest(name)
+        changed, deleted = diff_manifests(remote_manifest, current_manifest)
+
+        if not changed and not deleted:
+            save_manifest(manifest_path, current_manifest)
+            print(f"{directory} is already up to date on the Docker Volume")
+            return
+
+        # Stream the archive to the volume while it is being built: new blobs first, then links to them
+        members: List[ArchiveMember] = []
+        sent = set()
+        for relative_path in changed:
+            sha256 = current_manifest[relative_path]["sha256"]
+            if sha256 not in sent and (full or not store.has_blob(sha256)):
+                members.append((blob_path(sha256), directory / relative_path))
+                sent.add(sha256)
+            members.append((f"{name}/{relative_path}", HardLink(blob_path(sha256))))
+        members.append(
+            (
+                f"{name}/{MANIFEST_NAME}",
+                json.dumps(current_manifest, sort_keys=True).encode(),
+            )
+        )
+        tar_stream = TarStream(members)
+        try:
+            self.engine.put_archive(
+                self.volumes["artifacts"]["container"], iter(tar_stream)
+            )
+        except docker.errors.APIError:
+            if full:
+                raise
+            # A blob listed in the index is gone from the volume, so send everything
+            print("The artifact store index is out of date, uploading every file")
+            return self.upload_artifacts(
+                directory, full=True, current_manifest=current_manifest
+            )
+        finally:
+            tar_stream.close()
+
+        if deleted:
+            self._remove_remote_files(name, deleted)
+
+        with self._store_lock:
+            # Read the index again to keep what other uploads recorded in the meantime
+            store = self._fetch_store_index()
+            store.record_project(name, current_manifest)
+            self._save_store_index(store)
+
+        save_manifest(manifest_path, current_manifest)
+
+        print(
+            f"Successfully saved {directory} to {name} on the Docker Volume {self.volumes['artifacts']['host']} "
+            f"({len(changed)} changed, {len(changed) - len(sent)} already stored, {len(deleted)} deleted, "
+            f"{format_throughput(tar_stream)})"
+        )
+
+    def _upload_over_http(
+        self,
+        directory: Path,
+        current_manifest: Manifest,
+        full: bool,
+        compression: str = "auto",
+    ) -> bool:
+        """
+        Uploads a directory through the engine's HTTP upload protocol (see `starpack.uploads`). Returns whether the
+        engine supports it.
+        """
+        name = directory.name
+        response = self.session.get(
+            f"{self.url}/artifacts/index", timeout=self._timeouts
+        )
+        if response.status_code in UNSUPPORTED_STATUSES:
+            return False
+        response.raise_for_status()
+        store = StoreIndex.loads(response.content)
+        codecs = negotiate_codecs(response.headers.get("Accept-Encoding"), compression)
+
+        remote_manifest: Manifest = {}
+        if not full and name in store.projects:
+            response = self.session.get(
+                f"{self.url}/artifacts/{name}/manifest", timeout=self._timeouts
             )
+            if response.status_code == 200:
+                remote_manifest = response.json()
+        changed, deleted = diff_manifests(remote_manifest, current_manifest)
 
-            with open(dir_archive, "rb") as tar_data:
-                self.engine.put_archive(
-                    self.volumes["artifacts"]["container"], tar_data
+        if not changed and not deleted:
+            save_manifest(local_manifest_path(directory), current_manifest)
+            print(f"{directory} is already up to date on the engine")
+            return True
+
+        blobs: Dict[str, BlobUpload] = {}
+        for relative_path in changed:
+            entry = current_manifest[relative_path]
+            if full or not store.has_blob(entry["sha256"]):
+                blobs.setdefault(
+                    entry["sha256"],
+                    BlobUpload(
+                        entry["sha256"], entry["size"], directory / relative_path
+                    ),
                 )
+        uploader = ChunkedUploader(
+            self.session, self.url, self._timeouts, codecs=codecs
+        )
+        uploader.upload(list(blobs.values()))
+
+        response = self.session.post(
+            f"{self.url}/artifacts/{name}",
+            json={"manifest": current_manifest},
+            timeout=self._timeouts,
+        )
+        response.raise_for_status()
+        save_manifest(local_manifest_path(directory), current_manifest)
 
         print(
-            f"Successfully saved {directory} to {directory.name} on the Docker Volume {self.volumes['artifacts']['host']}"
+            f"Successfully uploaded {directory} to {name} on the engine at {self.url} "
+            f"({len(changed)} changed, {len(changed) - len(blobs)} already stored, {len(deleted)} deleted, "
+            f"{format_throughput(uploader)})"
         )
+        if codecs:
+            print(f"Upload {uploader.compression.summary()}")
+        return True
+
+    def collect_garbage(self, max_size: int, dry_run: bool = False) -> List[str]:
+        """
+        Removes blobs that no project references from the artifact store, least recently used first, until the store
+        fits in `max_size` bytes, and prints how much space each project uses. Returns the removed blobs.
+        """
+        with self._store_lock:
+            store = self._fetch_store_index()
+            evicted = store.plan_gc(max_size)
+            freed = sum(store.blobs[sha256]["size"] for sha256 in evicted)
+
+            if evicted and not dry_run:
+                store.remove_blobs(evicted)
+                self._save_store_index(store)
+                paths = [blob_path(sha256) for sha256 in evicted]
+                for start in range(0, len(paths), REMOVE_BATCH_SIZE):
+                    self.engine.exec_run(
+                        ["rm", "-f", "--", *paths[start : start + REMOVE_BATCH_SIZE]],
+                        workdir=self.volumes["artifacts"]["container"],
+                    )
+
+        print(store.usage_table())
+        action = "Would remove" if dry_run else "Removed"
+        print(f"{action} {len(evicted)} unreferenced blobs ({format_size(freed)})")
+        if store.size > max_size:
+            print(
+                f"The artifact store still uses {format_size(store.size)}, over its quota of "
+                f"{format_size(max_size)}, with files that projects reference"
+            )
+
+        return evicted
+
+    def _read_volume_file(self, relative_path: str) -> Optional[bytes]:
+        """
+        Reads a file from the artifacts volume, given its path relative to the volume, if it exists.
+        """
+        remote_path = f"{self.volumes['artifacts']['container']}/{relative_path}"
+        try:
+            stream, _ = self.engine.get_archive(remote_path)
+            archive = BytesIO(b"".join(stream))
+        except docker.errors.APIError:
+            return None
+
+        with tarfile.open(fileobj=archive) as tar:
+            try:
+                volume_file = tar.extractfile(posixpath.basename(relative_path))
+            except KeyError:
+                return None
+            return volume_file.read() if volume_file else None
+
+    def _fetch_remote_manifest(self, name: str) -> Manifest:
+        """
+        Reads the manifest mirrored on the artifacts volume for a given directory name, if there is one.
+        """
+        manifest_data = self._read_volume_file(f"{name}/{MANIFEST_NAME}")
+        try:
+            return json.loads(manifest_data or b"{}")
+        except ValueError:
+            return {}
+
+    def _fetch_store_index(self) -> StoreIndex:
+        """
+        Reads the index of the artifact store on the volume
+        """
+        return StoreIndex.loads(self._read_volume_file(INDEX_NAME))
+
+    def _save_store_index(self, store: StoreIndex) -> None:
+        """
+        Writes the index of the artifact store to the volume
+        """
+        tar_stream = TarStream([(INDEX_NAME, store.dumps())])
+        try:
+            self.engine.put_archive(
+                self.volumes["artifacts"]["container"], iter(tar_stream)
+            )
+        finally:
+            tar_stream.close()
+
+    def _remove_remote_files(self, name: str, paths: List[str]) -> None:
+        """
+        Removes files from a directory on the artifacts volume.
+        """
+        for start in range(0, len(paths), REMOVE_BATCH_SIZE):
+            self.engine.exec_run(
+                ["rm", "-f", "--", *paths[start : start + REMOVE_BATCH_SIZE]],
+                workdir=f"{self.volumes['artifacts']['container']}/{name}",
+            )
 
     def _find_engines(self) -> List[Container]:
-        engines = [
-            container
-            for container in self.docker_client.containers.list(all=True)
-            if ("app", self.app_label) in container.labels.items()
+        """
+        Lists the engine containers, letting the Docker daemon filter on our label, leaving out standbys
+        """
+        return [
+            engine
+            for engine in self.docker_client.containers.list(
+                all=True, filters={"label": f"app={self.app_label}"}
+            )
+            if not engine.name.startswith(STANDBY_PREFIX)
+        ]
+
+    def _find_standby_engines(self) -> List[Container]:
+        """
+        Lists the standby engine containers, which are told apart by their name as labels can't change once the
+        standby is promoted
+        """
+        return [
+            engine
+            for engine in self.docker_client.containers.list(
+                all=True,
+                filters={"label": f"app={self.app_label}", "name": STANDBY_PREFIX},
+            )
+            if engine.name.startswith(STANDBY_PREFIX)
         ]
-        return engines
+
+    def _connect_registered_engine(self) -> bool:
+        """
+        Connects to a running engine from the local registry, most recently seen first, avoiding listing every
+        container on the host. Registry entries for containers that no longer exist are dropped.
+        """
+        engines = sorted(
+            registry.load_engines().items(),
+            key=lambda item: item[1].get("last_seen", ""),
+            reverse=True,
+        )
+        for container_id, entry in engines:
+            try:
+                engine = self.docker_client.containers.get(container_id)
+            except docker.errors.NotFound:
+                registry.forget_engine(container_id)
+                continue
+            except docker.errors.APIError:
+                continue
+
+            if engine.labels.get("app") != self.app_label or engine.status != "running":
+                continue
+            if (engine.labels.get(POOL_SIZE_LABEL) or "1") != "1":
+                # Engines of a pool are connected to together
+                continue
+
+            previous_port = self.port
+            self.port = entry["port"]
+            if not self.check_health():
+                self.port = previous_port
+                continue
+
+            self.engine = engine
+            registry.record_engine(engine, self.port)
+            return True
+
+        return False
+
+    @staticmethod
+    def _engine_port(engine: Container) -> str:
+        """
+        Finds the host port an engine container publishes its API on, which Docker picked if none was asked for
+        """
+        for bindings in (
+            engine.attrs.get("HostConfig", {}).get("PortBindings"),
+            engine.attrs.get("NetworkSettings", {}).get("Ports"),
+        ):
+            port = ((bindings or {}).get("1976/tcp") or [{}])[0].get("HostPort")
+            if port:
+                return port
+
+        raise EngineInitializationError()
 
     def _init_docker_client(self) -> None:
         """
@@ -227,25 +1139,75 @@ class StarpackClient:
         except docker.errors.DockerException:
             raise DockerNotFoundError()
 
-    def _engine_startup_check(self) -> None:
-        # Check the engine status a few times
-        max_attempts = 5
-        success = False
-        for _ in track(
-            range(max_attempts), description="Waiting for the engine to come up..."
-        ):
-            if not success:
-                success = self.check_health()
-                sleep(1)
+    def _engine_startup_check(
+        self, mode: str = "cold", start: Optional[float] = None
+    ) -> None:
+        """
+        Waits for the engine to answer its healthcheck and records how long it took, counting from `start` if given,
+        along with how it was started
+        """
+        with Console().status("Waiting for the engine to come up..."):
+            self.startup_latency = wait_for_engine(
+                self.check_health,
+                timeout=settings.engine_startup_timeout,
+                docker_client=getattr(self, "docker_client", None),
+                container=getattr(self, "engine", None),
+            )
+        if start is not None:
+            self.startup_latency = perf_counter() - start
+
+        record_startup_latency(self.url, self.startup_latency, mode=mode)
+
+    @contextmanager
+    def _dispatch(self) -> Iterator[Optional[PoolMember]]:
+        """
+        Sends the requests this thread makes within to the pool engine with the fewest outstanding ones, if there is
+        a pool, yielding that engine
+        """
+        if self.pool is None or getattr(self._local, "member", None) is not None:
+            yield None
+            return
 
-        if not success:
-            raise EngineInitializationError()
+        member = self.pool.acquire(timeout=settings.engine_startup_timeout)
+        self._local.member = member
+        try:
+            yield member
+        finally:
+            self._local.member = None
+            self.pool.release(member)
+
+    def _dispatched(self, request: Callable[..., T], *args: Any) -> T:
+        """
+        Makes a request on a pool engine. An engine that drops the connection is evicted, to be replaced, and the
+        request is tried again on another one.
+        """
+        attempts = len(self.pool) + 1 if self.pool is not None else 1
+        for attempt in range(attempts):
+            with self._dispatch() as member:
+                try:
+                    return request(*args)
+                except requests.ConnectionError:
+                    if member is None or attempt == attempts - 1:
+                        raise
+                    print(f"Lost the engine at {member.url}, trying another one")
+                    self.pool.evict(member)
+
+    @property
+    def _timeouts(self) -> Tuple[float, Optional[float]]:
+        """
+        Connection and read timeouts for engine requests, where builds may legitimately take a long time to answer
+        """
+        return (CONNECT_TIMEOUT, self.timeout)
 
     @property
     def url(self):
         """
-        Allows for edge cases if we just have the engine registered with a FQDN
+        Allows for edge cases if we just have the engine registered with a FQDN. Requests dispatched to an engine of
+        the pool go to that engine.
         """
+        member = getattr(self._local, "member", None)
+        if member is not None:
+            return member.url
         if self.port is not None:
             return f"{self.host}:{self.port}"
         else:
@@ -0,0 +1,194 @@
+from collections import Counter
+import gzip
+from math import log2
+from pathlib import Path
+from threading import Lock, local
+from time import thread_time
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional: `pip install starpack[zstd]`
+    zstandard = None
+
+# Codecs that uploads can be compressed with, preferred first, and the setting values that choose between them
+AVAILABLE_CODECS: List[str] = (["zstd"] if zstandard else []) + ["gzip"]
+COMPRESSION_MODES = ("auto", "zstd", "gzip", "none")
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Files smaller than this aren't worth the overhead
+MIN_COMPRESSED_SIZE = 1024
+SAMPLE_SIZE = 64 * 1024
+# Bits of entropy per byte above which a sample is taken to be already compressed or random
+MAX_ENTROPY = 7.5
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".csv",
+    ".tsv",
+    ".txt",
+    ".json",
+    ".jsonl",
+    ".ipynb",
+    ".py",
+    ".yaml",
+    ".yml",
+    ".md",
+    ".html",
+    ".xml",
+    ".sql",
+}
+COMPRESSED_EXTENSIONS = {
+    ".gz",
+    ".tgz",
+    ".zip",
+    ".bz2",
+    ".xz",
+    ".zst",
+    ".7z",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".mp3",
+    ".mp4",
+    ".parquet",
+}
+
+_zstd_contexts = local()
+
+
+def negotiate_codecs(accept_encoding: Optional[str], mode: str = "auto") -> List[str]:
+    """
+    Codecs to compress uploads with, given those the engine accepts (from its `Accept-Encoding` header) and the
+    compression mode: "auto" for the best codec both sides support, a codec name to only use that one, or "none"
+    """
+    accepted = {
+        codec.split(";")[0].strip() for codec in (accept_encoding or "").split(",")
+    }
+    candidates = AVAILABLE_CODECS if mode == "auto" else [mode]
+    return [
+        codec for codec in candidates if codec in accepted and codec in AVAILABLE_CODECS
+    ]
+
+
+def sample_entropy(path: Path, size: int) -> float:
+    """
+    Shannon entropy, in bits per byte, of samples from the start, middle, and end of a file
+    """
+    samples = bytearray()
+    with open(path, "rb") as file_data:
+        for offset in {
+            0,
+            max(0, size // 2 - SAMPLE_SIZE // 2),
+            max(0, size - SAMPLE_SIZE),
+        }:
+            file_data.seek(offset)
+            samples += file_data.read(SAMPLE_SIZE)
+
+    if not samples:
+        return 0.0
+    total = len(samples)
+    return -sum(
+        count / total * log2(count / total) for count in Counter(samples).values()
+    )
+
+
+def choose_codec(path: Path, size: int, codecs: Iterable[str]) -> Optional[str]:
+    """
+    Picks the codec to send a file with, or None to send it as is. Text formats are always compressed and known
+    compressed formats never are; anything else, such as pickled models, is compressed when a sample of it looks
+    compressible.
+    """
+    codecs = list(codecs)
+    if not codecs or size < MIN_COMPRESSED_SIZE:
+        return None
+
+    extension = path.suffix.lower()
+    if extension in COMPRESSED_EXTENSIONS:
+        return None
+    if (
+        extension not in COMPRESSIBLE_EXTENSIONS
+        and sample_entropy(path, size) > MAX_ENTROPY
+    ):
+        return None
+
+    return codecs[0]
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        # Compression contexts can't be shared between threads
+        if not hasattr(_zstd_contexts, "compressor"):
+            _zstd_contexts.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return _zstd_contexts.compressor.compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+class CompressionStats:
+    """
+    Tally of how much compressing an upload saved and the CPU time it took, safe to update from several threads
+    """
+
+    def __init__(self) -> None:
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+        self.cpu_seconds = 0.0
+        self.files: Dict[str, int] = {}
+        self._lock = Lock()
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.compressed_bytes
+
+    def count_file(self, codec: str) -> None:
+        with self._lock:
+            self.files[codec] = self.files.get(codec, 0) + 1
+
+    def compress(self, data: bytes, codec: str) -> bytes:
+        """
+        Compresses data, recording the bytes saved and the CPU time spent. Data that doesn't get any smaller is
+        returned as is.
+        """
+        start = thread_time()
+        compressed = compress(data, codec)
+        elapsed = thread_time() - start
+        if len(compressed) >= len(data):
+            compressed = data
+
+        with self._lock:
+            self.original_bytes += len(data)
+            self.compressed_bytes += len(compressed)
+            self.cpu_seconds += elapsed
+
+        return compressed
+
+    def summary(self) -> str:
+        """
+        Human-readable summary of the savings against the cost
+        """
+        if not self.files:
+            return "no files compressed"
+
+        files = ", ".join(
+            f"{count} with {codec}" for codec, count in self.files.items()
+        )
+        megabytes = 1024 * 1024
+        return (
+            f"compressed {files}: {self.original_bytes / megabytes:.1f} MB to "
+            f"{self.compressed_bytes / megabytes:.1f} MB, saving {self.saved_bytes / megabytes:.1f} MB "
+            f"for {self.cpu_seconds:.2f}s of CPU time"
+        )
@@ -1,41 +1,174 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
-
-from starpack import initialize, __version__, utils
-from starpack.client import StarpackClient
+from time import perf_counter, sleep
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
+
+from requests import HTTPError
+from rich import print
+from rich.progress import Progress, TextColumn, TimeElapsedColumn
+from rich.table import Table
+
+from starpack import __version__, proxy, utils
+from starpack._config import settings
+from starpack.initialize import initialize_directory
+from starpack.build_cache import label_payload, package_digest
+from starpack.client import DEFAULT_POOL_SIZE, StarpackClient
+from starpack.deploy_plan import (
+    DeploymentPlan,
+    RunningContainer,
+    deployment_payload,
+    desired_state,
+    plan_deployment,
+)
 from starpack.errors import *
+from starpack.jobs import load_last_job
+from starpack.manifest import Manifest, directory_manifest
+from starpack.scoring import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RETRIES,
+    RETRY_STATUSES,
+    BatchScorer,
+    ScoringReport,
+    prediction_url,
+)
+from starpack.tabular import DEFAULT_CHUNK_ROWS, TableWriter, read_chunks
+from starpack.wire import parse_value
+
+# The load generator and prediction client are imported by `bench` when it runs, keeping them out of other commands
+if TYPE_CHECKING:
+    from starpack.bench import BenchReport
+
+# Rows of the data a load test replays, cycling through them when it sends more requests
+MAX_BENCH_ROWS = 10_000
+
+
+class PackageResult(NamedTuple):
+    """
+    Outcome of packaging one project directory
+    """
 
-
-def upload(directory: Path, client: Optional[StarpackClient] = None) -> None:
+    directory: Path
+    name: Optional[str]
+    succeeded: bool
+    seconds: float
+    error: Optional[str] = None
+    cached: bool = False
+
+
+def upload(
+    directory: Path,
+    client: Optional[StarpackClient] = None,
+    full: bool = False,
+    strict: bool = False,
+    chunked: Optional[bool] = None,
+    compression: Optional[str] = None,
+) -> None:
     """
-    Uploads the contents of a local directory to the Starpack Engine
+    Uploads the contents of a local directory to the Starpack Engine. Unless `full` is given, only
+    files that changed since the last upload are sent. With `strict`, only the files referenced by the
+    directory's "starpack.yaml" are sent. With `chunked`, files are sent over HTTP in resumable chunks,
+    compressed according to `compression`.
     """
+    current_manifest = None
+    if strict:
+        _, current_manifest = _load_project(
+            _project_file(directory), sections=("package",), strict=True
+        )
 
     if not client:
         client = StarpackClient(start=True, docker=True)
 
-    client.upload_artifacts(directory=directory)
+    client.upload_artifacts(
+        directory=directory,
+        full=full,
+        current_manifest=current_manifest,
+        chunked=chunked,
+        compression=compression,
+    )
 
 
-def initialize_directory(directory: Path, overwrite: bool = False) -> None:
+def initialize_engine(
+    force: bool = True, replicas: Optional[int] = None
+) -> StarpackClient:
     """
-    Starts the starpack-engine container locally and furthermore initializes
-    the given directory if given with starter code, an example
-    requirements.txt, and an example starpack.yaml
+    Starts the Starpack Engine. If given an image name, will initialize that image. If given a number of replicas,
+    starts a pool of that many engines.
     """
-    if directory:
-        directory = directory.resolve()
-        directory.mkdir(parents=True, exist_ok=True)
-        initialize.initialize_project_files(directory, overwrite=overwrite)
+    client = StarpackClient(start=True, docker=True, force=force, replicas=replicas)
+
+    return client
 
 
-def initialize_engine(force: bool = True) -> StarpackClient:
+def prepare_standby() -> None:
     """
-    Starts the Starpack Engine. If given an image name, will initialize that image. If given
+    Makes sure a standby engine is ready for the next start, according to the `engine_standby` setting
     """
-    client = StarpackClient(start=True, docker=True, force=force)
+    client = StarpackClient(docker=True)
+    client.prepare_standby()
 
-    return client
+
+def reap_idle_engines(wait: bool = True) -> List[str]:
+    """
+    Shuts down the engines no Starpack process has used for the `engine_idle_timeout` setting, first waiting out
+    the timeout when `wait` is given. Returns the names of the engines removed.
+    """
+    idle_timeout = settings.engine_idle_timeout
+    if idle_timeout <= 0:
+        return []
+    if wait:
+        sleep(idle_timeout)
+
+    client = StarpackClient(docker=True)
+    removed = client.reap_idle_engines(idle_timeout)
+    for name in removed:
+        print(f"Removed {name}, idle for over {idle_timeout:.0f}s")
+
+    return removed
+
+
+def engine_status(client: Optional[StarpackClient] = None) -> None:
+    """
+    Prints the engine containers and standbys, and how long the engine took to start, by the way it was started
+    """
+    from starpack.readiness import latency_summary, load_startup_latencies
+
+    if not client:
+        client = StarpackClient(docker=True)
+
+    print(client.status_table())
+
+    records = load_startup_latencies()
+    table = Table(title="Startup latency")
+    table.add_column("Started from")
+    table.add_column("Starts", justify="right")
+    table.add_column("Median", justify="right")
+    table.add_column("Worst", justify="right")
+    for mode, summary in latency_summary(records).items():
+        table.add_row(
+            mode,
+            str(summary["starts"]),
+            f"{summary['median'] * 1000:.0f}ms",
+            f"{summary['max'] * 1000:.0f}ms",
+        )
+    print(table)
+
+    if records:
+        last = records[-1]
+        print(
+            f"Last start: {last['seconds'] * 1000:.0f}ms from {last.get('mode', 'cold')} "
+            f"at {last['timestamp']}"
+        )
+
+
+def pull_engine_image() -> bool:
+    """
+    Checks the registry for a newer Starpack Engine image and pulls it if there is one, whatever the pull policy.
+    Returns whether the image was pulled.
+    """
+    from starpack.pulls import ensure_engine_image
+
+    client = StarpackClient(docker=True)
+    return ensure_engine_image(client.docker_client, force=True)
 
 
 def terminate(
@@ -51,9 +184,32 @@ def terminate(
     client.terminate(all_resources)
 
 
-def package(yaml_path: Path, client: Optional[StarpackClient] = None) -> None:
+def collect_garbage(
+    max_size: Optional[int] = None,
+    dry_run: bool = False,
+    client: Optional[StarpackClient] = None,
+) -> List[str]:
+    """
+    Frees space on the engine's artifact store by removing files no project uses anymore, least recently used first,
+    until the store fits in `max_size` bytes (by default, the `artifact_store_max_size` setting)
+    """
+    from starpack.store import parse_size
+
+    if max_size is None:
+        max_size = parse_size(settings.artifact_store_max_size)
+
+    if not client:
+        client = StarpackClient(start=True, docker=True)
+
+    return client.collect_garbage(max_size, dry_run=dry_run)
+
+
+def package(
+    yaml_path: Path, client: Optional[StarpackClient] = None, detach: bool = False
+) -> None:
     """
-    Takes a YAML file or directory to start the packaging process into a Docker image
+    Takes a YAML file or directory to start the packaging process into a Docker image. With `detach`, the package
+    job is submitted without following its progress.
     """
     if not yaml_path.exists():
         raise PathExistsError(yaml_path)
@@ -63,26 +219,51 @@ def package(yaml_path: Path, client: Optional[StarpackClient] = None) -> None:
 
     input_dict = utils.load_yaml(yaml_path)
 
-    client.package(input_dict)
+    client.package(input_dict, detach=detach)
 
 
-def package_directory(directory: Path, client: Optional[StarpackClient] = None) -> None:
+def package_directory(
+    directory: Path,
+    client: Optional[StarpackClient] = None,
+    detach: bool = False,
+    strict: bool = False,
+    force: bool = False,
+) -> None:
     """
-    Given a directory, uploads the contents, finds the "starpack.yaml", and converts into into a JSON payload for the Starpack Engine to run packaging
+    Given a directory, uploads the contents, finds the "starpack.yaml", and converts into into a JSON payload for the Starpack Engine to run packaging.
+    Packaging is skipped when an image was already built from the same spec and artifacts, unless `force` is given.
     """
     if not directory.is_dir():
-        return package(directory)
+        return package(directory, detach=detach)
 
-    yaml_file = directory / "starpack.yaml"
+    client, input_dict, current_manifest = _prepare_directory(
+        directory, client, sections=("package",), strict=strict
+    )
+
+    if not _package_if_changed(
+        client, directory, input_dict, current_manifest, force=force, detach=detach
+    ):
+        raise PackageFailedError(input_dict["package"]["metadata"]["name"])
 
-    if not yaml_file.exists():
-        raise PathExistsError(yaml_file)
+
+def attach_package_job(
+    job_id: Optional[str] = None, client: Optional[StarpackClient] = None
+) -> bool:
+    """
+    Reattaches to a running package job, by default the most recently submitted one, and follows it to the end
+    """
+    last_job = load_last_job()
+    job_id = job_id or (last_job.job_id if last_job else None)
+    if not job_id:
+        print("No package job to attach to")
+        return False
 
     if not client:
         client = StarpackClient(start=True, docker=True)
 
-    upload(directory, client=client)
-    package(yaml_file, client=client)
+    # Jobs are followed on the engine that accepted them, which in a pool isn't always the one a new client picks
+    url = last_job.url if last_job and last_job.job_id == job_id else None
+    return client.follow_job(job_id, url=url)
 
 
 def deploy(yaml_path: Path, client: Optional[StarpackClient] = None) -> None:
@@ -98,20 +279,615 @@ def deploy(yaml_path: Path, client: Optional[StarpackClient] = None) -> None:
     client.deploy(input_dict)
 
 
-def deploy_directory(directory: Path, client: Optional[StarpackClient] = None) -> None:
+def deploy_directory(
+    directory: Path,
+    client: Optional[StarpackClient] = None,
+    strict: bool = False,
+    force: bool = False,
+    replicas: Optional[int] = None,
+) -> None:
     """
-    Given a directory, uploads the contents, packages, and runs deployment.
+    Given a directory, uploads the contents, packages, and runs deployment. The running containers of the deployment
+    are compared against the starpack.yaml first, and only the wrappers whose image, port, or environment changed
+    are redeployed, so deploying an unchanged project does nothing. Packaging is skipped when an image was already
+    built from the same spec and artifacts. With `force`, the package is rebuilt and every wrapper redeployed.
+
+    With `replicas`, or a `replicas` count in the deploy step, each wrapper runs as that many containers behind a
+    local proxy on the wrapper's port. Replicas are replaced one deployment at a time: the new ones start alongside
+    the old, the proxy switches to them, and the old ones are removed once their connections are drained.
     """
     if not directory.is_dir():
         return deploy(directory)
 
+    client, input_dict, current_manifest = _prepare_directory(
+        directory, client, sections=("package", "deployment"), strict=strict
+    )
+
+    plan = _plan_deployment(
+        client, input_dict, current_manifest, force=force, replicas=replicas
+    )
+    if plan is not None and plan.up_to_date:
+        _route_proxies(client, plan)
+        print(f"{plan.deployment} is up to date, nothing to deploy")
+        return
+    if plan is not None:
+        print(plan.table())
+
+    # A failed build leaves the running containers alone
+    if not _package_if_changed(
+        client, directory, input_dict, current_manifest, force=force
+    ):
+        raise PackageFailedError(input_dict["package"]["metadata"]["name"])
+    if plan is None:
+        client.deploy(input_dict)
+        return
+
+    # Replicas behind a proxy keep serving until their replacements are up, while other containers hold the port
+    # their replacement or a proxy needs, so they go first
+    proxied = {container.wrapper for container in plan.desired if container.proxied}
+    rolling = [
+        container
+        for container in plan.to_remove
+        if container.proxied and container.wrapper in proxied
+    ]
+    _stop_proxies(plan)
+    client.remove_containers(
+        [container for container in plan.to_remove if container not in rolling]
+    )
+    if plan.to_deploy:
+        client.deploy(deployment_payload(input_dict, plan))
+    _route_proxies(client, plan, rolling)
+
+
+def plan_deploy(
+    directory: Path,
+    client: Optional[StarpackClient] = None,
+    strict: bool = False,
+    force: bool = False,
+    replicas: Optional[int] = None,
+) -> Optional[DeploymentPlan]:
+    """
+    Shows what deploying a directory would change, without changing anything. Returns None when its starpack.yaml
+    has no deploy step listing wrappers, which can't be planned.
+
+    The running containers are read from Docker, so the engine is neither started nor pulled for a plan.
+    """
+    if not directory.is_dir():
+        directory = directory.parent
+
+    input_dict, current_manifest = _load_project(
+        _project_file(directory), sections=("package", "deployment"), strict=strict
+    )
+    if not client:
+        client = StarpackClient(docker=True)
+
+    plan = _plan_deployment(
+        client, input_dict, current_manifest, force=force, replicas=replicas
+    )
+    if plan is None:
+        print("The deployment has no step listing wrappers, so it can't be planned")
+    else:
+        print(plan.table())
+        if plan.up_to_date:
+            print(f"{plan.deployment} is up to date, nothing to deploy")
+
+    return plan
+
+
+def predict(
+    deployment: str,
+    input_path: Path,
+    output_path: Optional[Path] = None,
+    model: Optional[str] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    retries: int = DEFAULT_RETRIES,
+    wire_format: str = "auto",
+    client: Optional[StarpackClient] = None,
+) -> ScoringReport:
+    """
+    Scores a CSV, JSON Lines, or Parquet file against a deployment, given its name or URL, a chunk of rows at a time,
+    and writes the predictions in the order of the input to `output_path`, which defaults to the input's name with
+    `_predictions` appended. Rows are sent in `wire_format`, Arrow by default when pyarrow is installed. The rows
+    scored per second are shown while it runs.
+    """
+    url = _prediction_url(deployment, model, client)
+    output_path = output_path or input_path.with_name(
+        f"{input_path.stem}_predictions{input_path.suffix}"
+    )
+
+    with BatchScorer(
+        url, concurrency=concurrency, retries=retries, wire_format=wire_format
+    ) as scorer, TableWriter(output_path) as writer, Progress(
+        TextColumn("Scoring {task.fields[name]}"),
+        TextColumn("{task.completed:,.0f} rows"),
+        TextColumn("{task.fields[rate]}"),
+        TimeElapsedColumn(),
+    ) as progress:
+        task = progress.add_task("score", name=input_path.name, rate="")
+        start = perf_counter()
+
+        def on_chunk(rows: int) -> None:
+            progress.advance(task, rows)
+            elapsed = perf_counter() - start
+            rate = progress.tasks[task].completed / elapsed if elapsed else 0
+            progress.update(task, rate=f"{rate:,.0f} rows/s")
+
+        report = scorer.score(read_chunks(input_path, chunk_rows), writer, on_chunk)
+
+    print(report.summary())
+    print(f"Saved the predictions to {output_path}")
+    return report
+
+
+def bench(
+    deployment: str,
+    project_dir: Path = Path("."),
+    data_path: Optional[Path] = None,
+    model: Optional[str] = None,
+    rate: Optional[float] = None,
+    concurrency: Optional[int] = None,
+    duration: Optional[float] = None,
+    requests: Optional[int] = None,
+    output_path: Optional[Path] = None,
+    compare_path: Optional[Path] = None,
+    label: Optional[str] = None,
+    client: Optional[StarpackClient] = None,
+) -> "BenchReport":
+    """
+    Load tests a deployment, given its name or URL, by replaying rows of `data_path`, or of the project's
+    `validation_data`, one row per request: at a fixed `rate` of requests per second, or else closed loop with
+    `concurrency` requests in flight. Prints the throughput, error rate, and latency percentiles, and saves them in a
+    JSON report to `output_path`, comparing them with the report at `compare_path` if given. `concurrency` and
+    `duration` default to those of `starpack.bench`.
+    """
+    from starpack import bench as load_test
+    from starpack.prediction import PredictionClient
+
+    concurrency = load_test.DEFAULT_CONCURRENCY if concurrency is None else concurrency
+    duration = load_test.DEFAULT_DURATION if duration is None else duration
+
+    url = _prediction_url(deployment, model, client)
+    records = _bench_records(data_path or _validation_data(project_dir))
+
+    # One prediction first, to check the deployment answers and find which requests it takes
+    with PredictionClient(url) as prediction_client:
+        try:
+            prediction_client.predict_many(records[:1])
+        except HTTPError as error:
+            # A deployment too busy to answer is what a load test is there to find out
+            if error.response.status_code not in RETRY_STATUSES:
+                raise DeploymentUnreachableError(url, str(error))
+        except (OSError, ValueError) as error:
+            raise DeploymentUnreachableError(url, str(error))
+        make_request = (
+            load_test.record_request
+            if prediction_client.records_supported
+            else load_test.table_request
+        )
+
+    report = load_test.BenchReport(
+        deployment,
+        url,
+        "fixed-rate" if rate else "closed-loop",
+        rate or concurrency,
+        label,
+    )
+    generator = load_test.LoadGenerator(
+        url,
+        [make_request(url, record) for record in records],
+        rate=rate,
+        concurrency=concurrency,
+        duration=duration,
+        max_requests=requests,
+    )
+    target = f"{rate:g} requests/s" if rate else f"{concurrency} concurrent requests"
+    print(f"Sending {len(records)} rows to {url} at {target}")
+    generator.run(report)
+
+    baseline = load_test.BenchReport.load(compare_path) if compare_path else None
+    print_bench_report(report, baseline)
+    if output_path is None:
+        # Deployments given by URL are named after their model
+        name = deployment if not deployment.startswith("http") else url.split("/")[-1]
+        output_path = Path(f"{name}_bench.json")
+    report.save(output_path)
+    print(f"Saved the report to {output_path}")
+    return report
+
+
+def print_bench_report(
+    report: "BenchReport", baseline: Optional["BenchReport"] = None
+) -> None:
+    """
+    Prints the figures of a load test, next to those of an earlier one with the change between them
+    """
+    table = Table(title=f"Bench of {report.deployment}")
+    table.add_column("Metric")
+    if baseline is not None:
+        table.add_column(baseline.label or baseline.created, justify="right")
+    table.add_column(report.label or "This run", justify="right")
+    if baseline is not None:
+        table.add_column("Change", justify="right")
+
+    metrics = report.metrics()
+    baseline_metrics = baseline.metrics() if baseline is not None else {}
+    for name, value in metrics.items():
+        row = [name]
+        if baseline is not None:
+            before = baseline_metrics.get(name)
+            row.append(_format_metric(name, before) if before is not None else "-")
+        row.append(_format_metric(name, value))
+        if baseline is not None:
+            row.append(_format_change(name, before, value))
+        table.add_row(*row)
+
+    # Requests that got no answer at all have status 0
+    failures = ", ".join(
+        f"{status or 'no answer'}: {count}"
+        for status, count in sorted(report.statuses.items())
+        if not 200 <= status < 300
+    )
+    print(table)
+    print(
+        f"{report.requests} requests in {report.seconds:.1f}s, {report.errors} errors"
+        + (f" ({failures})" if failures else "")
+    )
+
+
+def package_directories(
+    paths: List[Path],
+    jobs: int = 1,
+    client: Optional[StarpackClient] = None,
+    strict: bool = False,
+    force: bool = False,
+) -> List[PackageResult]:
+    """
+    Packages many directories (or glob patterns of directories) against one shared engine, running up to `jobs`
+    projects at a time. A failing project does not stop the others; a summary of every project is printed at the end.
+    """
+    directories = utils.expand_paths(paths)
+    jobs = max(1, jobs)
+
+    with ThreadPoolExecutor(max_workers=1) as engine_executor:
+        engine_ready = _start_engine(
+            engine_executor, client, pool_size=max(jobs, DEFAULT_POOL_SIZE)
+        )
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(
+                executor.map(
+                    lambda directory: _package_project(
+                        directory, engine_ready, strict, force
+                    ),
+                    directories,
+                )
+            )
+
+    print_package_summary(results)
+    return results
+
+
+def print_package_summary(results: List[PackageResult]) -> None:
+    """
+    Prints a table of how each project's packaging went
+    """
+    table = Table(title="Package summary")
+    table.add_column("Project")
+    table.add_column("Package")
+    table.add_column("Result")
+    table.add_column("Time", justify="right")
+
+    for result in results:
+        table.add_row(
+            str(result.directory),
+            result.name or "-",
+            (
+                "[green]up to date[/green]"
+                if result.cached
+                else (
+                    "[green]succeeded[/green]"
+                    if result.succeeded
+                    else f"[red]failed[/red] {result.error or ''}".strip()
+                )
+            ),
+            f"{result.seconds:.1f}s",
+        )
+
+    succeeded = sum(result.succeeded for result in results)
+    print(table)
+    print(f"{succeeded}/{len(results)} projects packaged successfully")
+
+
+def _package_project(
+    directory: Path,
+    engine_ready: "Future[StarpackClient]",
+    strict: bool = False,
+    force: bool = False,
+) -> PackageResult:
+    """
+    Prepares, uploads, and packages a single project, capturing any failure in its result
+    """
+    start = perf_counter()
+    name = None
+    cached = False
+    try:
+        input_dict, current_manifest = _load_project(
+            _project_file(directory), sections=("package",), strict=strict
+        )
+        name = input_dict["package"]["metadata"]["name"]
+        client = engine_ready.result()
+        cached = not force and bool(_built_image(client, input_dict, current_manifest))
+        succeeded = cached or _package_if_changed(
+            client, directory, input_dict, current_manifest, force=True
+        )
+        error = None if succeeded else "engine rejected the package"
+    except Exception as exception:
+        succeeded = False
+        error = str(exception) or type(exception).__name__
+
+    return PackageResult(
+        directory, name, succeeded, perf_counter() - start, error, cached
+    )
+
+
+def _package_if_changed(
+    client: StarpackClient,
+    directory: Path,
+    input_dict: Dict[str, Any],
+    current_manifest: Manifest,
+    force: bool = False,
+    detach: bool = False,
+) -> bool:
+    """
+    Uploads and packages a project, unless an image was already built from the same package spec and artifacts.
+    The image is labelled with the build digest so that the next package of the same project can find it.
+    """
+    if not force and _built_image(client, input_dict, current_manifest):
+        return True
+
+    digest = package_digest(input_dict, current_manifest)
+    client.upload_artifacts(directory, current_manifest=current_manifest)
+    return client.package(label_payload(input_dict, digest), detach=detach)
+
+
+def _built_image(
+    client: StarpackClient, input_dict: Dict[str, Any], current_manifest: Manifest
+) -> Optional[str]:
+    """
+    Finds the image already built from the same package spec and artifacts, if there is one
+    """
+    image = client.find_built_image(package_digest(input_dict, current_manifest))
+    if image:
+        print(
+            f"{input_dict['package']['metadata']['name']} is unchanged since {image} was built, "
+            f"skipping packaging (pass --force to rebuild)"
+        )
+
+    return image
+
+
+def _plan_deployment(
+    client: StarpackClient,
+    input_dict: Dict[str, Any],
+    current_manifest: Manifest,
+    force: bool = False,
+    replicas: Optional[int] = None,
+) -> Optional[DeploymentPlan]:
+    """
+    Compares the containers the starpack.yaml describes, running the image built from its package spec and artifacts,
+    against those running for the deployment
+    """
+    desired = desired_state(
+        input_dict, package_digest(input_dict, current_manifest), replicas=replicas
+    )
+    if not desired:
+        return None
+
+    name = input_dict["deployment"]["metadata"]["name"]
+    return plan_deployment(
+        name, desired, client.find_deployed_containers(name), force=force
+    )
+
+
+def _stop_proxies(plan: DeploymentPlan) -> None:
+    """
+    Stops the proxies of wrappers that are no longer replicated, or no longer deployed, freeing their port
+    """
+    proxied = {container.wrapper for container in plan.desired if container.proxied}
+    for change in plan.changes:
+        name = proxy.proxy_name(plan.deployment, change.wrapper)
+        if change.wrapper not in proxied and proxy.load_config(name) is not None:
+            proxy.stop_proxy(name)
+            print(f"Stopped the proxy for {change.wrapper}")
+
+
+def _route_proxies(
+    client: StarpackClient,
+    plan: DeploymentPlan,
+    retired: Optional[List[RunningContainer]] = None,
+) -> None:
+    """
+    Points the proxy of each replicated wrapper at its current replicas once they accept connections, starting the
+    proxy if it isn't running, then removes the retired replicas once the proxy drained them
+    """
+    replicated = [container for container in plan.desired if container.proxied]
+    if not replicated:
+        return
+
+    retired = retired or []
+    retired_ids = {container.id for container in retired}
+    running = client.find_deployed_containers(plan.deployment) or []
+    for desired in replicated:
+        name = proxy.proxy_name(plan.deployment, desired.wrapper)
+        backends = [
+            f"127.0.0.1:{container.published}"
+            for container in running
+            if container.wrapper == desired.wrapper
+            and container.id not in retired_ids
+            and container.published
+        ]
+        if not proxy.wait_for_backends(backends, settings.engine_startup_timeout):
+            print(
+                f"Some replicas of {desired.wrapper} are not accepting connections yet"
+            )
+
+        proxy.route(name, desired.port, backends)
+        if not proxy.ensure_proxy(name):
+            raise ProxyStartError(name)
+        print(
+            f"Serving {desired.wrapper} at http://localhost:{desired.port} across {len(backends)} replicas"
+        )
+
+        old = [
+            f"127.0.0.1:{container.published}"
+            for container in retired
+            if container.wrapper == desired.wrapper
+        ]
+        if old and not proxy.wait_for_drain(name, old, settings.proxy_drain_timeout):
+            print(
+                f"Connections to the old replicas of {desired.wrapper} did not finish in time, closing them"
+            )
+
+    client.remove_containers(retired)
+
+
+def _prediction_url(
+    deployment: str, model: Optional[str], client: Optional[StarpackClient]
+) -> str:
+    """
+    The prediction endpoint of a deployment, given as a URL, or by name for a local deployment
+    """
+    if deployment.startswith(("http://", "https://")):
+        if "/models/predict/" in deployment:
+            return deployment
+        if not model:
+            raise MissingModelError(deployment)
+        return prediction_url(deployment, model)
+
+    if client is None:
+        client = StarpackClient(docker=True)
+    endpoint = client.find_deployment_endpoint(deployment)
+    if endpoint is None:
+        raise DeploymentNotFoundError(deployment)
+
+    base_url, found_model = endpoint
+    return prediction_url(base_url, model or found_model)
+
+
+def _validation_data(project_dir: Path) -> Path:
+    """
+    The validation data of a project, which its starpack.yaml lists among its artifacts
+    """
+    yaml_file = project_dir / "starpack.yaml"
+    if not yaml_file.exists():
+        raise PathExistsError(yaml_file)
+
+    payload = utils.load_yaml(yaml_file)
+    utils.validate_payload(payload, yaml_file)
+    validation_data = (payload["package"].get("artifacts") or {}).get("validation_data")
+    if not validation_data:
+        raise MissingBenchDataError(yaml_file)
+
+    data_path = project_dir / validation_data
+    if not data_path.exists():
+        raise PathExistsError(data_path)
+    return data_path
+
+
+def _bench_records(data_path: Path) -> List[Dict[str, Any]]:
+    chunk = next(iter(read_chunks(data_path, MAX_BENCH_ROWS)), None)
+    if chunk is None or not chunk.rows:
+        raise MissingBenchDataError(data_path)
+    return [
+        {column: parse_value(value) for column, value in zip(chunk.columns, row)}
+        for row in chunk.rows
+    ]
+
+
+def _format_metric(name: str, value: float) -> str:
+    if name == "throughput":
+        return f"{value:,.1f}/s"
+    if name == "error_rate":
+        return f"{value:.2%}"
+    return f"{value:,.2f}ms"
+
+
+def _format_change(name: str, before: Optional[float], after: float) -> str:
+    """
+    The relative change of a metric, green when it got better
+    """
+    if before is None:
+        return "-"
+    if name == "error_rate":
+        change = f"{(after - before) * 100:+.2f}pp"
+    elif before:
+        change = f"{(after - before) / before:+.1%}"
+    else:
+        return "-"
+    if after == before:
+        return change
+    better = after > before if name == "throughput" else after < before
+    return f"[green]{change}[/green]" if better else f"[red]{change}[/red]"
+
+
+def _start_engine(
+    executor: ThreadPoolExecutor,
+    client: Optional[StarpackClient],
+    pool_size: int = DEFAULT_POOL_SIZE,
+) -> "Future[StarpackClient]":
+    """
+    Starts the engine in the background unless a client was already given
+    """
+    if client:
+        engine_ready: "Future[StarpackClient]" = Future()
+        engine_ready.set_result(client)
+        return engine_ready
+
+    return executor.submit(StarpackClient, start=True, docker=True, pool_size=pool_size)
+
+
+def _project_file(directory: Path) -> Path:
+    """
+    The directory's "starpack.yaml", which must exist
+    """
     yaml_file = directory / "starpack.yaml"
 
     if not yaml_file.exists():
         raise PathExistsError(yaml_file)
 
-    if not client:
-        client = StarpackClient(start=True, docker=True)
+    return yaml_file
+
+
+def _load_project(
+    yaml_file: Path, sections: Tuple[str, ...], strict: bool = False
+) -> Tuple[Dict[str, Any], Manifest]:
+    """
+    Loads and validates a project's "starpack.yaml" and hashes the contents of its directory, only the files its
+    artifacts reference when `strict`
+    """
+    input_dict = utils.load_yaml(yaml_file)
+    utils.validate_payload(input_dict, yaml_file, sections)
+    artifacts = (input_dict["package"].get("artifacts") or {}) if strict else None
+    current_manifest = directory_manifest(yaml_file.parent.resolve(), artifacts)
+
+    return input_dict, current_manifest
+
+
+def _prepare_directory(
+    directory: Path,
+    client: Optional[StarpackClient],
+    sections: Tuple[str, ...],
+    strict: bool = False,
+) -> Tuple[StarpackClient, Dict[str, Any], Manifest]:
+    """
+    Loads and validates the directory's "starpack.yaml" and hashes its contents while the engine starts up in the
+    background, only waiting on the engine once everything that does not need it is done. A missing
+    "starpack.yaml" fails before the engine is started.
+    """
+    yaml_file = _project_file(directory)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        engine_ready = _start_engine(executor, client)
+        input_dict, current_manifest = _load_project(yaml_file, sections, strict)
 
-    package_directory(directory, client=client)
-    deploy(yaml_file, client=client)
+        return engine_ready.result(), input_dict, current_manifest
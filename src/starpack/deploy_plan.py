@@ -0,0 +1,367 @@
+from copy import deepcopy
+import hashlib
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from rich.table import Table
+
+from starpack.build_cache import BUILD_DIGEST_LABEL
+
+# Labels the engine puts on the container it runs for each wrapper of a deployment, given in the wrapper's `labels`
+# in the deploy payload, so that a later deploy can tell what is already running. The image is identified by its
+# build digest (see `starpack.build_cache`), and the environment by a digest of its variables, which may be secrets.
+#
+# A wrapper given `replicas` above one is run by the engine as that many containers, each with the wrapper's labels,
+# on ports Docker picks; its endpoint is then the list of their URLs. The wrapper's port is served by a local proxy
+# spreading connections across the replicas (see `starpack.proxy`).
+DEPLOYMENT_LABEL = "io.starpack.deployment"
+WRAPPER_LABEL = "io.starpack.wrapper"
+PORT_LABEL = "io.starpack.port"
+ENV_DIGEST_LABEL = "io.starpack.env-digest"
+REPLICAS_LABEL = "io.starpack.replicas"
+
+CREATE = "create"
+REPLACE = "replace"
+REMOVE = "remove"
+UNCHANGED = "unchanged"
+ACTION_STYLES = {CREATE: "green", REPLACE: "yellow", REMOVE: "red", UNCHANGED: "dim"}
+
+
+class DesiredContainer(NamedTuple):
+    """
+    A wrapper of a deployment as the starpack.yaml describes it
+    """
+
+    wrapper: str
+    image: str
+    port: Optional[int]
+    env: Dict[str, str]
+    replicas: int = 1
+
+    @property
+    def env_digest(self) -> str:
+        return env_digest(self.env)
+
+    @property
+    def proxied(self) -> bool:
+        """
+        Whether the wrapper's port is served by a proxy in front of its replicas
+        """
+        return self.replicas > 1 and self.port is not None
+
+    def labels(self, deployment: str) -> Dict[str, str]:
+        """
+        Labels describing this wrapper's container, for the engine to put on it
+        """
+        return {
+            DEPLOYMENT_LABEL: deployment,
+            WRAPPER_LABEL: self.wrapper,
+            BUILD_DIGEST_LABEL: self.image,
+            PORT_LABEL: "" if self.port is None else str(self.port),
+            ENV_DIGEST_LABEL: self.env_digest,
+            REPLICAS_LABEL: str(self.replicas),
+        }
+
+
+class RunningContainer(NamedTuple):
+    """
+    A container the engine started for a wrapper of a deployment, as described by its labels, along with the host
+    port it publishes
+    """
+
+    id: str
+    name: str
+    wrapper: str
+    image: str
+    port: str
+    env_digest: str
+    running: bool
+    # Containers deployed before replicas existed have no replicas label, and are single
+    replicas: str = "1"
+    published: str = ""
+
+    @classmethod
+    def from_container(cls, container: Any) -> "RunningContainer":
+        labels = container.labels or {}
+        return cls(
+            container.id,
+            container.name,
+            labels.get(WRAPPER_LABEL, ""),
+            labels.get(BUILD_DIGEST_LABEL, ""),
+            labels.get(PORT_LABEL, ""),
+            labels.get(ENV_DIGEST_LABEL, ""),
+            container.status == "running",
+            labels.get(REPLICAS_LABEL) or "1",
+            _published_port(container),
+        )
+
+    @property
+    def proxied(self) -> bool:
+        """
+        Whether the container is a replica behind a proxy, rather than publishing the wrapper's port itself
+        """
+        return int(self.replicas or 1) > 1
+
+
+class Change(NamedTuple):
+    """
+    What deploying does to one wrapper's container, and why
+    """
+
+    wrapper: str
+    action: str
+    reasons: List[str]
+    running: Optional[RunningContainer] = None
+    # The other running replicas of the wrapper, which are replaced along with the first
+    replicas: Tuple[RunningContainer, ...] = ()
+
+
+class DeploymentPlan:
+    """
+    Changes needed to bring the running containers of a deployment in line with its starpack.yaml
+    """
+
+    def __init__(
+        self, deployment: str, desired: List[DesiredContainer], changes: List[Change]
+    ) -> None:
+        self.deployment = deployment
+        self.desired = desired
+        self.changes = changes
+
+    @property
+    def up_to_date(self) -> bool:
+        return all(change.action == UNCHANGED for change in self.changes)
+
+    @property
+    def to_deploy(self) -> List[str]:
+        """
+        Wrappers to (re)deploy
+        """
+        return [
+            change.wrapper
+            for change in self.changes
+            if change.action in (CREATE, REPLACE)
+        ]
+
+    @property
+    def to_remove(self) -> List[RunningContainer]:
+        """
+        Containers to remove, as they are outdated or their wrapper is gone
+        """
+        return [
+            container
+            for change in self.changes
+            if change.action in (REPLACE, REMOVE) and change.running
+            for container in (change.running, *change.replicas)
+        ]
+
+    def table(self) -> Table:
+        """
+        Table of the change to each wrapper's container
+        """
+        table = Table(title=f"Deployment plan for {self.deployment}")
+        table.add_column("Wrapper")
+        table.add_column("Action")
+        table.add_column("Changes")
+
+        for change in self.changes:
+            style = ACTION_STYLES[change.action]
+            table.add_row(
+                change.wrapper,
+                f"[{style}]{change.action}[/{style}]",
+                "\n".join(change.reasons) or "-",
+            )
+
+        return table
+
+
+def env_digest(env: Dict[str, str]) -> str:
+    canonical = json.dumps(env, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def deploy_step(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The step of the deployment that runs the wrappers: the last one listing a `wrapper`
+    """
+    steps = (payload.get("deployment") or {}).get("steps") or []
+    for step in reversed(steps):
+        if isinstance(step, dict) and step.get("wrapper"):
+            return step
+
+    return None
+
+
+def desired_state(
+    payload: Dict[str, Any], image: str, replicas: Optional[int] = None
+) -> List[DesiredContainer]:
+    """
+    The container each wrapper of the deploy step should be running: the image built with the given build digest,
+    on the wrapper's port, or the step's, with the step's `env` overridden by the wrapper's. Each wrapper runs as
+    many replicas as `replicas`, if given, or as the wrapper or step asks for.
+    """
+    step = deploy_step(payload)
+    if step is None:
+        return []
+
+    wrappers = step["wrapper"]
+    if not isinstance(wrappers, list):
+        wrappers = [wrappers]
+
+    desired = []
+    for wrapper in wrappers:
+        if not isinstance(wrapper, dict):
+            wrapper = {"name": wrapper}
+        env = {
+            str(key): str(value)
+            for key, value in {
+                **(step.get("env") or {}),
+                **(wrapper.get("env") or {}),
+            }.items()
+        }
+        port = wrapper.get("port") or step.get("port")
+        desired.append(
+            DesiredContainer(
+                str(wrapper["name"]),
+                image,
+                int(port) if port else None,
+                env,
+                max(
+                    1,
+                    int(
+                        replicas or wrapper.get("replicas") or step.get("replicas") or 1
+                    ),
+                ),
+            )
+        )
+
+    return desired
+
+
+def plan_deployment(
+    deployment: str,
+    desired: List[DesiredContainer],
+    running: Optional[List[RunningContainer]],
+    force: bool = False,
+) -> DeploymentPlan:
+    """
+    Compares the desired containers against the running ones. `running` is None when the running containers can't be
+    seen, such as on a remote engine, in which case every wrapper is deployed; with `force`, every wrapper is
+    replaced.
+    """
+    if running is None:
+        changes = [
+            Change(container.wrapper, CREATE, ["running containers unknown"])
+            for container in desired
+        ]
+        return DeploymentPlan(deployment, desired, changes)
+
+    by_wrapper: Dict[str, List[RunningContainer]] = {}
+    for container in running:
+        by_wrapper.setdefault(container.wrapper, []).append(container)
+
+    changes = []
+    for container in desired:
+        current = by_wrapper.pop(container.wrapper, None) or []
+        group, duplicates = current[: container.replicas], current[container.replicas :]
+        changes.extend(
+            Change(container.wrapper, REMOVE, ["duplicate container"], duplicate)
+            for duplicate in duplicates
+        )
+        if not group:
+            changes.append(Change(container.wrapper, CREATE, ["not deployed"]))
+            continue
+
+        reasons = []
+        for replica in group:
+            reasons.extend(
+                reason
+                for reason in _differences(container, replica)
+                if reason not in reasons
+            )
+        if not reasons and len(group) < container.replicas:
+            reasons.append(f"{len(group)} of {container.replicas} replicas running")
+        if force and not reasons:
+            reasons = ["forced"]
+        changes.append(
+            Change(
+                container.wrapper,
+                REPLACE if reasons else UNCHANGED,
+                reasons,
+                group[0],
+                tuple(group[1:]),
+            )
+        )
+
+    for wrapper, stale in by_wrapper.items():
+        changes.extend(
+            Change(wrapper, REMOVE, ["no longer in starpack.yaml"], container)
+            for container in stale
+        )
+
+    return DeploymentPlan(deployment, desired, changes)
+
+
+def deployment_payload(payload: Dict[str, Any], plan: DeploymentPlan) -> Dict[str, Any]:
+    """
+    Copy of a payload that only deploys the wrappers the plan (re)deploys, asking the engine to label each container
+    with its desired state, and to run replicated wrappers as that many containers
+    """
+    deployment = deepcopy(payload)
+    step = deploy_step(deployment)
+    if step is None:
+        return deployment
+
+    to_deploy = set(plan.to_deploy)
+    desired = {container.wrapper: container for container in plan.desired}
+    wrappers = step["wrapper"]
+    if not isinstance(wrappers, list):
+        wrappers = [wrappers]
+
+    step["wrapper"] = []
+    for wrapper in wrappers:
+        if not isinstance(wrapper, dict):
+            wrapper = {"name": wrapper}
+        name = str(wrapper["name"])
+        if name in to_deploy:
+            wrapper = {**wrapper, "labels": desired[name].labels(plan.deployment)}
+            wrapper.pop("replicas", None)
+            if desired[name].replicas > 1:
+                wrapper["replicas"] = desired[name].replicas
+            step["wrapper"].append(wrapper)
+
+    return deployment
+
+
+def _differences(desired: DesiredContainer, running: RunningContainer) -> List[str]:
+    reasons = []
+    if not running.running:
+        reasons.append("not running")
+    if running.image != desired.image:
+        reasons.append(f"image {running.image[:12] or '?'} -> {desired.image[:12]}")
+    port = "" if desired.port is None else str(desired.port)
+    if running.port != port:
+        reasons.append(f"port {running.port or '-'} -> {port or '-'}")
+    if running.env_digest != desired.env_digest:
+        reasons.append("environment changed")
+    if running.replicas != str(desired.replicas):
+        reasons.append(f"replicas {running.replicas} -> {desired.replicas}")
+
+    return reasons
+
+
+def _published_port(container: Any) -> str:
+    """
+    The host port a container publishes, which Docker picked for replicas
+    """
+    attrs = container.attrs or {}
+    for bindings in (
+        (attrs.get("NetworkSettings") or {}).get("Ports"),
+        (attrs.get("HostConfig") or {}).get("PortBindings"),
+    ):
+        for binding in (bindings or {}).values():
+            port = (binding or [{}])[0].get("HostPort")
+            if port:
+                return port
+
+    return ""
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import List
 from typer import Exit
 
 from rich import print
@@ -28,5 +29,111 @@ class PathExistsError(Exit):
         super().__init__(1)
 
 
+class InvalidPayloadError(Exit):
+    def __init__(self, path: Path, reason: str) -> None:
+        print(f"The Starpack YAML at {path} is invalid: {reason}")
+        super().__init__(1)
+
+
+class PackageFailedError(Exit):
+    def __init__(self, name: str) -> None:
+        print(
+            f"Packaging {name} failed, leaving its running containers as they were. Check the logs above and try again."
+        )
+        super().__init__(1)
+
+
+class UploadFailedError(Exit):
+    def __init__(self, path: Path, reason: str) -> None:
+        print(
+            f"Uploading {path} failed: {reason}. Run the upload again to resume it."
+        )
+        super().__init__(1)
+
+
+class UploadsUnsupportedError(Exit):
+    def __init__(self, url: str) -> None:
+        print(
+            f"The Starpack Engine at {url} does not accept uploads over HTTP, and it is not running locally."
+        )
+        super().__init__(1)
+
+
+class EngineLockTimeoutError(Exit):
+    def __init__(self, path: Path) -> None:
+        print(
+            f"Timed out waiting for another Starpack process to release the engine lock ({path})."
+        )
+        super().__init__(1)
+
+
+class ProxyStartError(Exit):
+    def __init__(self, name: str) -> None:
+        print(
+            f"The proxy for {name} did not start. Check that nothing else is listening on its port."
+        )
+        super().__init__(1)
+
+
+class MissingDependencyError(Exit):
+    def __init__(self, feature: str, package: str, extra: str) -> None:
+        print(
+            f"{feature} needs {package}, which is not installed. Install it with `pip install starpack[{extra}]`."
+        )
+        super().__init__(1)
+
+
+class UnknownWireFormatError(Exit):
+    def __init__(self, wire_format: str, formats: List[str]) -> None:
+        print(
+            f"Unknown wire format {wire_format}: choose one of {', '.join(formats)}."
+        )
+        super().__init__(1)
+
+
+class UnsupportedFormatError(Exit):
+    def __init__(self, path: Path, extensions: List[str]) -> None:
+        print(
+            f"Unable to read or write {path}: supported file types are {', '.join(extensions)}."
+        )
+        super().__init__(1)
+
+
+class DeploymentNotFoundError(Exit):
+    def __init__(self, name: str) -> None:
+        print(
+            f"Unable to find a running deployment named {name}. Pass the URL of the deployment instead if it is not local."
+        )
+        super().__init__(1)
+
+
+class MissingModelError(Exit):
+    def __init__(self, url: str) -> None:
+        print(
+            f"Unable to tell which model to score at {url}. Pass its package name with --model, or the full prediction URL."
+        )
+        super().__init__(1)
+
+
+class PredictionFailedError(Exit):
+    def __init__(self, chunk: int, reason: str) -> None:
+        print(f"Scoring chunk {chunk} failed: {reason}.")
+        super().__init__(1)
+
+
+class MissingBenchDataError(Exit):
+    def __init__(self, path: Path) -> None:
+        print(
+            f"No rows to send from {path}. Set the `validation_data` artifact of the project, or pass a file of rows with --data."
+        )
+        super().__init__(1)
+
+
+class DeploymentUnreachableError(Exit):
+    def __init__(self, url: str, reason: str) -> None:
+        print(f"Unable to get a prediction from {url}: {reason}")
+        super().__init__(1)
+
+
 class UserDeclined(Exception):
     ...
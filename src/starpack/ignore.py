@@ -0,0 +1,204 @@
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set
+
+IGNORE_FILE = ".starpackignore"
+
+# Never worth shipping to the engine, whatever the project's own ignore file says
+DEFAULT_PATTERNS = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    "__pycache__/",
+    "*.py[cod]",
+    ".ipynb_checkpoints/",
+    ".venv/",
+    "venv/",
+    ".mypy_cache/",
+    ".pytest_cache/",
+    ".DS_Store",
+)
+
+# Files referenced from the `artifacts` section of a starpack.yaml that strict mode ships, as paths of keys
+STRICT_ARTIFACT_KEYS = (
+    ("inference", "script_name"),
+    ("inference", "model_data"),
+    ("dependencies",),
+    ("validation_data",),
+    ("streamlit",),
+    ("gradio_script_name",),
+)
+SCRIPT_KEYS = {"script_name", "gradio_script_name"}
+
+
+class IgnorePattern:
+    """
+    A single compiled line of a gitignore-style file. `base` is the directory holding the file the pattern came from,
+    relative to the project, as anchored patterns only apply below it.
+    """
+
+    def __init__(self, line: str, base: str = "") -> None:
+        self.negated = line.startswith("!")
+        if self.negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+
+        self.dir_only = line.endswith("/")
+        line = line.rstrip("/")
+
+        # Patterns without a slash match at any depth; anything else is relative to the ignore file
+        anchored = "/" in line
+        line = line.lstrip("/")
+        prefix = "" if anchored else "(?:.*/)?"
+
+        self.base = f"{base}/" if base else ""
+        self.regex: Pattern[str] = re.compile(prefix + translate(line) + r"\Z")
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not relative_path.startswith(self.base):
+                return False
+            relative_path = relative_path[len(self.base) :]
+
+        return self.regex.match(relative_path) is not None
+
+
+class IgnoreRules:
+    """
+    Decides which paths of a project are uploaded: the default patterns, then the patterns of every `.starpackignore`
+    found while walking, where the last matching pattern wins as in a `.gitignore`. With an `allowed` set of paths
+    (strict mode), only those files, and everything under those directories, are kept.
+    """
+
+    def __init__(
+        self,
+        patterns: Iterable[str] = DEFAULT_PATTERNS,
+        allowed: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.patterns: List[IgnorePattern] = []
+        self.extend(patterns)
+
+        self.allowed: Optional[Set[str]] = None
+        self.allowed_parents: Set[str] = set()
+        if allowed is not None:
+            self.allowed = set(allowed)
+            for path in self.allowed:
+                parts = path.split("/")
+                for depth in range(1, len(parts)):
+                    self.allowed_parents.add("/".join(parts[:depth]))
+
+    def extend(self, lines: Iterable[str], base: str = "") -> None:
+        """
+        Adds the patterns of an ignore file found in the `base` directory
+        """
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if line and not line.startswith("#"):
+                self.patterns.append(IgnorePattern(line, base))
+
+    def load(self, ignore_file: Path, base: str = "") -> None:
+        """
+        Adds the patterns of the given ignore file, if it can be read
+        """
+        try:
+            self.extend(ignore_file.read_text().splitlines(), base)
+        except OSError:
+            pass
+
+    def ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """
+        Whether a path, relative to the project and in POSIX form, is left out of uploads
+        """
+        if self.allowed is not None and not self._allowed(relative_path, is_dir):
+            return True
+
+        for pattern in reversed(self.patterns):
+            if pattern.matches(relative_path, is_dir):
+                return not pattern.negated
+
+        return False
+
+    def _allowed(self, relative_path: str, is_dir: bool) -> bool:
+        if is_dir and relative_path in self.allowed_parents:
+            return True
+
+        parts = relative_path.split("/")
+        return any(
+            "/".join(parts[:depth]) in self.allowed
+            for depth in range(1, len(parts) + 1)
+        )
+
+
+def translate(pattern: str) -> str:
+    """
+    Translates a gitignore glob into a regular expression, where `*` and `?` stop at slashes and `**` does not
+    """
+    regex = ""
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+            continue
+
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[" and "]" in pattern[index + 2 :]:
+            end = pattern.index("]", index + 2)
+            body = pattern[index + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            regex += f"[{body.replace(chr(92), chr(92) * 2)}]"
+            index = end
+        elif char == "\\" and index + 1 < len(pattern):
+            index += 1
+            regex += re.escape(pattern[index])
+        else:
+            regex += re.escape(char)
+        index += 1
+
+    return regex
+
+
+def strict_paths(artifacts: Dict[str, Any]) -> Set[str]:
+    """
+    Files referenced from the `artifacts` section of a starpack.yaml, relative to the project directory
+    """
+    paths = {"starpack.yaml", IGNORE_FILE}
+    for keys in STRICT_ARTIFACT_KEYS:
+        value: Any = artifacts
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+        if not value or not isinstance(value, str):
+            continue
+
+        path = Path(value).as_posix().strip("/")
+        if keys[-1] in SCRIPT_KEYS and not Path(path).suffix:
+            path += ".py"
+        paths.add(path[2:] if path.startswith("./") else path)
+
+    return paths
+
+
+def project_rules(
+    directory: Path, artifacts: Optional[Dict[str, Any]] = None
+) -> IgnoreRules:
+    """
+    Ignore rules for a project directory, starting from the defaults and its top-level `.starpackignore`. Given the
+    `artifacts` of its starpack.yaml, only the files they reference are kept.
+    """
+    rules = IgnoreRules(
+        allowed=strict_paths(artifacts) if artifacts is not None else None
+    )
+    rules.load(directory / IGNORE_FILE)
+    return rules
@@ -8,6 +8,18 @@ from starpack.errors import UserDeclined
 import typer
 
 
+def initialize_directory(directory: Path, overwrite: bool = False) -> None:
+    """
+    Starts the starpack-engine container locally and furthermore initializes
+    the given directory if given with starter code, an example
+    requirements.txt, and an example starpack.yaml
+    """
+    if directory:
+        directory = directory.resolve()
+        directory.mkdir(parents=True, exist_ok=True)
+        initialize_project_files(directory, overwrite=overwrite)
+
+
 def initialize_project_files(directory: Path, overwrite: bool = False):
     """
     Given a directory to initialize, copies over some starter files.
@@ -0,0 +1,110 @@
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+from rich import print
+from rich.markup import escape
+from rich.table import Table
+
+from starpack._config import APP_DIR
+
+# Job protocol spoken with engines that support asynchronous packaging:
+#   POST /jobs/package                   -> 202 {"job_id": "..."}
+#   GET  /jobs/{job_id}/events?offset=N  -> newline-delimited JSON events, streamed with chunked encoding
+# Every event carries an increasing "offset" so a dropped stream can be resumed from the last event seen, and a
+# "type" of "log" (a build log line), "step" (a step "started", "succeeded" or "failed", with its "duration" in
+# seconds once finished), or "result" (the final "status" of the job, which ends the stream).
+LAST_JOB_FILE = APP_DIR / "jobs" / "last_job.json"
+
+Event = Dict[str, Any]
+
+
+class LastJob(NamedTuple):
+    """
+    The most recently submitted job, and the URL of the engine that accepted it, where its events are found
+    """
+
+    job_id: str
+    url: Optional[str] = None
+
+
+class JobProgress:
+    """
+    Renders the events of a package job as they arrive and keeps track of each step's status and duration
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self.offset = 0
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.status: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status is not None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == "succeeded"
+
+    def handle(self, event: Event) -> None:
+        """
+        Renders an event and records its effect on the job
+        """
+        if "offset" in event:
+            self.offset = event["offset"] + 1
+        event_type = event.get("type")
+        step = event.get("step")
+
+        if event_type == "log":
+            prefix = f"[dim]\\[{escape(step)}][/dim] " if step else ""
+            print(f"{prefix}{escape(str(event.get('message', '')))}")
+        elif event_type == "step" and step:
+            status = event.get("status", "started")
+            self.steps.setdefault(step, {})
+            self.steps[step]["status"] = status
+            if event.get("duration") is not None:
+                self.steps[step]["duration"] = event["duration"]
+            if status != "started":
+                print(f"Step {step} {status}")
+        elif event_type == "result":
+            self.status = event.get("status", "failed")
+            if not self.succeeded and event.get("detail"):
+                print(escape(str(event["detail"])))
+
+    def step_table(self) -> Table:
+        """
+        Table of every step seen so far with its status and duration
+        """
+        table = Table(title=f"Package job {self.job_id}")
+        table.add_column("Step")
+        table.add_column("Status")
+        table.add_column("Duration", justify="right")
+
+        for step, details in self.steps.items():
+            duration = details.get("duration")
+            table.add_row(
+                step,
+                details.get("status", "-"),
+                f"{duration:.1f}s" if duration is not None else "-",
+            )
+
+        return table
+
+
+def save_last_job(job_id: str, url: str) -> None:
+    """
+    Remembers the most recently submitted job so it can be reattached to later
+    """
+    LAST_JOB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    LAST_JOB_FILE.write_text(json.dumps({"job_id": job_id, "url": url}))
+
+
+def load_last_job() -> Optional[LastJob]:
+    """
+    The most recently submitted job, if there is one
+    """
+    try:
+        last_job = json.loads(LAST_JOB_FILE.read_text())
+        return LastJob(last_job["job_id"], last_job.get("url"))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
@@ -0,0 +1,248 @@
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+from threading import RLock
+from time import perf_counter, sleep
+from typing import IO, Any, Dict, List, Optional
+from uuid import uuid4
+
+from starpack._config import APP_DIR
+from starpack.errors import EngineLockTimeoutError
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# Starpack processes on the same machine share one engine. Starting, connecting to, and removing engines happens
+# while holding the engine lock, and each process holds a lease on the engine it uses for as long as it runs, so that
+# no process removes an engine another one is using. An engine whose leases are all released is idle, and can be shut
+# down by the reaper once it has been idle for the `engine_idle_timeout` setting.
+LOCK_FILE = APP_DIR / "engine.lock"
+LEASES_FILE = APP_DIR / "leases.json"
+LOCK_TIMEOUT = 120.0
+LOCK_POLL_INTERVAL = 0.05
+
+_locks: Dict[Path, "FileLock"] = {}
+
+
+class FileLock:
+    """
+    Exclusive lock across processes, held on a file with `flock` (or `msvcrt.locking` on Windows). It is re-entrant
+    within a thread and excludes other threads of the same process as well. Waiting longer than `timeout` seconds
+    raises an `EngineLockTimeoutError`.
+    """
+
+    def __init__(self, path: Path, timeout: float = LOCK_TIMEOUT) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = RLock()
+        self._depth = 0
+        self._file: Optional[IO[str]] = None
+
+    def acquire(self) -> None:
+        deadline = perf_counter() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise EngineLockTimeoutError(self.path)
+
+        self._depth += 1
+        if self._depth > 1:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, "a+")
+        while not _try_lock(lock_file):
+            if perf_counter() >= deadline:
+                lock_file.close()
+                self._depth -= 1
+                self._thread_lock.release()
+                raise EngineLockTimeoutError(self.path)
+            sleep(LOCK_POLL_INTERVAL)
+        self._file = lock_file
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            _unlock(self._file)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+def engine_lock() -> FileLock:
+    """
+    The lock serializing changes to the engines between Starpack processes
+    """
+    if LOCK_FILE not in _locks:
+        _locks[LOCK_FILE] = FileLock(LOCK_FILE)
+    return _locks[LOCK_FILE]
+
+
+def _try_lock(lock_file: IO[str]) -> bool:
+    try:
+        if os.name == "nt":
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(lock_file: IO[str]) -> None:
+    if os.name == "nt":
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def pid_alive(pid: int) -> bool:
+    """
+    Whether a process is still running
+    """
+    if os.name == "nt":
+        import ctypes
+
+        # SYNCHRONIZE access is enough to tell whether the process exists; a handle to it means it does
+        handle = ctypes.windll.kernel32.OpenProcess(0x100000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def load_leases(leases_file: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Loads the leases held on each engine and when each engine became idle, dropping leases of processes that are
+    gone without releasing them
+    """
+    leases_file = leases_file or LEASES_FILE
+    try:
+        state = json.loads(leases_file.read_text())
+    except (OSError, ValueError):
+        state = {}
+    if not isinstance(state, dict):
+        state = {}
+
+    leases = {
+        lease_id: lease
+        for lease_id, lease in (state.get("leases") or {}).items()
+        if pid_alive(lease["pid"])
+    }
+    idle_since = dict(state.get("idle_since") or {})
+    for lease in (state.get("leases") or {}).values():
+        if lease not in leases.values() and not _leases_of(leases, lease["engine"]):
+            idle_since.setdefault(lease["engine"], _now())
+
+    return {"leases": leases, "idle_since": idle_since}
+
+
+def save_leases(state: Dict[str, Any], leases_file: Optional[Path] = None) -> None:
+    """
+    Saves the leases, replacing the file atomically so that readers never see a partial write
+    """
+    leases_file = leases_file or LEASES_FILE
+    leases_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = leases_file.with_suffix(".tmp")
+    temp_file.write_text(json.dumps(state, indent=2, sort_keys=True))
+    temp_file.replace(leases_file)
+
+
+def acquire_lease(engine_id: str, leases_file: Optional[Path] = None) -> str:
+    """
+    Records that this process uses an engine, returning the lease's ID. Call it while holding the engine lock.
+    """
+    state = load_leases(leases_file)
+    lease_id = uuid4().hex
+    state["leases"][lease_id] = {
+        "engine": engine_id,
+        "pid": os.getpid(),
+        "acquired": _now(),
+    }
+    state["idle_since"].pop(engine_id, None)
+    save_leases(state, leases_file)
+
+    return lease_id
+
+
+def release_lease(lease_id: str, leases_file: Optional[Path] = None) -> int:
+    """
+    Releases a lease, returning how many leases are left on its engine. The engine is marked idle when none are.
+    """
+    with engine_lock():
+        state = load_leases(leases_file)
+        lease = state["leases"].pop(lease_id, None)
+        if lease is None:
+            return 0
+
+        remaining = len(_leases_of(state["leases"], lease["engine"]))
+        if not remaining:
+            state["idle_since"][lease["engine"]] = _now()
+        save_leases(state, leases_file)
+
+    return remaining
+
+
+def lease_count(engine_id: str, leases_file: Optional[Path] = None) -> int:
+    """
+    Number of live leases on an engine
+    """
+    return len(_leases_of(load_leases(leases_file)["leases"], engine_id))
+
+
+def idle_seconds(engine_id: str, leases_file: Optional[Path] = None) -> Optional[float]:
+    """
+    Seconds an engine has been idle, or None if it is in use or was never leased
+    """
+    state = load_leases(leases_file)
+    if _leases_of(state["leases"], engine_id):
+        return None
+
+    idle_since = state["idle_since"].get(engine_id)
+    if idle_since is None:
+        return None
+    return (
+        datetime.now(timezone.utc) - datetime.fromisoformat(idle_since)
+    ).total_seconds()
+
+
+def forget_engine(engine_id: str, leases_file: Optional[Path] = None) -> None:
+    """
+    Drops the leases and idle time of a removed engine
+    """
+    state = load_leases(leases_file)
+    state["leases"] = {
+        lease_id: lease
+        for lease_id, lease in state["leases"].items()
+        if lease["engine"] != engine_id
+    }
+    state["idle_since"].pop(engine_id, None)
+    save_leases(state, leases_file)
+
+
+def _leases_of(leases: Dict[str, Dict[str, Any]], engine_id: str) -> List[str]:
+    return [
+        lease_id for lease_id, lease in leases.items() if lease["engine"] == engine_id
+    ]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
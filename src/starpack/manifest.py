@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from starpack._config import APP_DIR
+from starpack.ignore import IGNORE_FILE, IgnoreRules, project_rules
+
+MANIFEST_NAME = ".starpack-manifest.json"
+MANIFEST_DIR = APP_DIR / "manifests"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+Manifest = Dict[str, Dict[str, Any]]
+
+
+def hash_file(path: Path) -> str:
+    """
+    Computes the SHA256 digest of a file without loading it fully into memory
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_data:
+        for block in iter(lambda: file_data.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def build_manifest(
+    directory: Path,
+    previous: Optional[Manifest] = None,
+    rules: Optional[IgnoreRules] = None,
+) -> Manifest:
+    """
+    Walks a directory and records the size and content hash of every file, keyed by its POSIX path relative to the
+    directory. Files whose size and modification time match the `previous` manifest reuse the recorded hash
+    instead of being read again. Paths left out by the ignore `rules` are skipped, without descending into ignored
+    directories.
+    """
+    previous = previous or {}
+    rules = rules or project_rules(directory)
+    manifest: Manifest = {}
+
+    # Directories still to visit, as (path, path relative to `directory`)
+    pending = [(str(directory), "")]
+    while pending:
+        path, relative_dir = pending.pop()
+        with os.scandir(path) as scanner:
+            entries = list(scanner)
+
+        if relative_dir and any(entry.name == IGNORE_FILE for entry in entries):
+            rules.load(Path(path) / IGNORE_FILE, base=relative_dir)
+
+        for entry in entries:
+            relative_path = (
+                f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            )
+            is_dir = entry.is_dir()
+            if relative_path == MANIFEST_NAME or rules.ignored(relative_path, is_dir):
+                continue
+            if is_dir:
+                pending.append((entry.path, relative_path))
+                continue
+            if not entry.is_file():
+                continue
+
+            stat = entry.stat()
+            cached = previous.get(relative_path)
+            if (
+                cached
+                and cached["size"] == stat.st_size
+                and cached["mtime_ns"] == stat.st_mtime_ns
+            ):
+                sha256 = cached["sha256"]
+            else:
+                sha256 = hash_file(Path(entry.path))
+
+            manifest[relative_path] = {
+                "sha256": sha256,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+
+    return manifest
+
+
+def directory_manifest(
+    directory: Path, artifacts: Optional[Dict[str, Any]] = None
+) -> Manifest:
+    """
+    Builds the current manifest of a directory, reusing the hashes cached from its last upload. Given the `artifacts`
+    of its starpack.yaml, only the files they reference are included (strict mode).
+    """
+    return build_manifest(
+        directory,
+        previous=load_manifest(local_manifest_path(directory)),
+        rules=project_rules(directory, artifacts),
+    )
+
+
+def diff_manifests(old: Manifest, new: Manifest) -> Tuple[List[str], List[str]]:
+    """
+    Compares two manifests and returns the files that were added or changed and the files that were deleted
+    """
+    changed = sorted(
+        path
+        for path, entry in new.items()
+        if path not in old or old[path]["sha256"] != entry["sha256"]
+    )
+    deleted = sorted(path for path in old if path not in new)
+
+    return changed, deleted
+
+
+def local_manifest_path(directory: Path) -> Path:
+    """
+    Location of the cached manifest for a given directory within the Starpack configuration folder
+    """
+    directory_key = hashlib.sha1(str(directory.resolve()).encode()).hexdigest()
+    return MANIFEST_DIR / f"{directory_key}.json"
+
+
+def load_manifest(manifest_path: Path) -> Manifest:
+    """
+    Loads a manifest from disk, returning an empty manifest if it is missing or unreadable
+    """
+    try:
+        return json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path: Path, manifest: Manifest) -> None:
+    """
+    Saves a manifest to disk
+    """
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(manifest, sort_keys=True))
@@ -0,0 +1,135 @@
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Any, Callable, List, Optional
+
+import requests
+
+# Engines of a pool carry the pool's size, which can't change once they are created, so that later runs can tell a
+# pool apart from stray engines that should be cleaned up
+POOL_SIZE_LABEL = "io.starpack.pool-size"
+HEALTH_INTERVAL = 5.0
+HEALTH_TIMEOUT = 2.0
+MAX_HEALTH_FAILURES = 2
+
+
+class PoolMember:
+    """
+    One engine of a pool, with the number of requests it is currently handling
+    """
+
+    def __init__(self, engine: Any, url: str) -> None:
+        self.engine = engine
+        self.url = url
+        self.outstanding = 0
+        self.failures = 0
+        self.last_checked = perf_counter()
+
+    def __repr__(self) -> str:
+        return f"PoolMember({self.url!r}, outstanding={self.outstanding})"
+
+
+class EnginePool:
+    """
+    Engines sharing the artifacts volume, each on its own port, between which requests are spread by least
+    outstanding jobs: every request goes to the healthy engine handling the fewest at the time, so a long build on one
+    engine doesn't hold up the others. Engines that fail their healthcheck `MAX_HEALTH_FAILURES` times in a row, or
+    drop a connection, are evicted and handed to `on_evict`, which is expected to `add` a replacement.
+    """
+
+    def __init__(
+        self,
+        members: List[PoolMember],
+        session: requests.Session,
+        on_evict: Optional[Callable[[PoolMember], None]] = None,
+        health_interval: float = HEALTH_INTERVAL,
+    ) -> None:
+        self.members = list(members)
+        self.session = session
+        self.on_evict = on_evict
+        self.health_interval = health_interval
+        self._lock = Lock()
+        self._available = Event()
+        self._available.set()
+        self._stopped = Event()
+        self._monitor: Optional[Thread] = None
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def acquire(self, timeout: Optional[float] = None) -> PoolMember:
+        """
+        Picks the engine with the fewest outstanding requests and counts a new one against it, waiting up to
+        `timeout` seconds for an engine while all of them are being replaced
+        """
+        while True:
+            with self._lock:
+                if self.members:
+                    member = min(self.members, key=lambda member: member.outstanding)
+                    member.outstanding += 1
+                    return member
+                self._available.clear()
+
+            if not self._available.wait(timeout):
+                raise requests.ConnectionError("No healthy engine left in the pool")
+
+    def release(self, member: PoolMember) -> None:
+        with self._lock:
+            member.outstanding -= 1
+
+    def add(self, member: PoolMember) -> None:
+        with self._lock:
+            self.members.append(member)
+            self._available.set()
+
+    def evict(self, member: PoolMember) -> bool:
+        """
+        Takes an engine out of the pool and hands it to `on_evict`. Returns whether it was still in the pool.
+        """
+        with self._lock:
+            if member not in self.members:
+                return False
+            self.members.remove(member)
+
+        if self.on_evict:
+            self.on_evict(member)
+        return True
+
+    def check_health(self) -> List[PoolMember]:
+        """
+        Healthchecks every engine, evicting those that failed too many times in a row. Returns the evicted engines.
+        """
+        evicted = []
+        for member in list(self.members):
+            try:
+                healthy = (
+                    self.session.get(
+                        f"{member.url}/healthcheck", timeout=HEALTH_TIMEOUT
+                    ).status_code
+                    == 200
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                healthy = False
+
+            member.last_checked = perf_counter()
+            member.failures = 0 if healthy else member.failures + 1
+            if member.failures >= MAX_HEALTH_FAILURES and self.evict(member):
+                evicted.append(member)
+
+        return evicted
+
+    def start_monitor(self) -> None:
+        """
+        Healthchecks the engines every `health_interval` seconds in the background until `stop`
+        """
+        if self._monitor is None:
+            self._monitor = Thread(
+                target=self._watch, name="starpack-pool-monitor", daemon=True
+            )
+            self._monitor.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
@@ -0,0 +1,192 @@
+from concurrent.futures import Future
+import os
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+import requests.adapters
+
+from starpack.wire import (
+    CONNECT_TIMEOUT,
+    CSV_TYPE,
+    PREDICT_PATH,
+    decode_csv,
+    encode_csv,
+    parse_value,
+)
+
+# Wrapper scripts, like the Gradio and Streamlit interfaces of a package, find the prediction endpoint of the package
+# they front in this variable, which the `gradio_middleware` step sets in the interface's container
+PREDICT_URL_ENV = "STARPACK_PREDICT_URL"
+# Deployed wrappers also answer predictions for JSON records at `/models/predict/<package name>/record`: a list of
+# records is answered with a list of the records of predictions, in the same order. Older wrappers answer it with a
+# 404 or 405, after which records are sent to the table endpoint as a CSV upload.
+RECORD_PATH = PREDICT_PATH + "/record"
+RECORD_UNSUPPORTED_STATUSES = {404, 405}
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_BATCH = 64
+
+
+class PredictionClient:
+    """
+    Gets predictions for single rows from a deployed model, for interfaces that predict a row at a time. Requests go
+    over one kept-alive session as JSON records, so that a prediction costs little more than the model itself. With a
+    `batch_window` in seconds, rows predicted at the same time from several threads, like clicks of several users of
+    an interface, are sent together in one request of up to `max_batch` rows, after waiting up to `batch_window` for
+    others to join.
+
+    `url` is the prediction endpoint of the model, `/models/predict/<package name>`, and defaults to the one in
+    `STARPACK_PREDICT_URL`.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        batch_window: float = 0.0,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        timeout: float = DEFAULT_TIMEOUT,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        url = url or os.environ.get(PREDICT_URL_ENV)
+        if not url:
+            raise ValueError(
+                f"No prediction URL given, and {PREDICT_URL_ENV} is not set"
+            )
+
+        self.url = url.rstrip("/")
+        self.record_url = f"{self.url}/record"
+        self.batch_window = max(0.0, batch_window)
+        self.max_batch = max(1, max_batch)
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Whether the deployment answers JSON records, until it is found not to
+        self.records_supported = True
+        # Rows waiting to be batched, and None once the client closes
+        self._queue: "Queue[Optional[Tuple[Dict[str, Any], Future]]]" = Queue()
+        self._batcher: Optional[Thread] = None
+        self._lock = Lock()
+        self._closed = False
+
+    def predict(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The prediction for one row, given as a record of its columns, as a record of the columns the model answers
+        """
+        if not self.batch_window:
+            return self.predict_many([record])[0]
+
+        future: "Future[Dict[str, Any]]" = Future()
+        self._ensure_batcher()
+        self._queue.put((record, future))
+        return future.result()
+
+    def predict_many(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Predictions for several rows in one request, in the order of the rows
+        """
+        if not records:
+            return []
+
+        if self.records_supported:
+            response = self.session.post(
+                self.record_url,
+                json=records,
+                timeout=(CONNECT_TIMEOUT, self.timeout),
+            )
+            if response.status_code not in RECORD_UNSUPPORTED_STATUSES:
+                response.raise_for_status()
+                return _check_count(response.json(), records)
+            self.records_supported = False
+
+        return _check_count(self._predict_table(records), records)
+
+    def close(self) -> None:
+        self._closed = True
+        if self._batcher is not None:
+            self._queue.put(None)
+            self._batcher.join()
+        self.session.close()
+
+    def __enter__(self) -> "PredictionClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _predict_table(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        columns = list(dict.fromkeys(column for record in records for column in record))
+        body = encode_csv(
+            columns, [[record.get(column) for column in columns] for record in records]
+        )
+        response = self.session.post(
+            self.url,
+            files={"file": ("records.csv", body, CSV_TYPE)},
+            headers={"Accept": CSV_TYPE},
+            timeout=(CONNECT_TIMEOUT, self.timeout),
+        )
+        response.raise_for_status()
+        # Wrappers answer in CSV when asked for it, whatever other formats they support
+        columns, rows = decode_csv(response.content)
+        return [
+            {column: parse_value(value) for column, value in zip(columns, row)}
+            for row in rows
+        ]
+
+    def _ensure_batcher(self) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The prediction client is closed")
+            if self._batcher is None:
+                self._batcher = Thread(
+                    target=self._run_batches, name="starpack-predictions", daemon=True
+                )
+                self._batcher.start()
+
+    def _run_batches(self) -> None:
+        """
+        Sends the rows waiting to be predicted, a batch at a time: each batch starts with the oldest row, and takes
+        the rows that arrive within `batch_window` of it
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = perf_counter() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - perf_counter()
+                try:
+                    item = self._queue.get(timeout=max(0.0, remaining))
+                except Empty:
+                    break
+                if item is None:
+                    # Close once this batch is answered
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            records = [record for record, _ in batch]
+            try:
+                predictions = self.predict_many(records)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+
+
+def _check_count(
+    predictions: List[Dict[str, Any]], records: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    count = len(predictions) if isinstance(predictions, list) else 0
+    if count != len(records):
+        raise ValueError(
+            f"The deployment answered {count} predictions for {len(records)} rows"
+        )
+    return predictions
@@ -0,0 +1,401 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+import socket
+from threading import Thread
+from time import perf_counter, sleep
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+from starpack._config import APP_DIR
+from starpack.leases import pid_alive
+from starpack.utils import run_detached
+
+# Deployments run with several replicas per wrapper are fronted by a proxy on the wrapper's port, one process per
+# wrapper, which spreads connections across the replicas. The deploy command tells a proxy where its replicas are by
+# writing its config file, which the proxy reloads when it changes, and the proxy reports the state of each replica in
+# its status file. Removing the config file shuts the proxy down.
+PROXIES_DIR = APP_DIR / "proxies"
+RELOAD_INTERVAL = 0.25
+HEALTH_INTERVAL = 2.0
+HEALTH_TIMEOUT = 1.0
+MAX_HEALTH_FAILURES = 2
+BUFFER_SIZE = 64 * 1024
+
+ACTIVE = "active"
+DRAINING = "draining"
+EJECTED = "ejected"
+
+
+def proxy_name(deployment: str, wrapper: str) -> str:
+    return f"{deployment}.{wrapper}"
+
+
+def config_path(name: str) -> Path:
+    return PROXIES_DIR / f"{name}.json"
+
+
+def status_path(name: str) -> Path:
+    return PROXIES_DIR / f"{name}.status.json"
+
+
+def load_config(name: str) -> Optional[Dict[str, Any]]:
+    """
+    The port a proxy listens on and the addresses of the replicas behind it, or None if there is no such proxy
+    """
+    return _load_json(config_path(name))
+
+
+def load_status(name: str) -> Optional[Dict[str, Any]]:
+    """
+    What a running proxy last reported: its process, and the state and open connections of each replica
+    """
+    return _load_json(status_path(name))
+
+
+def route(name: str, port: int, backends: Iterable[str]) -> None:
+    """
+    Points a proxy at a new set of replicas. Replicas that are no longer listed stop receiving connections, and are
+    dropped once the connections they have finish.
+    """
+    _save_json(config_path(name), {"port": int(port), "backends": list(backends)})
+
+
+def proxy_running(name: str) -> bool:
+    status = load_status(name)
+    return bool(status) and pid_alive(status["pid"]) and config_path(name).exists()
+
+
+def start_proxy(name: str) -> None:
+    """
+    Starts a proxy in a separate process that outlives the deploy command
+    """
+    run_detached("proxy", "serve", name)
+
+
+def ensure_proxy(name: str, timeout: float = 10.0) -> bool:
+    """
+    Starts the proxy of a config written with `route` unless it is running, and waits for it to listen. Returns
+    whether it is.
+    """
+    if proxy_running(name):
+        return True
+
+    start_proxy(name)
+    return _wait(lambda: proxy_running(name), timeout)
+
+
+def wait_for_backends(backends: Iterable[str], timeout: float) -> bool:
+    """
+    Waits for newly started replicas to accept connections, so that a proxy switching to them doesn't eject them
+    while they boot. Returns whether they all did before the timeout.
+    """
+    waiting = [Backend(address) for address in backends]
+
+    def ready() -> bool:
+        waiting[:] = [backend for backend in waiting if not _accepts(backend)]
+        return not waiting
+
+    return _wait(ready, timeout)
+
+
+def wait_for_drain(name: str, backends: Iterable[str], timeout: float) -> bool:
+    """
+    Waits for the proxy to let go of replicas taken out of its config, once their last connection closes. Returns
+    whether they were all drained before the timeout.
+    """
+    backends = set(backends)
+
+    def drained() -> bool:
+        status = load_status(name) or {}
+        return not backends.intersection(status.get("backends") or {})
+
+    return _wait(drained, timeout)
+
+
+def stop_proxy(name: str, timeout: float = 10.0) -> bool:
+    """
+    Shuts a proxy down, freeing its port. Returns whether it stopped in time.
+    """
+    status = load_status(name)
+    _remove(config_path(name))
+    if not status:
+        return True
+
+    # The proxy removes its status file once it closed its port
+    stopped = _wait(
+        lambda: not pid_alive(status["pid"]) or not status_path(name).exists(),
+        timeout,
+    )
+    _remove(status_path(name))
+    return stopped
+
+
+class Backend:
+    """
+    A replica behind the proxy, with the connections it currently serves and has served in all
+    """
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self.connections = 0
+        self.served = 0
+        self.failures = 0
+        self.state = ACTIVE
+
+    def __repr__(self) -> str:
+        return (
+            f"Backend({self.address!r}, {self.state}, connections={self.connections})"
+        )
+
+
+class LoadBalancer:
+    """
+    Spreads TCP connections across backends by least connections: every new connection goes to the active backend
+    serving the fewest, taking turns between backends that are equally busy. Backends that refuse connections or
+    fail `MAX_HEALTH_FAILURES` healthchecks in a row are ejected until they pass one again. Backends taken out of
+    the set are drained: they get no new connections and are dropped once their last one closes.
+    """
+
+    def __init__(self, addresses: Iterable[str] = ()) -> None:
+        self.backends: Dict[str, Backend] = {}
+        self.set_backends(addresses)
+
+    def set_backends(self, addresses: Iterable[str]) -> None:
+        addresses = list(addresses)
+        for address in addresses:
+            backend = self.backends.get(address)
+            if backend is None:
+                self.backends[address] = Backend(address)
+            elif backend.state == DRAINING:
+                backend.state = ACTIVE
+
+        for address, backend in list(self.backends.items()):
+            if address not in addresses:
+                backend.state = DRAINING
+                self._drop_if_drained(backend)
+
+    def pick(self, exclude: Optional[Set[str]] = None) -> Optional[Backend]:
+        candidates = [
+            backend
+            for backend in self.backends.values()
+            if backend.state == ACTIVE and backend.address not in (exclude or set())
+        ]
+        if not candidates:
+            return None
+        return min(
+            candidates, key=lambda backend: (backend.connections, backend.served)
+        )
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Forwards a client connection to a backend, trying the others when one refuses it
+        """
+        tried: Set[str] = set()
+        while True:
+            backend = self.pick(tried)
+            if backend is None:
+                writer.close()
+                return
+
+            tried.add(backend.address)
+            try:
+                upstream_reader, upstream_writer = await asyncio.wait_for(
+                    asyncio.open_connection(backend.host, backend.port),
+                    HEALTH_TIMEOUT,
+                )
+            except (OSError, asyncio.TimeoutError):
+                self._record_failure(backend, eject=True)
+                continue
+            break
+
+        backend.connections += 1
+        backend.served += 1
+        try:
+            await asyncio.gather(
+                _pipe(reader, upstream_writer), _pipe(upstream_reader, writer)
+            )
+        finally:
+            upstream_writer.close()
+            writer.close()
+            backend.connections -= 1
+            self._drop_if_drained(backend)
+
+    async def check_health(self) -> None:
+        """
+        Opens a connection to every backend that isn't draining, ejecting those that fail too many times in a row
+        and bringing back ejected ones that answer again
+        """
+        backends = [
+            backend for backend in self.backends.values() if backend.state != DRAINING
+        ]
+        results = await asyncio.gather(*(_can_connect(backend) for backend in backends))
+        for backend, healthy in zip(backends, results):
+            if healthy:
+                backend.failures = 0
+                if backend.state == EJECTED:
+                    backend.state = ACTIVE
+            else:
+                self._record_failure(backend)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            address: {"state": backend.state, "connections": backend.connections}
+            for address, backend in self.backends.items()
+        }
+
+    def _record_failure(self, backend: Backend, eject: bool = False) -> None:
+        backend.failures += 1
+        if backend.state == ACTIVE and (
+            eject or backend.failures >= MAX_HEALTH_FAILURES
+        ):
+            backend.state = EJECTED
+
+    def _drop_if_drained(self, backend: Backend) -> None:
+        if backend.state == DRAINING and not backend.connections:
+            self.backends.pop(backend.address, None)
+
+
+class ProxyServer:
+    """
+    Serves a proxy from its config file until the file is removed, reloading it when it changes, healthchecking the
+    backends every `health_interval` seconds, and reporting their state in the status file. `run` serves in the
+    current thread, and `start` in a background one.
+    """
+
+    def __init__(self, name: str, health_interval: float = HEALTH_INTERVAL) -> None:
+        self.name = name
+        self.health_interval = health_interval
+        self.balancer = LoadBalancer()
+        self.port: Optional[int] = None
+        self._status: Optional[Dict[str, Any]] = None
+        self._thread: Optional[Thread] = None
+
+    def run(self) -> None:
+        asyncio.run(self.serve())
+
+    def start(self) -> "ProxyServer":
+        self._thread = Thread(target=self.run, name=f"starpack-proxy-{self.name}")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    async def serve(self) -> None:
+        config = load_config(self.name)
+        if config is None:
+            return
+
+        self.port = config["port"]
+        self.balancer.set_backends(config["backends"])
+        modified = config_path(self.name).stat().st_mtime_ns
+        server = await asyncio.start_server(self.balancer.handle, port=self.port)
+        last_check = perf_counter()
+        try:
+            while True:
+                self._write_status()
+                await asyncio.sleep(RELOAD_INTERVAL)
+                try:
+                    current = config_path(self.name).stat().st_mtime_ns
+                except FileNotFoundError:
+                    break
+                if current != modified:
+                    modified = current
+                    config = load_config(self.name) or config
+                    self.balancer.set_backends(config["backends"])
+                if perf_counter() - last_check >= self.health_interval:
+                    await self.balancer.check_health()
+                    last_check = perf_counter()
+        finally:
+            server.close()
+            await server.wait_closed()
+            _remove(status_path(self.name))
+
+    def _write_status(self) -> None:
+        status = {
+            "pid": os.getpid(),
+            "port": self.port,
+            "backends": self.balancer.status(),
+        }
+        if status != self._status:
+            _save_json(status_path(self.name), status)
+            self._status = status
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Copies one direction of a connection, passing on the end of the stream so that a client can finish sending
+    before the response comes back
+    """
+    try:
+        while True:
+            data = await reader.read(BUFFER_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        # Tearing the connection down ends the other direction as well
+        writer.close()
+
+
+async def _can_connect(backend: Backend) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(backend.host, backend.port), HEALTH_TIMEOUT
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    writer.close()
+    return True
+
+
+def _wait(condition: Callable[[], bool], timeout: float) -> bool:
+    deadline = perf_counter() + timeout
+    while not condition():
+        if perf_counter() >= deadline:
+            return False
+        sleep(RELOAD_INTERVAL / 2)
+    return True
+
+
+def _accepts(backend: Backend) -> bool:
+    try:
+        with socket.create_connection((backend.host, backend.port), HEALTH_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+
+def _remove(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _load_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+    return data if isinstance(data, dict) else None
+
+
+def _save_json(path: Path, data: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = path.with_suffix(".tmp")
+    temp_file.write_text(json.dumps(data, indent=2, sort_keys=True))
+    temp_file.replace(path)
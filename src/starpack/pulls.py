@@ -0,0 +1,200 @@
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import docker
+from rich import print
+
+from starpack._config import APP_DIR
+from starpack.utils import run_detached
+
+PULL_RECORD_FILE = APP_DIR / "pulls.json"
+
+# When to look for a newer engine image: on every start, only when there is no local copy, or when the last check is
+# older than the `pull_ttl` setting
+PULL_POLICIES = ("always", "if-missing", "ttl")
+
+
+def load_pull_records(record_file: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads when each image was last checked against its registry, and the digest it had then
+    """
+    record_file = record_file or PULL_RECORD_FILE
+    try:
+        records = json.loads(record_file.read_text())
+    except (OSError, ValueError):
+        return {}
+
+    return records if isinstance(records, dict) else {}
+
+
+def record_pull(
+    image: str, digest: Optional[str], record_file: Optional[Path] = None
+) -> None:
+    """
+    Records that an image is up to date with its registry, replacing the file atomically
+    """
+    record_file = record_file or PULL_RECORD_FILE
+    records = load_pull_records(record_file)
+    records[image] = {
+        "digest": digest,
+        "last_checked": datetime.now(timezone.utc).isoformat(),
+    }
+
+    record_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = record_file.with_suffix(".tmp")
+    temp_file.write_text(json.dumps(records, indent=2, sort_keys=True))
+    temp_file.replace(record_file)
+
+
+def seconds_since_check(image: str, record_file: Optional[Path] = None) -> float:
+    """
+    Seconds since an image was last checked against its registry, infinite if it never was
+    """
+    record = load_pull_records(record_file).get(image) or {}
+    try:
+        last_checked = datetime.fromisoformat(record["last_checked"])
+    except (KeyError, TypeError, ValueError):
+        return float("inf")
+
+    return (datetime.now(timezone.utc) - last_checked).total_seconds()
+
+
+class ImagePuller:
+    """
+    Keeps a local copy of an image up to date according to a pull policy. Rather than pulling on every start, the
+    digest the registry has for the image is compared with the local copy's, which takes a single small request, and
+    the image is only pulled when they differ. A registry that can't be reached, such as when offline, leaves the
+    local copy in use.
+    """
+
+    def __init__(
+        self,
+        docker_client: docker.DockerClient,
+        image: str,
+        policy: str = "ttl",
+        ttl: float = 24 * 60 * 60,
+        record_file: Optional[Path] = None,
+    ) -> None:
+        self.docker_client = docker_client
+        self.image = image
+        self.policy = policy
+        self.ttl = ttl
+        self.record_file = record_file
+
+    def local_digests(self) -> Optional[List[str]]:
+        """
+        Registry digests of the local copy of the image, or None if there is no local copy
+        """
+        try:
+            local_image = self.docker_client.images.get(self.image)
+        except docker.errors.ImageNotFound:
+            return None
+
+        return [
+            repo_digest.split("@", 1)[1]
+            for repo_digest in local_image.attrs.get("RepoDigests") or []
+            if "@" in repo_digest
+        ]
+
+    def registry_digest(self) -> Optional[str]:
+        """
+        Digest the registry currently has for the image, or None if it can't be reached
+        """
+        try:
+            return self.docker_client.images.get_registry_data(self.image).id
+        except docker.errors.APIError:
+            return None
+
+    def is_stale(self) -> bool:
+        """
+        Whether the policy calls for checking the registry for a newer image
+        """
+        if self.policy == "if-missing":
+            return False
+        if self.policy == "ttl":
+            return seconds_since_check(self.image, self.record_file) >= self.ttl
+        return True
+
+    def ensure(self, refresh: Optional[bool] = None) -> bool:
+        """
+        Makes sure the image is available locally, pulling it if it is missing. When the policy calls for it, or when
+        `refresh` is given, the local copy is also brought up to date with the registry. Returns whether the image
+        was pulled.
+        """
+        if self.local_digests() is None:
+            print(f"Pulling {self.image}...")
+            self.pull()
+            return True
+
+        if refresh is None:
+            refresh = self.is_stale()
+
+        return self.refresh() if refresh else False
+
+    def refresh(self) -> bool:
+        """
+        Pulls the image if the registry has a different one than the local copy. Returns whether it was pulled.
+        """
+        remote_digest = self.registry_digest()
+        if remote_digest is None:
+            print(f"Could not reach the registry of {self.image}, using the local copy")
+            return False
+
+        if remote_digest in (self.local_digests() or []):
+            print(f"{self.image} is up to date")
+            record_pull(self.image, remote_digest, self.record_file)
+            return False
+
+        print(f"Pulling a newer {self.image}...")
+        self.pull()
+        return True
+
+    def pull(self) -> None:
+        self.docker_client.images.pull(self.image)
+        digests = self.local_digests() or [None]
+        record_pull(self.image, digests[0], self.record_file)
+
+
+def refresh_in_background() -> None:
+    """
+    Brings the engine image up to date in a separate process, so that the current start doesn't wait on the registry
+    and the next one gets the newer image
+    """
+    run_detached("engine", "pull")
+
+
+def ensure_engine_image(
+    docker_client: docker.DockerClient, force: bool = False, background: bool = True
+) -> bool:
+    """
+    Makes sure the engine image from the settings is available and, according to the `pull_policy` setting, up to
+    date. With the "ttl" policy and `pull_in_background` on, a stale local copy is used as is while a background
+    process refreshes it. `force` checks the registry whatever the policy. Returns whether the image was pulled.
+    """
+    from starpack._config import settings
+
+    if not settings.pull_image:
+        return False
+
+    puller = ImagePuller(
+        docker_client,
+        settings.engine_image,
+        policy=settings.pull_policy,
+        ttl=settings.pull_ttl,
+    )
+    if force:
+        return puller.ensure(refresh=True)
+
+    if (
+        background
+        and settings.pull_in_background
+        and settings.pull_policy == "ttl"
+        and puller.local_digests() is not None
+        and puller.is_stale()
+    ):
+        refresh_in_background()
+        return False
+
+    return puller.ensure()
@@ -0,0 +1,180 @@
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+from threading import Event, Thread
+from time import perf_counter
+from statistics import median
+from typing import Any, Callable, Dict, List, Optional
+
+import docker
+from docker.models.containers import Container
+
+from starpack._config import APP_DIR
+from starpack.errors import EngineInitializationError
+
+INITIAL_DELAY = 0.05
+MAX_DELAY = 1.0
+STARTUP_METRICS_FILE = APP_DIR / "metrics" / "engine_startup.jsonl"
+
+FAILED_STATUSES = {"exited", "dead", "removing"}
+FAILED_EVENTS = {"die", "oom", "kill", "destroy"}
+
+
+class EngineWatcher:
+    """
+    Follows the Docker events of an engine container in the background so that anyone waiting on the engine
+    wakes up as soon as its state changes instead of sleeping out a fixed interval.
+    """
+
+    def __init__(self, docker_client: Any, container: Container) -> None:
+        self.changed = Event()
+        self.failed = False
+        self._events = None
+
+        try:
+            self._events = docker_client.events(
+                filters={"type": "container", "container": container.id},
+                decode=True,
+            )
+        except docker.errors.APIError:
+            return
+
+        Thread(target=self._follow, daemon=True).start()
+
+    def wait(self, timeout: float) -> None:
+        """
+        Waits up to `timeout` seconds for the container to change state
+        """
+        self.changed.wait(timeout)
+        self.changed.clear()
+
+    def close(self) -> None:
+        if self._events is not None and hasattr(self._events, "close"):
+            self._events.close()
+
+    def _follow(self) -> None:
+        try:
+            for event in self._events:
+                status = event.get("status", "")
+                if status in FAILED_EVENTS or status == "health_status: unhealthy":
+                    self.failed = True
+                self.changed.set()
+        except Exception:
+            # The stream closes with an error when we stop following it
+            return
+
+
+def container_failed(container: Container) -> bool:
+    """
+    Checks whether a container has stopped or reports itself as unhealthy
+    """
+    try:
+        container.reload()
+    except docker.errors.APIError:
+        return True
+
+    state = container.attrs.get("State", {})
+    health = state.get("Health") or {}
+    return state.get("Status") in FAILED_STATUSES or health.get("Status") == "unhealthy"
+
+
+def wait_for_engine(
+    check_health: Callable[[], bool],
+    timeout: float,
+    docker_client: Any = None,
+    container: Optional[Container] = None,
+) -> float:
+    """
+    Waits until `check_health` succeeds, retrying with exponential backoff until `timeout` seconds have passed.
+    When the engine runs in a local container, its Docker events wake the retries early and a container that
+    dies or turns unhealthy fails the wait right away. Returns the number of seconds it took.
+    """
+    start = perf_counter()
+    deadline = start + timeout
+    delay = INITIAL_DELAY
+    watcher = None
+
+    try:
+        while not check_health():
+            if container is not None:
+                if watcher is None and docker_client is not None:
+                    watcher = EngineWatcher(docker_client, container)
+                if (watcher is not None and watcher.failed) or container_failed(
+                    container
+                ):
+                    raise EngineInitializationError()
+
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                raise EngineInitializationError()
+
+            if watcher is not None:
+                watcher.wait(min(delay, remaining))
+            else:
+                Event().wait(min(delay, remaining))
+            delay = min(delay * 2, MAX_DELAY)
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+    return perf_counter() - start
+
+
+def record_startup_latency(
+    url: str,
+    seconds: float,
+    metrics_file: Optional[Path] = None,
+    mode: str = "cold",
+) -> None:
+    """
+    Appends how long the engine took to become ready to the startup metrics log, along with how it was started:
+    "cold" for a new container, "standby" for a promoted standby, or "existing" for a container that was already there
+    """
+    metrics_file = metrics_file or STARTUP_METRICS_FILE
+    metrics_file.parent.mkdir(parents=True, exist_ok=True)
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "url": url,
+        "seconds": round(seconds, 4),
+        "mode": mode,
+    }
+    with open(metrics_file, "a") as metrics:
+        metrics.write(json.dumps(record) + "\n")
+
+
+def load_startup_latencies(metrics_file: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """
+    Reads the startup metrics log, oldest first, skipping lines that can't be read
+    """
+    metrics_file = metrics_file or STARTUP_METRICS_FILE
+    try:
+        lines = metrics_file.read_text().splitlines()
+    except OSError:
+        return []
+
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+
+    return records
+
+
+def latency_summary(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Number of starts, and median and worst startup latency in seconds, for each way the engine was started
+    """
+    by_mode: Dict[str, List[float]] = {}
+    for record in records:
+        by_mode.setdefault(record.get("mode", "cold"), []).append(record["seconds"])
+
+    return {
+        mode: {
+            "starts": len(seconds),
+            "median": median(seconds),
+            "max": max(seconds),
+        }
+        for mode, seconds in by_mode.items()
+    }
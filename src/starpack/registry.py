@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from docker.models.containers import Container
+
+from starpack._config import APP_DIR
+
+REGISTRY_FILE = APP_DIR / "engines.json"
+
+EngineEntry = Dict[str, Any]
+
+
+def load_engines(registry_file: Optional[Path] = None) -> Dict[str, EngineEntry]:
+    """
+    Loads the known engines keyed by container ID, returning nothing if the registry is missing or unreadable
+    """
+    registry_file = registry_file or REGISTRY_FILE
+    try:
+        engines = json.loads(registry_file.read_text()).get("engines", {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+    return engines if isinstance(engines, dict) else {}
+
+
+def save_engines(
+    engines: Dict[str, EngineEntry], registry_file: Optional[Path] = None
+) -> None:
+    """
+    Saves the known engines, replacing the file atomically so concurrent readers never see a partial write
+    """
+    registry_file = registry_file or REGISTRY_FILE
+    registry_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = registry_file.with_suffix(".tmp")
+    temp_file.write_text(json.dumps({"engines": engines}, indent=2, sort_keys=True))
+    temp_file.replace(registry_file)
+
+
+def record_engine(
+    container: Container, port: Any, registry_file: Optional[Path] = None
+) -> EngineEntry:
+    """
+    Records or refreshes an engine container and the host port it is published on
+    """
+    engines = load_engines(registry_file)
+    entry = {
+        "id": container.id,
+        "name": container.name,
+        "port": str(port) if port is not None else None,
+        "image": container.attrs.get("Image"),
+        "last_seen": datetime.now(timezone.utc).isoformat(),
+    }
+    engines[container.id] = entry
+    save_engines(engines, registry_file)
+
+    return entry
+
+
+def forget_engine(container_id: str, registry_file: Optional[Path] = None) -> None:
+    """
+    Removes an engine from the registry if it is present
+    """
+    engines = load_engines(registry_file)
+    if engines.pop(container_id, None) is not None:
+        save_engines(engines, registry_file)
@@ -0,0 +1,204 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from time import perf_counter, sleep
+from typing import TYPE_CHECKING, Any, Callable, Deque, Iterable, List, Optional, Tuple
+
+from rich import print
+
+from starpack.errors import PredictionFailedError
+from starpack.tabular import (
+    Chunk,
+    TableWriter,
+    decode_table,
+    encode_table,
+    wire_media_type,
+)
+from starpack.wire import CONNECT_TIMEOUT, CSV_TYPE, PREDICT_PATH, WIRE_EXTENSIONS
+
+# requests is imported once a table is scored, so that the CLI can take its defaults from here and still start fast
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+# Statuses worth trying a chunk again for, as the deployment is busy or restarting
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# Statuses a wrapper rejects a table in a format other than CSV with, after which chunks are sent as CSV
+FORMAT_REJECTED_STATUSES = {400, 415, 422}
+MAX_BACKOFF = 5.0
+
+
+def prediction_url(base_url: str, model: str) -> str:
+    return base_url.rstrip("/") + PREDICT_PATH.format(model=model)
+
+
+class ScoringReport:
+    """
+    How scoring a table went
+    """
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self.chunks = 0
+        self.retries = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Scored {self.rows} rows in {self.chunks} chunks in {self.seconds:.2f}s "
+            f"({self.rows_per_second:,.0f} rows/s, {self.retries} retries)"
+        )
+
+
+class BatchScorer:
+    """
+    Scores a table against a deployed model a chunk at a time, with up to `concurrency` chunks in flight over pooled
+    keep-alive connections. Predictions are written in the order of the input whatever order they come back in, and
+    only a bounded window of chunks is held at once, so that memory doesn't grow with the size of the table. A chunk
+    that fails on a connection error or a status in `RETRY_STATUSES` is tried again up to `retries` times, backing off
+    in between. Chunks are sent in `wire_format`, falling back to CSV for deployments that don't read it.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        retries: int = DEFAULT_RETRIES,
+        timeout: Optional[float] = None,
+        session: Optional["requests.Session"] = None,
+        wire_format: str = "auto",
+    ) -> None:
+        import requests.adapters
+
+        self.url = url
+        self.media_type = wire_media_type(wire_format)
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.concurrency, pool_maxsize=self.concurrency
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.report = ScoringReport()
+        self._report_lock = Lock()
+
+    def score(
+        self,
+        chunks: Iterable[Chunk],
+        writer: TableWriter,
+        on_chunk: Optional[Callable[[int], None]] = None,
+    ) -> ScoringReport:
+        """
+        Scores every chunk, writing the predictions with `writer` and calling `on_chunk` with the number of rows of
+        each chunk once it is written
+        """
+        start = perf_counter()
+        window: Deque["Future[Tuple[List[str], List[List[str]]]]"] = deque()
+
+        def write_next() -> None:
+            columns, rows = window.popleft().result()
+            writer.write(columns, rows)
+            self.report.rows += len(rows)
+            self.report.chunks += 1
+            if on_chunk:
+                on_chunk(len(rows))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                for chunk in chunks:
+                    window.append(executor.submit(self.score_chunk, chunk))
+                    # Keep the next chunks queued while the oldest is written
+                    while window and (
+                        len(window) > 2 * self.concurrency or window[0].done()
+                    ):
+                        write_next()
+                while window:
+                    write_next()
+            finally:
+                for future in window:
+                    future.cancel()
+
+        self.report.seconds = perf_counter() - start
+        return self.report
+
+    def score_chunk(self, chunk: Chunk) -> Tuple[List[str], List[List[str]]]:
+        """
+        Sends one chunk for prediction, trying again when the deployment is unreachable or busy
+        """
+        import requests
+
+        media_type = self.media_type
+        body = encode_table(chunk.columns, chunk.rows, media_type)
+        attempt = 0
+        while True:
+            name = f"chunk_{chunk.index}{WIRE_EXTENSIONS[media_type]}"
+            try:
+                response = self.session.post(
+                    self.url,
+                    files={"file": (name, body, media_type)},
+                    headers={"Accept": _accept(media_type)},
+                    timeout=(CONNECT_TIMEOUT, self.timeout),
+                )
+                reason = f"{response.status_code} {response.reason}"
+                retry = response.status_code in RETRY_STATUSES
+            except (requests.ConnectionError, requests.Timeout) as error:
+                response, reason, retry = None, str(error), True
+
+            if (
+                response is not None
+                and media_type != CSV_TYPE
+                and response.status_code in FORMAT_REJECTED_STATUSES
+            ):
+                self._fall_back_to_csv(media_type)
+                media_type = CSV_TYPE
+                body = encode_table(chunk.columns, chunk.rows, media_type)
+                continue
+
+            if response is not None and response.ok:
+                columns, rows = decode_table(
+                    response.content, response.headers.get("Content-Type", CSV_TYPE)
+                )
+                if len(rows) != len(chunk.rows):
+                    raise PredictionFailedError(
+                        chunk.index,
+                        f"{len(rows)} predictions for {len(chunk.rows)} rows",
+                    )
+                return columns, rows
+
+            if not retry or attempt >= self.retries:
+                raise PredictionFailedError(chunk.index, reason)
+            attempt += 1
+            with self._report_lock:
+                self.report.retries += 1
+            sleep(min(2 ** (attempt - 1) * 0.1, MAX_BACKOFF))
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _fall_back_to_csv(self, media_type: str) -> None:
+        with self._report_lock:
+            if self.media_type == media_type:
+                print(f"The deployment doesn't read {media_type}, sending CSV instead")
+                self.media_type = CSV_TYPE
+
+    def __enter__(self) -> "BatchScorer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def _accept(media_type: str) -> str:
+    """
+    Asks for predictions in the format of the request, or else in CSV
+    """
+    if media_type == CSV_TYPE:
+        return CSV_TYPE
+    return f"{media_type}, {CSV_TYPE};q=0.5"
@@ -0,0 +1,202 @@
+import json
+import re
+from time import time
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from rich.table import Table
+
+from starpack.manifest import Manifest
+
+# Layout of the content-addressed store on the artifacts volume. Each file's contents are kept once, as a blob
+# named by its SHA256 digest, and the files of every project directory are hard links to those blobs, so identical
+# files across projects and uploads take up space only once. The index records every blob's size and when it was
+# last used, and the blobs that each project references.
+STORE_DIR = ".starpack"
+INDEX_NAME = f"{STORE_DIR}/index.json"
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def blob_path(sha256: str) -> str:
+    """
+    Location of a blob, relative to the root of the artifacts volume
+    """
+    return f"{STORE_DIR}/blobs/{sha256[:2]}/{sha256}"
+
+
+class ProjectUsage(NamedTuple):
+    """
+    Space used by one project on the artifacts volume. `unique_size` counts the blobs no other project references.
+    """
+
+    name: str
+    files: int
+    size: int
+    unique_size: int
+    last_used: float
+
+
+class StoreIndex:
+    """
+    Index of the content-addressed store on the artifacts volume
+    """
+
+    def __init__(
+        self,
+        blobs: Optional[Dict[str, Dict[str, Any]]] = None,
+        projects: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> None:
+        self.blobs = blobs or {}
+        self.projects = projects or {}
+
+    @classmethod
+    def loads(cls, data: Optional[bytes]) -> "StoreIndex":
+        """
+        Reads an index, starting from an empty one if it is missing or unreadable
+        """
+        try:
+            index = json.loads(data or b"{}")
+            return cls(index.get("blobs"), index.get("projects"))
+        except (ValueError, AttributeError):
+            return cls()
+
+    def dumps(self) -> bytes:
+        return json.dumps(
+            {"blobs": self.blobs, "projects": self.projects}, sort_keys=True
+        ).encode()
+
+    @property
+    def size(self) -> int:
+        return sum(blob["size"] for blob in self.blobs.values())
+
+    def has_blob(self, sha256: str) -> bool:
+        return sha256 in self.blobs
+
+    def record_project(
+        self, name: str, manifest: Manifest, now: Optional[float] = None
+    ) -> None:
+        """
+        Records the blobs a project references after an upload, marking them as used
+        """
+        now = now or time()
+        for entry in manifest.values():
+            self.blobs[entry["sha256"]] = {"size": entry["size"], "last_used": now}
+
+        self.projects[name] = {
+            "blobs": sorted({entry["sha256"] for entry in manifest.values()}),
+            "files": len(manifest),
+            "size": sum(entry["size"] for entry in manifest.values()),
+            "last_used": now,
+        }
+
+    def referenced(self) -> Set[str]:
+        """
+        Blobs referenced by at least one project
+        """
+        return {
+            sha256 for project in self.projects.values() for sha256 in project["blobs"]
+        }
+
+    def plan_gc(self, max_size: int) -> List[str]:
+        """
+        Blobs to remove to bring the store under `max_size` bytes, least recently used first. Blobs that a project
+        still references are never removed, so the store can stay over its quota.
+        """
+        referenced = self.referenced()
+        unreferenced = sorted(
+            (sha256 for sha256 in self.blobs if sha256 not in referenced),
+            key=lambda sha256: self.blobs[sha256]["last_used"],
+        )
+
+        size = self.size
+        evicted = []
+        for sha256 in unreferenced:
+            if size <= max_size:
+                break
+            size -= self.blobs[sha256]["size"]
+            evicted.append(sha256)
+
+        return evicted
+
+    def remove_blobs(self, blobs: List[str]) -> None:
+        for sha256 in blobs:
+            self.blobs.pop(sha256, None)
+
+    def usage(self) -> List[ProjectUsage]:
+        """
+        Space used by each project, most recently used first
+        """
+        references: Dict[str, int] = {}
+        for project in self.projects.values():
+            for sha256 in project["blobs"]:
+                references[sha256] = references.get(sha256, 0) + 1
+
+        usage = [
+            ProjectUsage(
+                name,
+                project["files"],
+                project["size"],
+                sum(
+                    self.blobs.get(sha256, {}).get("size", 0)
+                    for sha256 in project["blobs"]
+                    if references[sha256] == 1
+                ),
+                project["last_used"],
+            )
+            for name, project in self.projects.items()
+        ]
+        return sorted(usage, key=lambda project: project.last_used, reverse=True)
+
+    def usage_table(self) -> Table:
+        """
+        Table of the space used by each project and by the store as a whole
+        """
+        table = Table(title="Artifact store usage")
+        table.add_column("Project")
+        table.add_column("Files", justify="right")
+        table.add_column("Size", justify="right")
+        table.add_column("Unique", justify="right")
+
+        for project in self.usage():
+            table.add_row(
+                project.name,
+                str(project.files),
+                format_size(project.size),
+                format_size(project.unique_size),
+            )
+
+        referenced = self.referenced()
+        unreferenced = sum(
+            blob["size"]
+            for sha256, blob in self.blobs.items()
+            if sha256 not in referenced
+        )
+        table.add_section()
+        table.add_row("(unreferenced)", "", format_size(unreferenced), "")
+        table.add_row("Total stored", str(len(self.blobs)), format_size(self.size), "")
+
+        return table
+
+
+def parse_size(size: str) -> int:
+    """
+    Parses a size such as "512MB", "10G", or "1024" into bytes
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*", size, re.I)
+    if not match:
+        raise ValueError(f"Invalid size: {size}")
+
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def format_size(size: float) -> str:
+    """
+    Human-readable size in bytes
+    """
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+    return f"{size:.1f} TB"
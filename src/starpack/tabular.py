@@ -0,0 +1,331 @@
+import csv
+from importlib.util import find_spec
+import json
+from pathlib import Path
+import struct
+import tempfile
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from starpack.errors import (
+    MissingDependencyError,
+    UnknownWireFormatError,
+    UnsupportedFormatError,
+)
+from starpack.wire import (
+    ARROW_TYPE,
+    CSV_TYPE,
+    JSON_TYPE,
+    PARQUET_TYPE,
+    WIRE_FORMATS,
+    decode_csv,
+    encode_csv,
+    parse_value,
+)
+
+# Tabular files read and written a chunk of rows at a time, so that scoring a file of any size takes the same memory
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+}
+DEFAULT_CHUNK_ROWS = 1000
+# Arrow and Parquet are optional: `pip install starpack[parquet]`. pyarrow takes longer to import than the rest of
+# Starpack, so it is only imported once a table is read or written in one of them.
+pyarrow: Any = None
+
+
+class Chunk(NamedTuple):
+    """
+    Consecutive rows of a table, numbered from zero in the order they were read
+    """
+
+    index: int
+    columns: List[str]
+    rows: List[List[Any]]
+
+
+def file_format(path: Path) -> str:
+    try:
+        return FORMATS[path.suffix.lower()]
+    except KeyError:
+        raise UnsupportedFormatError(path, list(FORMATS))
+
+
+def read_chunks(path: Path, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Chunk]:
+    """
+    Reads a CSV, JSON Lines, or Parquet file in chunks of up to `chunk_rows` rows
+    """
+    readers = {"csv": _read_csv, "jsonl": _read_jsonl, "parquet": _read_parquet}
+    batches = readers[file_format(path)](path, max(1, chunk_rows))
+    for index, (columns, rows) in enumerate(batches):
+        yield Chunk(index, columns, rows)
+
+
+def wire_media_type(wire_format: str) -> str:
+    """
+    The media type of a wire format given by name, where "auto" picks Arrow if pyarrow is installed and CSV otherwise
+    """
+    if wire_format == "auto":
+        return ARROW_TYPE if find_spec("pyarrow") is not None else CSV_TYPE
+    try:
+        return WIRE_FORMATS[wire_format]
+    except KeyError:
+        raise UnknownWireFormatError(wire_format, ["auto", *WIRE_FORMATS])
+
+
+def encode_table(columns: List[str], rows: List[List[Any]], media_type: str) -> bytes:
+    """
+    Serializes a table in one of the wire formats, typing the values of CSV input for the formats that keep types
+    """
+    if media_type == JSON_TYPE:
+        data = [[parse_value(value) for value in row] for row in rows]
+        return json.dumps({"columns": columns, "data": data}).encode()
+    if media_type in (ARROW_TYPE, PARQUET_TYPE):
+        _require_pyarrow("Sending Arrow and Parquet tables")
+        table = _arrow_table(columns, rows)
+        output = pyarrow.BufferOutputStream()
+        if media_type == ARROW_TYPE:
+            with pyarrow.ipc.new_stream(output, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pyarrow.parquet.write_table(table, output)
+        return output.getvalue().to_pybytes()
+    return encode_csv(columns, rows)
+
+
+def decode_table(data: bytes, media_type: str) -> Tuple[List[str], List[List[Any]]]:
+    """
+    Reads a table in one of the wire formats, taking any other media type to be CSV, as older wrappers label theirs
+    loosely
+    """
+    media_type = media_type.split(";", 1)[0].strip().lower()
+    if media_type == JSON_TYPE:
+        table = json.loads(data)
+        if isinstance(table, list):
+            return _records_to_rows(table)
+        return table["columns"], table["data"]
+    if media_type in (ARROW_TYPE, PARQUET_TYPE):
+        _require_pyarrow("Reading Arrow and Parquet tables")
+        if media_type == ARROW_TYPE:
+            arrow_table = pyarrow.ipc.open_stream(data).read_all()
+        else:
+            arrow_table = pyarrow.parquet.read_table(pyarrow.BufferReader(data))
+        values = [column.to_pylist() for column in arrow_table.columns]
+        return arrow_table.column_names, [list(row) for row in zip(*values)]
+    return decode_csv(data)
+
+
+class TableWriter:
+    """
+    Writes chunks of rows to a CSV, JSON Lines, or Parquet file as they come, taking the columns of the first chunk.
+
+    As the type of a column can change from chunk to chunk, like integers followed by floats, Parquet chunks are kept
+    in a temporary file next to the output until the writer closes, and then written with a schema that fits them all:
+    floats for columns that mix integers and floats, the other type for columns that are empty in some chunks, and
+    text for any other mix.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.format = file_format(path)
+        if self.format == "parquet":
+            _require_pyarrow("Writing Parquet files")
+        self.columns: Optional[List[str]] = None
+        self.rows_written = 0
+        self._file: Optional[IO[str]] = None
+        self._spool: Optional[IO[bytes]] = None
+        self._schema: Any = None
+
+    def write(self, columns: List[str], rows: List[List[Any]]) -> None:
+        if self.columns is None:
+            self.columns = list(columns)
+            self._open()
+
+        if self.format == "csv":
+            csv.writer(self._file, lineterminator="\n").writerows(rows)
+        elif self.format == "jsonl":
+            for row in rows:
+                record = {
+                    column: parse_value(value) for column, value in zip(columns, row)
+                }
+                self._file.write(json.dumps(record) + "\n")
+        else:
+            table = _arrow_table(self.columns, rows)
+            self._schema = (
+                table.schema
+                if self._schema is None
+                else _unify_schemas(self._schema, table.schema)
+            )
+            _spool_table(self._spool, table)
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        if self.columns is None:
+            # Nothing was written, but an empty result is still a result
+            self.columns = []
+            self._open()
+        if self._file is not None:
+            self._file.close()
+        if self._spool is not None:
+            self._write_parquet()
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.format == "parquet":
+            self._spool = tempfile.TemporaryFile(dir=self.path.parent)
+            return
+        self._file = open(self.path, "w", newline="")
+        if self.format == "csv":
+            csv.writer(self._file, lineterminator="\n").writerow(self.columns)
+
+    def _write_parquet(self) -> None:
+        schema = self._schema or pyarrow.schema(
+            [(column, pyarrow.null()) for column in self.columns]
+        )
+        self._spool.seek(0)
+        writer = pyarrow.parquet.ParquetWriter(self.path, schema)
+        try:
+            for table in _read_spool(self._spool):
+                writer.write_table(table.cast(schema))
+        finally:
+            writer.close()
+            self._spool.close()
+            self._spool = None
+
+
+def _read_csv(
+    path: Path, chunk_rows: int
+) -> Iterator[Tuple[List[str], List[List[Any]]]]:
+    with open(path, newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        columns = next(reader, None)
+        if columns is None:
+            return
+        rows: List[List[Any]] = []
+        for row in reader:
+            if not row:
+                continue
+            rows.append(row)
+            if len(rows) == chunk_rows:
+                yield columns, rows
+                rows = []
+        if rows:
+            yield columns, rows
+
+
+def _read_jsonl(
+    path: Path, chunk_rows: int
+) -> Iterator[Tuple[List[str], List[List[Any]]]]:
+    with open(path) as jsonl_file:
+        records: List[Dict[str, Any]] = []
+        for line in jsonl_file:
+            if not line.strip():
+                continue
+            records.append(json.loads(line))
+            if len(records) == chunk_rows:
+                yield _records_to_rows(records)
+                records = []
+        if records:
+            yield _records_to_rows(records)
+
+
+def _read_parquet(
+    path: Path, chunk_rows: int
+) -> Iterator[Tuple[List[str], List[List[Any]]]]:
+    _require_pyarrow("Reading Parquet files")
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    columns = parquet_file.schema_arrow.names
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        values = [batch.column(column).to_pylist() for column in range(len(columns))]
+        yield columns, [list(row) for row in zip(*values)]
+
+
+def _records_to_rows(
+    records: List[Dict[str, Any]],
+) -> Tuple[List[str], List[List[Any]]]:
+    columns: Dict[str, None] = {}
+    for record in records:
+        columns.update(dict.fromkeys(record))
+    return list(columns), [
+        [record.get(column) for column in columns] for record in records
+    ]
+
+
+def _arrow_table(columns: List[str], rows: List[List[Any]]) -> "pyarrow.Table":
+    """
+    Builds an Arrow table a column at a time, keeping a column that mixes numbers and text as text
+    """
+    arrays = []
+    for index in range(len(columns)):
+        values = [parse_value(row[index]) for row in rows]
+        try:
+            arrays.append(pyarrow.array(values))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            arrays.append(
+                pyarrow.array(
+                    [None if value is None else str(value) for value in values]
+                )
+            )
+    return pyarrow.Table.from_arrays(arrays, names=columns)
+
+
+def _unify_schemas(
+    first: "pyarrow.Schema", second: "pyarrow.Schema"
+) -> "pyarrow.Schema":
+    fields = []
+    for field, other in zip(first, second):
+        if field.type == other.type or pyarrow.types.is_null(other.type):
+            kind = field.type
+        elif pyarrow.types.is_null(field.type):
+            kind = other.type
+        elif all(pyarrow.types.is_integer(type_) for type_ in (field.type, other.type)):
+            kind = pyarrow.int64()
+        elif all(
+            pyarrow.types.is_integer(type_) or pyarrow.types.is_floating(type_)
+            for type_ in (field.type, other.type)
+        ):
+            kind = pyarrow.float64()
+        else:
+            kind = pyarrow.string()
+        fields.append(pyarrow.field(field.name, kind))
+    return pyarrow.schema(fields)
+
+
+def _spool_table(spool: IO[bytes], table: "pyarrow.Table") -> None:
+    """
+    Appends a table to a temporary file as an Arrow IPC stream, after its length
+    """
+    output = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(output, table.schema) as writer:
+        writer.write_table(table)
+    data = output.getvalue().to_pybytes()
+    spool.write(struct.pack("<Q", len(data)))
+    spool.write(data)
+
+
+def _read_spool(spool: IO[bytes]) -> Iterator["pyarrow.Table"]:
+    while True:
+        header = spool.read(8)
+        if not header:
+            return
+        (length,) = struct.unpack("<Q", header)
+        yield pyarrow.ipc.open_stream(spool.read(length)).read_all()
+
+
+def _require_pyarrow(feature: str) -> None:
+    global pyarrow
+
+    if pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise MissingDependencyError(feature, "pyarrow", "parquet")
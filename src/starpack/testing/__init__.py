@@ -0,0 +1,32 @@
+from pathlib import Path
+from typing import Any
+
+
+def use_app_dir(monkeypatch: Any, app_dir: Path) -> None:
+    """
+    Points everything Starpack keeps in its configuration folder (manifests, the engine registry, metrics, job
+    records, upload progress, image pull records, engine leases, and deployment proxies) at `app_dir` for the duration
+    of a test, given pytest's `monkeypatch` fixture.
+    """
+    from starpack import (
+        jobs,
+        leases,
+        manifest,
+        proxy,
+        pulls,
+        readiness,
+        registry,
+        uploads,
+    )
+
+    monkeypatch.setattr(manifest, "MANIFEST_DIR", app_dir / "manifests")
+    monkeypatch.setattr(registry, "REGISTRY_FILE", app_dir / "engines.json")
+    monkeypatch.setattr(
+        readiness, "STARTUP_METRICS_FILE", app_dir / "metrics" / "engine_startup.jsonl"
+    )
+    monkeypatch.setattr(jobs, "LAST_JOB_FILE", app_dir / "jobs" / "last_job.json")
+    monkeypatch.setattr(uploads, "UPLOADS_DIR", app_dir / "uploads")
+    monkeypatch.setattr(pulls, "PULL_RECORD_FILE", app_dir / "pulls.json")
+    monkeypatch.setattr(leases, "LOCK_FILE", app_dir / "engine.lock")
+    monkeypatch.setattr(leases, "LEASES_FILE", app_dir / "leases.json")
+    monkeypatch.setattr(proxy, "PROXIES_DIR", app_dir / "proxies")
@@ -0,0 +1,470 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+from itertools import count
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from threading import Condition, Lock, Semaphore, Thread
+from time import perf_counter, sleep
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from starpack.compression import AVAILABLE_CODECS, decompress
+from starpack.manifest import MANIFEST_NAME
+from starpack.store import StoreIndex, blob_path
+
+
+class LocalJob:
+    """
+    A simulated package job that runs each step of the payload in turn, producing the events of the job protocol
+    """
+
+    def __init__(self, job_id: str, payload: Dict[str, Any]) -> None:
+        self.job_id = job_id
+        self.payload = payload
+        self.events: List[Dict[str, Any]] = []
+        self.finished = False
+        self.condition = Condition()
+
+    def emit(self, **event: Any) -> None:
+        with self.condition:
+            event["offset"] = len(self.events)
+            self.events.append(event)
+            if event["type"] == "result":
+                self.finished = True
+            self.condition.notify_all()
+
+    def run(
+        self,
+        step_seconds: float,
+        fail_step: Optional[str],
+        on_success: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        steps = self.payload.get("package", {}).get("steps") or []
+        for step in steps:
+            name = step.get("name", "unknown")
+            start = perf_counter()
+            self.emit(type="step", step=name, status="started")
+            self.emit(type="log", step=name, message=f"Running {name}")
+            sleep(step_seconds)
+
+            if name == fail_step:
+                self.emit(
+                    type="step",
+                    step=name,
+                    status="failed",
+                    duration=perf_counter() - start,
+                )
+                self.emit(type="result", status="failed", detail=f"{name} failed")
+                return
+
+            self.emit(
+                type="step",
+                step=name,
+                status="succeeded",
+                duration=perf_counter() - start,
+            )
+
+        if on_success:
+            on_success(self.payload)
+        self.emit(type="result", status="succeeded")
+
+    def events_from(self, offset: int, timeout: float = 30) -> List[Dict[str, Any]]:
+        """
+        Waits for events after `offset`, returning nothing once the job has finished and every event was sent
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: len(self.events) > offset or self.finished, timeout=timeout
+            )
+            return self.events[offset:]
+
+
+class LocalEngine:
+    """
+    In-process stand-in for the Starpack Engine's HTTP API, for testing clients offline. It answers `/healthcheck`,
+    `/package`, and `/deploy`, and implements the package job protocol (see `starpack.jobs`), simulating each
+    package step with a configurable duration, and every request is answered after `latency` seconds. Use it as a
+    context manager, pointing a client at `url`.
+
+    It also implements the HTTP upload protocol (see `starpack.uploads`), keeping the artifact store in a temporary
+    `artifacts_dir` laid out like the engine's artifacts volume, and accepting compressed data with the given `codecs`.
+
+    `max_jobs` limits how many package jobs run at a time, queueing the others as an engine whose builds compete for
+    the same machine would. `fail_step` makes the named step fail, and `drop_events_after` closes each event stream
+    after that many events to exercise reattaching. `fail_chunks_after` makes every chunk after that many fail, as
+    if the connection died mid-upload, and the first `corrupt_chunks` chunks are rejected as if they were corrupted
+    on the way. Received requests are kept in `requests` as (method, path, JSON body) tuples.
+    """
+
+    def __init__(
+        self,
+        step_seconds: float = 0.0,
+        latency: float = 0.0,
+        fail_step: Optional[str] = None,
+        drop_events_after: Optional[int] = None,
+        jobs: bool = True,
+        uploads: bool = True,
+        fail_chunks_after: Optional[int] = None,
+        corrupt_chunks: int = 0,
+        codecs: Optional[List[str]] = None,
+        max_jobs: Optional[int] = None,
+    ) -> None:
+        self.step_seconds = step_seconds
+        self.latency = latency
+        self.fail_step = fail_step
+        self.drop_events_after = drop_events_after
+        self.jobs_enabled = jobs
+        self.jobs: Dict[str, LocalJob] = {}
+        self.requests: List[Any] = []
+        self._job_ids = count(1)
+        self._job_slots = Semaphore(max_jobs) if max_jobs else None
+        self.built_images: List[Dict[str, Any]] = []
+        self.on_build: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.deployments: List[Dict[str, Any]] = []
+        self.on_deploy: Optional[Callable[[Dict[str, Any]], Dict[str, str]]] = None
+
+        self.uploads_enabled = uploads
+        self.fail_chunks_after = fail_chunks_after
+        self.corrupt_chunks = corrupt_chunks
+        self.codecs = AVAILABLE_CODECS if codecs is None else codecs
+        self.bytes_received = 0
+        self.chunks_received = 0
+        self.store = StoreIndex()
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.artifacts_dir = Path(tempfile.mkdtemp(prefix="starpack-engine-"))
+        self._upload_ids = count(1)
+        self._store_lock = Lock()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _handler_for(self))
+        self.server.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "LocalEngine":
+        self._thread = Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.artifacts_dir, ignore_errors=True)
+
+    def __enter__(self) -> "LocalEngine":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def submit_job(self, payload: Dict[str, Any]) -> LocalJob:
+        job = LocalJob(f"job-{next(self._job_ids)}", payload)
+        self.jobs[job.job_id] = job
+        Thread(target=self._run_job, args=(job,), daemon=True).start()
+        return job
+
+    def _run_job(self, job: LocalJob) -> None:
+        if self._job_slots is None:
+            job.run(self.step_seconds, self.fail_step, self.build_image)
+            return
+
+        with self._job_slots:
+            job.run(self.step_seconds, self.fail_step, self.build_image)
+
+    def build_image(self, payload: Dict[str, Any]) -> None:
+        """
+        Records a successful package, passing it on to `on_build`, which a `FakeDockerClient` uses to add the image
+        """
+        self.built_images.append(payload)
+        if self.on_build:
+            self.on_build(payload)
+
+    def deploy(self, payload: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Records a deployment, passing it on to `on_deploy`, which a `FakeDockerClient` uses to run its containers,
+        and returns the endpoint of each wrapper
+        """
+        self.deployments.append(payload)
+        if self.on_deploy:
+            return self.on_deploy(payload)
+        return {}
+
+    def start_upload(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Starts a chunked upload, or resumes the given one if it is for the same file
+        """
+        with self._store_lock:
+            upload = self.uploads.get(request.get("upload_id") or "")
+            if upload is None or upload["sha256"] != request["sha256"]:
+                upload_id = f"upload-{next(self._upload_ids)}"
+                upload = {
+                    "upload_id": upload_id,
+                    "sha256": request["sha256"],
+                    "size": request["size"],
+                    "chunk_size": request["chunk_size"],
+                    "received": set(),
+                }
+                (self.artifacts_dir / ".uploads" / upload_id).mkdir(parents=True)
+                self.uploads[upload_id] = upload
+
+            return upload
+
+    def receive_chunk(self, upload_id: str, index: int, data: bytes) -> None:
+        self.uploads[upload_id]["received"].add(index)
+        (self.artifacts_dir / ".uploads" / upload_id / str(index)).write_bytes(data)
+
+    def complete_upload(self, upload_id: str) -> List[int]:
+        """
+        Assembles an upload's chunks into a blob, returning the missing chunks if there are any
+        """
+        upload = self.uploads[upload_id]
+        chunk_count = max(1, -(-upload["size"] // upload["chunk_size"]))
+        missing = sorted(set(range(chunk_count)) - upload["received"])
+        if missing:
+            return missing
+
+        chunk_dir = self.artifacts_dir / ".uploads" / upload_id
+        data = b"".join(
+            (chunk_dir / str(index)).read_bytes() for index in range(chunk_count)
+        )
+        if hashlib.sha256(data).hexdigest() != upload["sha256"]:
+            upload["received"].clear()
+            return list(range(chunk_count))
+
+        self.store_blob(upload["sha256"], data)
+        shutil.rmtree(chunk_dir)
+        del self.uploads[upload_id]
+        return []
+
+    def store_blob(self, sha256: str, data: bytes) -> None:
+        path = self.artifacts_dir / blob_path(sha256)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def link_project(self, name: str, manifest: Dict[str, Any]) -> List[str]:
+        """
+        Points a project's files at their blobs, returning the blobs that are missing
+        """
+        missing = sorted(
+            {
+                entry["sha256"]
+                for entry in manifest.values()
+                if not (self.artifacts_dir / blob_path(entry["sha256"])).exists()
+            }
+        )
+        if missing:
+            return missing
+
+        project_dir = self.artifacts_dir / name
+        for relative_path, entry in manifest.items():
+            path = project_dir / relative_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                path.unlink()
+            os.link(self.artifacts_dir / blob_path(entry["sha256"]), path)
+
+        for root, _, files in os.walk(project_dir):
+            for filename in files:
+                relative_path = (Path(root) / filename).relative_to(project_dir)
+                if relative_path.as_posix() not in manifest:
+                    (Path(root) / filename).unlink()
+
+        (project_dir / MANIFEST_NAME).write_text(json.dumps(manifest, sort_keys=True))
+        with self._store_lock:
+            self.store.record_project(name, manifest)
+        return []
+
+
+def _handler_for(engine: LocalEngine):
+    class LocalEngineHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, so don't let Nagle's algorithm hold back the body
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args: Any) -> None:
+            # Keep test output quiet
+            pass
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            engine.requests.append(("GET", url.path, None))
+            sleep(engine.latency)
+            parts = url.path.strip("/").split("/")
+
+            if url.path == "/healthcheck":
+                self._send_json(200, {"healthy": "true"})
+            elif url.path == "/artifacts/index" and engine.uploads_enabled:
+                self._send_json(
+                    200,
+                    json.loads(engine.store.dumps()),
+                    headers={"Accept-Encoding": ", ".join(engine.codecs)},
+                )
+            elif (
+                len(parts) == 3
+                and parts[0] == "artifacts"
+                and parts[2] == "manifest"
+                and (engine.artifacts_dir / parts[1] / MANIFEST_NAME).exists()
+            ):
+                manifest = (engine.artifacts_dir / parts[1] / MANIFEST_NAME).read_text()
+                self._send_json(200, json.loads(manifest))
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+                offset = int(parse_qs(url.query).get("offset", ["0"])[0])
+                self._stream_events(parts[1], offset)
+            elif len(parts) == 2 and parts[0] == "jobs" and parts[1] in engine.jobs:
+                job = engine.jobs[parts[1]]
+                self._send_json(200, {"job_id": job.job_id, "finished": job.finished})
+            else:
+                self._send_json(404, {"detail": "Not Found"})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"null")
+            engine.requests.append(("POST", self.path, payload))
+            sleep(engine.latency)
+            parts = self.path.strip("/").split("/")
+
+            if self.path == "/package":
+                sleep(engine.step_seconds * len(payload["package"].get("steps") or []))
+                engine.build_image(payload)
+                self._send_json(200, {})
+            elif self.path == "/deploy":
+                self._send_json(200, {"endpoints": engine.deploy(payload)})
+            elif self.path == "/jobs/package" and engine.jobs_enabled:
+                job = engine.submit_job(payload)
+                self._send_json(202, {"job_id": job.job_id})
+            elif self.path == "/uploads" and engine.uploads_enabled:
+                upload = engine.start_upload(payload)
+                self._send_json(
+                    201,
+                    {
+                        "upload_id": upload["upload_id"],
+                        "received": sorted(upload["received"]),
+                    },
+                )
+            elif (
+                len(parts) == 3
+                and parts[0] == "uploads"
+                and parts[2] == "complete"
+                and parts[1] in engine.uploads
+            ):
+                missing = engine.complete_upload(parts[1])
+                if missing:
+                    self._send_json(409, {"missing": missing})
+                else:
+                    self._send_json(200, {})
+            elif len(parts) == 2 and parts[0] == "artifacts" and engine.uploads_enabled:
+                missing = engine.link_project(parts[1], payload["manifest"])
+                if missing:
+                    self._send_json(409, {"missing": missing})
+                else:
+                    self._send_json(200, {})
+            else:
+                self._send_json(404, {"detail": "Not Found"})
+
+        def do_PUT(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            data = self.rfile.read(length)
+            engine.requests.append(("PUT", self.path, None))
+            engine.bytes_received += length
+            sleep(engine.latency)
+            encoding = self.headers.get("Content-Encoding")
+            if encoding and encoding not in engine.codecs:
+                self._send_json(415, {"detail": f"Unsupported encoding {encoding}"})
+                return
+            if encoding:
+                data = decompress(data, encoding)
+            parts = self.path.strip("/").split("/")
+            checksum_matches = hashlib.sha256(data).hexdigest() == self.headers.get(
+                "X-Chunk-Sha256"
+            )
+
+            if len(parts) == 2 and parts[0] == "blobs" and engine.uploads_enabled:
+                if checksum_matches and parts[1] == self.headers.get("X-Chunk-Sha256"):
+                    engine.store_blob(parts[1], data)
+                    self._send_json(201, {})
+                else:
+                    self._send_json(422, {"detail": "Checksum mismatch"})
+            elif (
+                len(parts) == 4
+                and parts[0] == "uploads"
+                and parts[2] == "chunks"
+                and parts[1] in engine.uploads
+            ):
+                engine.chunks_received += 1
+                if (
+                    engine.fail_chunks_after is not None
+                    and engine.chunks_received > engine.fail_chunks_after
+                ):
+                    self._send_json(503, {"detail": "Unavailable"})
+                elif engine.corrupt_chunks > 0 or not checksum_matches:
+                    engine.corrupt_chunks = max(0, engine.corrupt_chunks - 1)
+                    self._send_json(422, {"detail": "Checksum mismatch"})
+                else:
+                    engine.receive_chunk(parts[1], int(parts[3]), data)
+                    self._send_json(200, {})
+            else:
+                self._send_json(404, {"detail": "Not Found"})
+
+        def _send_json(
+            self, status: int, body: Any, headers: Optional[Dict[str, str]] = None
+        ) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream_events(self, job_id: str, offset: int) -> None:
+            job = engine.jobs.get(job_id)
+            if job is None:
+                self._send_json(404, {"detail": "Unknown job"})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            sent = 0
+            while True:
+                events = job.events_from(offset)
+                if not events:
+                    break
+                for event in events:
+                    if (
+                        engine.drop_events_after is not None
+                        and sent >= engine.drop_events_after
+                    ):
+                        # Simulate a dropped connection mid-stream
+                        self.close_connection = True
+                        return
+                    self._write_chunk(json.dumps(event).encode() + b"\n")
+                    sent += 1
+                    offset = event["offset"] + 1
+                    if event["type"] == "result":
+                        self._write_chunk(b"")
+                        return
+
+            self._write_chunk(b"")
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return LocalEngineHandler
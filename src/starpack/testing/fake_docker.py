@@ -0,0 +1,445 @@
+from io import BytesIO
+from itertools import count
+import posixpath
+import tarfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import docker
+
+from starpack.deploy_plan import deploy_step
+from starpack.testing.engine import LocalEngine
+
+_ids = count(1)
+
+
+class FakeVolume:
+    """
+    In-memory Docker volume holding file contents by their path inside the engine container
+    """
+
+    def __init__(self, name: str, labels: Optional[Dict[str, str]] = None) -> None:
+        self.name = name
+        self.labels = labels or {}
+        self.files: Dict[str, bytes] = {}
+        self.removed = False
+
+    def remove(self, force: bool = False) -> None:
+        self.removed = True
+        self.files.clear()
+
+
+class FakeContainer:
+    """
+    In-memory Docker container. Archives put into the container are read as a stream and extracted into `files`,
+    keyed by absolute path, which can be shared with a `FakeVolume` to emulate a mounted volume. With `keep_files`
+    off, uploaded contents are read and discarded, which keeps memory flat when measuring large uploads.
+    """
+
+    def __init__(
+        self,
+        image: str = "image",
+        name: Optional[str] = None,
+        labels: Optional[Dict[str, str]] = None,
+        ports: Optional[Dict[Any, Any]] = None,
+        status: str = "running",
+        files: Optional[Dict[str, bytes]] = None,
+        keep_files: bool = True,
+        image_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        self.id = f"fake{next(_ids):060d}"
+        self.name = name or self.id[:12]
+        self.image_name = image
+        self.image_id = image_id or f"sha256:{image}"
+        self.labels = labels or {}
+        self.status = status
+        self.files = files if files is not None else {}
+        self.keep_files = keep_files
+        self.bytes_received = 0
+        self.port_bindings = {
+            f"{container_port}/tcp": [{"HostIp": "", "HostPort": str(host_port or "")}]
+            for container_port, host_port in (ports or {}).items()
+        }
+
+    @property
+    def attrs(self) -> Dict[str, Any]:
+        return {
+            "Id": self.id,
+            "Image": self.image_id,
+            "Config": {"Image": self.image_name, "Labels": self.labels},
+            "HostConfig": {"PortBindings": self.port_bindings},
+            "NetworkSettings": {"Ports": self.port_bindings},
+            "State": {"Status": self.status, "Running": self.status == "running"},
+        }
+
+    def reload(self) -> None:
+        pass
+
+    def start(self) -> None:
+        self.status = "running"
+
+    def stop(self, timeout: int = 10) -> None:
+        self.status = "exited"
+
+    def pause(self) -> None:
+        self.status = "paused"
+
+    def unpause(self) -> None:
+        self.status = "running"
+
+    def rename(self, name: str) -> None:
+        self.name = name
+
+    def remove(self, force: bool = False, v: bool = False) -> None:
+        self.status = "removed"
+
+    def put_archive(self, path: str, data: Union[bytes, Iterable[bytes]]) -> bool:
+        reader = _ChunkReader([data] if isinstance(data, bytes) else data)
+        with tarfile.open(fileobj=reader, mode="r|*") as tar:
+            for member in tar:
+                member_path = posixpath.join(path, member.name)
+                if not self.keep_files:
+                    # Stream mode skips over the member's contents when moving on
+                    continue
+                if member.isfile():
+                    self.files[member_path] = tar.extractfile(member).read()
+                elif member.islnk():
+                    target = posixpath.join(path, member.linkname)
+                    if target not in self.files:
+                        raise docker.errors.APIError(
+                            f"Cannot link {member_path} to missing {target}"
+                        )
+                    self.files[member_path] = self.files[target]
+        self.bytes_received += reader.bytes_read
+        return True
+
+    def get_archive(self, path: str) -> Tuple[Iterator[bytes], Dict[str, Any]]:
+        if path not in self.files:
+            raise docker.errors.NotFound(f"Could not find the file {path}")
+
+        output = BytesIO()
+        with tarfile.open(fileobj=output, mode="w") as tar:
+            info = tarfile.TarInfo(posixpath.basename(path))
+            info.size = len(self.files[path])
+            tar.addfile(info, BytesIO(self.files[path]))
+
+        return iter([output.getvalue()]), {"name": posixpath.basename(path)}
+
+    def exec_run(
+        self, cmd: List[str], workdir: str = "/", **kwargs: Any
+    ) -> Tuple[int, bytes]:
+        # Only file removal is emulated
+        if cmd[:2] == ["rm", "-f"]:
+            for target in cmd[2:]:
+                if target != "--":
+                    self.files.pop(posixpath.join(workdir, target), None)
+            return 0, b""
+        return 127, b"unsupported command"
+
+
+class FakeContainers:
+    def __init__(self, client: "FakeDockerClient") -> None:
+        self.client = client
+        self.containers: Dict[str, FakeContainer] = {}
+
+    def add(self, container: FakeContainer) -> FakeContainer:
+        self.containers[container.id] = container
+        return container
+
+    def list(
+        self, all: bool = False, filters: Optional[Dict[str, Any]] = None
+    ) -> List[FakeContainer]:
+        containers = [
+            container
+            for container in self.containers.values()
+            if container.status != "removed" and (all or container.status == "running")
+        ]
+        for label in _as_list((filters or {}).get("label")):
+            key, _, value = label.partition("=")
+            containers = [
+                container
+                for container in containers
+                if key in container.labels
+                and (not value or container.labels[key] == value)
+            ]
+        for name in _as_list((filters or {}).get("name")):
+            containers = [
+                container for container in containers if name in container.name
+            ]
+        return containers
+
+    def get(self, container_id: str) -> FakeContainer:
+        for container in self.containers.values():
+            if container.status != "removed" and container_id in (
+                container.id,
+                container.name,
+            ):
+                return container
+        raise docker.errors.NotFound(f"No such container: {container_id}")
+
+    def create(self, image: str, **kwargs: Any) -> FakeContainer:
+        if kwargs.get("ports"):
+            kwargs["ports"] = {
+                container_port: (
+                    host_port
+                    if host_port is not None or not self.client.engine_ports
+                    else self.client.engine_ports.pop(0)
+                )
+                for container_port, host_port in kwargs["ports"].items()
+            }
+        local_image = self.client.images.images.get(image)
+        return self.add(
+            FakeContainer(
+                image=image,
+                status="created",
+                files=self.client.mounted_files(kwargs.get("volumes")),
+                image_id=local_image.id if local_image else None,
+                **kwargs,
+            )
+        )
+
+    def run(self, image: str, **kwargs: Any) -> FakeContainer:
+        container = self.create(image, **kwargs)
+        container.start()
+        return container
+
+    def deploy(self, payload: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Runs a container for each wrapper of the deploy step of a payload, with the labels and port it asks for,
+        and returns the endpoint of each. Wrappers with `replicas` run that many containers on ports Docker picks,
+        and their endpoint lists the URL of each.
+        """
+        step = deploy_step(payload) or {}
+        wrappers = step.get("wrapper") or []
+        endpoints: Dict[str, Any] = {}
+        for wrapper in wrappers if isinstance(wrappers, list) else [wrappers]:
+            if not isinstance(wrapper, dict):
+                wrapper = {"name": wrapper}
+            name = f"{payload['deployment']['metadata']['name']}-{wrapper['name']}"
+            replicas = int(wrapper.get("replicas") or 1)
+            if replicas > 1:
+                containers = [
+                    self.run(
+                        f"{payload['package']['metadata']['name']}:latest",
+                        name=f"{name}-{next(_ids)}",
+                        labels=wrapper.get("labels"),
+                        ports={80: None},
+                    )
+                    for _ in range(replicas)
+                ]
+                endpoints[wrapper["name"]] = [
+                    f"http://localhost:{container.port_bindings['80/tcp'][0]['HostPort']}"
+                    for container in containers
+                ]
+                continue
+
+            port = wrapper.get("port") or step.get("port")
+            self.run(
+                f"{payload['package']['metadata']['name']}:latest",
+                name=name,
+                labels=wrapper.get("labels"),
+                ports={80: port} if port else None,
+            )
+            endpoints[wrapper["name"]] = f"http://localhost:{port}"
+        return endpoints
+
+
+class FakeImage:
+    def __init__(
+        self,
+        tags: List[str],
+        labels: Optional[Dict[str, str]] = None,
+        repo_digests: Optional[List[str]] = None,
+    ) -> None:
+        self.id = f"sha256:{next(_ids):064d}"
+        self.tags = tags
+        self.labels = labels or {}
+        self.repo_digests = repo_digests or []
+
+    @property
+    def attrs(self) -> Dict[str, Any]:
+        return {
+            "Id": self.id,
+            "RepoTags": self.tags,
+            "RepoDigests": self.repo_digests,
+            "Config": {"Labels": self.labels},
+        }
+
+
+class FakeRegistryData:
+    def __init__(self, digest: str) -> None:
+        self.id = digest
+
+
+class FakeImages:
+    """
+    In-memory images, along with a stand-in for the registry they are pulled from: `registry` maps image names to the
+    digest the registry has for them, and `registry_online` off makes the registry unreachable
+    """
+
+    def __init__(self) -> None:
+        self.pulled: List[str] = []
+        self.images: Dict[str, FakeImage] = {}
+        self.registry: Dict[str, str] = {}
+        self.registry_online = True
+        self.registry_requests = 0
+
+    def pull(self, repository: str, tag: Optional[str] = None, **kwargs: Any) -> None:
+        self.pulled.append(repository)
+        if not self.registry_online:
+            raise docker.errors.APIError(
+                f"Cannot reach the registry to pull {repository}"
+            )
+
+        name = f"{repository}:{tag}" if tag else repository
+        digest = self.registry.setdefault(name, f"sha256:{next(_ids):064d}")
+        repo = name.rsplit(":", 1)[0] if ":" in name.rsplit("/", 1)[-1] else name
+        self.images[name] = FakeImage([name], repo_digests=[f"{repo}@{digest}"])
+
+    def get_registry_data(self, name: str, **kwargs: Any) -> FakeRegistryData:
+        self.registry_requests += 1
+        if not self.registry_online:
+            raise docker.errors.APIError(f"Cannot reach the registry for {name}")
+        if name not in self.registry:
+            raise docker.errors.NotFound(f"No such image in the registry: {name}")
+        return FakeRegistryData(self.registry[name])
+
+    def add(self, tag: str, labels: Optional[Dict[str, str]] = None) -> FakeImage:
+        image = FakeImage([tag], labels)
+        self.images[tag] = image
+        return image
+
+    def build(self, payload: Dict[str, Any]) -> FakeImage:
+        """
+        Adds the image the engine builds for a package payload
+        """
+        metadata = payload["package"]["metadata"]
+        return self.add(f"{metadata['name']}:latest", metadata.get("labels"))
+
+    def list(
+        self, name: Optional[str] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> List[FakeImage]:
+        images = [
+            image for image in self.images.values() if not name or name in image.tags
+        ]
+        for label in _as_list((filters or {}).get("label")):
+            key, _, value = label.partition("=")
+            images = [
+                image
+                for image in images
+                if key in image.labels and (not value or image.labels[key] == value)
+            ]
+        return images
+
+    def get(self, name: str) -> FakeImage:
+        if name not in self.images:
+            raise docker.errors.ImageNotFound(f"No such image: {name}")
+        return self.images[name]
+
+
+class FakeVolumes:
+    def __init__(self) -> None:
+        self.volumes: Dict[str, FakeVolume] = {}
+
+    def create(self, name: str, labels: Optional[Dict[str, str]] = None, **kwargs: Any):
+        return self.volumes.setdefault(name, FakeVolume(name, labels))
+
+    def get(self, name: str) -> FakeVolume:
+        if name not in self.volumes:
+            raise docker.errors.NotFound(f"No such volume: {name}")
+        return self.volumes[name]
+
+
+class FakeDockerClient:
+    """
+    In-memory stand-in for `docker.DockerClient`, covering the parts of the API that Starpack uses. Containers
+    that mount a volume share its files, so uploads through an engine container land on the volume.
+
+    Use `add_engine` to register a running engine container that publishes a `LocalEngine`'s port, and
+    `add_unrelated_containers` to populate the host with other containers. Containers created without a host port,
+    which Docker picks, are handed the ports in `engine_ports` first, so that the ports of running `LocalEngine`s
+    listed there stand in for engines started in those containers.
+    """
+
+    def __init__(self) -> None:
+        self.engine_ports: List[int] = []
+        self.containers = FakeContainers(self)
+        self.images = FakeImages()
+        self.volumes = FakeVolumes()
+
+    def mounted_files(self, volumes: Optional[Dict[str, Any]]) -> Dict[str, bytes]:
+        # Fake containers can mount a single volume, which is all the engine needs for its artifacts
+        for source in volumes or {}:
+            if source in self.volumes.volumes:
+                return self.volumes.volumes[source].files
+        return {}
+
+    def add_engine(
+        self,
+        engine: LocalEngine,
+        app_label: str = "starpack-engine",
+        volume: str = "starpack-model-artifacts",
+    ) -> FakeContainer:
+        self.volumes.create(volume)
+        engine.on_build = self.images.build
+        engine.on_deploy = self.containers.deploy
+        return self.containers.run(
+            "starpack/starpack-engine:latest",
+            name=f"starpack-engine-{engine.port}",
+            labels={"app": app_label},
+            ports={1976: engine.port},
+            volumes={volume: {"bind": "/app/engine/external/artifacts"}},
+        )
+
+    def add_unrelated_containers(self, number: int) -> None:
+        for index in range(number):
+            self.containers.run(
+                "busybox", name=f"unrelated-{index}", labels={"app": f"other-{index}"}
+            )
+
+    def events(self, *args: Any, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+        return iter([])
+
+    def close(self) -> None:
+        pass
+
+
+class _ChunkReader:
+    """
+    Read-only file object over an iterable of byte chunks
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = iter(chunks)
+        self.current = b""
+        self.position = 0
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        remaining = size
+        while remaining != 0:
+            if self.position >= len(self.current):
+                try:
+                    self.current = next(self.chunks)
+                    self.position = 0
+                except StopIteration:
+                    break
+                continue
+
+            end = len(self.current)
+            if remaining > 0:
+                end = min(end, self.position + remaining)
+                remaining -= end - self.position
+            parts.append(self.current[self.position : end])
+            self.position = end
+
+        data = b"".join(parts)
+        self.bytes_read += len(data)
+        return data
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
@@ -0,0 +1,199 @@
+from itertools import takewhile
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+class CommandBudget(NamedTuple):
+    """
+    Import-time budget for a CLI command: a ceiling on the total time spent importing modules, and modules that
+    the command should never import
+    """
+
+    args: Tuple[str, ...]
+    max_import_ms: float
+    forbidden_modules: Tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        """
+        The command, without the paths and URLs it is given
+        """
+        return " ".join(
+            takewhile(lambda arg: "{" not in arg and "/" not in arg, self.args)
+        )
+
+
+HEAVY_MODULES = ("docker", "requests", "pydantic", "yaml", "starpack.client")
+# Modules only scoring files and load testing deployments need
+PREDICTION_MODULES = ("pyarrow", "starpack.bench", "starpack.prediction")
+
+# Commands are run with Docker at an address where nothing listens, so that the commands that need the engine stop
+# where they would reach it, once everything they import is imported. Commands that predict are pointed at a model
+# there too.
+UNREACHABLE_DOCKER_HOST = "tcp://127.0.0.1:9"
+UNREACHABLE_MODEL_URL = "http://127.0.0.1:9/models/predict/model"
+# The scratch directory holds this table, as `rows.csv`, for commands that read one
+SCRATCH_ROWS = "age,chol\n62,209\n"
+
+# `{directory}` is replaced with a scratch directory when the command is run
+COMMAND_BUDGETS: List[CommandBudget] = [
+    CommandBudget(("--version",), 250, HEAVY_MODULES),
+    CommandBudget(("--help",), 400, HEAVY_MODULES),
+    CommandBudget(("init", "{directory}", "--overwrite"), 300, HEAVY_MODULES),
+    CommandBudget(("package", "{directory}"), 750, PREDICTION_MODULES),
+    CommandBudget(("deploy", "{directory}"), 750, PREDICTION_MODULES),
+    CommandBudget(("upload", "{directory}"), 750, PREDICTION_MODULES),
+    CommandBudget(("engine", "status"), 750, PREDICTION_MODULES),
+    CommandBudget(("engine", "start"), 750, PREDICTION_MODULES),
+    # Scoring a CSV file as CSV needs neither pyarrow nor the single-row client
+    CommandBudget(
+        (
+            "predict",
+            UNREACHABLE_MODEL_URL,
+            "{directory}/rows.csv",
+            "--output",
+            "{directory}/predictions.csv",
+            "--retries",
+            "0",
+            "--wire-format",
+            "csv",
+        ),
+        750,
+        PREDICTION_MODULES,
+    ),
+    CommandBudget(
+        (
+            "bench",
+            UNREACHABLE_MODEL_URL,
+            "--data",
+            "{directory}/rows.csv",
+            "--output",
+            "{directory}/bench.json",
+        ),
+        750,
+        ("pyarrow",),
+    ),
+]
+
+
+class ImportProfile(NamedTuple):
+    """
+    Modules imported by a command, with their cumulative import time in microseconds
+    """
+
+    modules: Dict[str, int]
+    total_us: int
+
+    @property
+    def total_ms(self) -> float:
+        return self.total_us / 1000
+
+
+def parse_importtime(output: str) -> ImportProfile:
+    """
+    Parses the output of `python -X importtime`, adding up the top-level imports for the total
+    """
+    modules: Dict[str, int] = {}
+    total = 0
+    for line in output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        modules[module] = int(cumulative)
+        if len(indent) == 1:
+            total += int(cumulative)
+
+    return ImportProfile(modules, total)
+
+
+def starpack_command(
+    args: Sequence[str], directory: Optional[Path] = None
+) -> Tuple[List[str], Dict[str, str]]:
+    """
+    The command line and environment running a Starpack CLI command in a fresh interpreter, preparing the scratch
+    `directory` for it
+    """
+    command_args = [
+        arg.format(directory=directory) if directory else arg for arg in args
+    ]
+    if directory:
+        (directory / "rows.csv").write_text(SCRATCH_ROWS)
+    # Run this copy of Starpack, even when it isn't installed
+    source_dir = str(Path(__file__).resolve().parents[2])
+    python_path = os.environ.get("PYTHONPATH")
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [source_dir, python_path])),
+        "DOCKER_HOST": UNREACHABLE_DOCKER_HOST,
+    }
+
+    return [sys.executable, "-m", "starpack", *command_args], env
+
+
+def profile_command(
+    args: Sequence[str], directory: Optional[Path] = None
+) -> ImportProfile:
+    """
+    Runs a Starpack CLI command in a fresh interpreter under `-X importtime` and profiles its imports. Commands may
+    fail once they reach Docker or a model, but not with a traceback.
+    """
+    command, env = starpack_command(args, directory)
+    command[1:1] = ["-X", "importtime"]
+    result = subprocess.run(
+        command,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if "Traceback" in result.stdout + result.stderr:
+        raise subprocess.CalledProcessError(
+            result.returncode, command, result.stdout, result.stderr
+        )
+
+    return parse_importtime(result.stderr)
+
+
+def check_budget(
+    budget: CommandBudget, profile: ImportProfile, check_time: bool = True
+) -> List[str]:
+    """
+    Returns a description of each way a command's import profile goes over its budget, leaving out its import time
+    unless `check_time`, as times depend on the machine
+    """
+    problems = [
+        f"imports {module}"
+        for module in budget.forbidden_modules
+        if module in profile.modules
+    ]
+    if check_time and profile.total_ms > budget.max_import_ms:
+        problems.append(
+            f"spends {profile.total_ms:.0f}ms importing (budget {budget.max_import_ms:.0f}ms)"
+        )
+
+    return problems
+
+
+if __name__ == "__main__":
+    from tempfile import TemporaryDirectory
+
+    failed = False
+    with TemporaryDirectory() as temp_dir:
+        for budget in COMMAND_BUDGETS:
+            profile = profile_command(budget.args, Path(temp_dir))
+            problems = check_budget(budget, profile)
+            failed = failed or bool(problems)
+            status = "; ".join(problems) if problems else "ok"
+            print(
+                f"starpack {budget.name:<15} {profile.total_ms:>8.1f}ms "
+                f"/ {budget.max_import_ms:.0f}ms  {status}"
+            )
+
+    sys.exit(1 if failed else 0)
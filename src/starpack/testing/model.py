@@ -0,0 +1,202 @@
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+from threading import Lock, Thread
+from time import sleep
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from starpack.tabular import decode_table, encode_table
+from starpack.wire import (
+    CSV_TYPE,
+    JSON_TYPE,
+    WIRE_FORMATS,
+    negotiate_media_type,
+    parse_value,
+)
+
+
+def sum_of_values(record: Dict[str, str]) -> Any:
+    """
+    Default model of `LocalModel`: the sum of the numeric values of a row
+    """
+    values = [parse_value(value) for value in record.values()]
+    return sum(value for value in values if isinstance(value, (int, float)))
+
+
+class LocalModel:
+    """
+    In-process stand-in for a deployed wrapper's prediction API, for testing prediction clients offline. It answers
+    `/models/predict/<name>` with the uploaded table and a `prediction` column computed by `predict` for each row,
+    after `latency` seconds plus up to `jitter` more, so that concurrent requests finish out of order. The first
+    `fail_requests` predictions are answered with a 503, as a deployment that is restarting would. Tables are read and
+    answered in the media types of `formats`, negotiated as wrappers do; an upload in any other format gets a 415.
+    Lists of JSON records are answered at `/models/predict/<name>/record` unless `records` is False, as for older
+    wrappers. Use it as a context manager, pointing a client at `url`.
+    """
+
+    def __init__(
+        self,
+        name: str = "model",
+        predict: Callable[[Dict[str, str]], Any] = sum_of_values,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        fail_requests: int = 0,
+        formats: Iterable[str] = WIRE_FORMATS.values(),
+        records: bool = True,
+    ) -> None:
+        self.name = name
+        self.formats = list(formats)
+        self.records = records
+        self.predict = predict
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_requests = fail_requests
+        self.requests = 0
+        self.rows = 0
+        # Media types of the tables each request sent and asked for
+        self.media_types: List[Tuple[str, str]] = []
+        # Rows in each request for JSON records
+        self.record_batches: List[int] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = Lock()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _handler_for(self))
+        self.server.daemon_threads = True
+        self._thread: Optional[Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def predict_url(self) -> str:
+        return f"{self.url}/models/predict/{self.name}"
+
+    def start(self) -> "LocalModel":
+        self._thread = Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "LocalModel":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def score_records(self, records: List[Dict[str, Any]]) -> bytes:
+        predictions = [
+            {**record, "prediction": self.predict(record)} for record in records
+        ]
+        with self._lock:
+            self.rows += len(records)
+            self.record_batches.append(len(records))
+        return json.dumps(predictions).encode()
+
+    def score(
+        self, columns: List[str], rows: List[List[Any]], media_type: str = CSV_TYPE
+    ) -> bytes:
+        predictions = [self.predict(dict(zip(columns, row))) for row in rows]
+        with self._lock:
+            self.rows += len(rows)
+        return encode_table(
+            [*columns, "prediction"],
+            [[*row, prediction] for row, prediction in zip(rows, predictions)],
+            media_type,
+        )
+
+
+def _uploaded_file(content_type: str, body: bytes) -> Optional[Tuple[bytes, str]]:
+    """
+    Contents and content type of the file in a multipart form upload
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    for part in message.iter_parts():
+        if part.get_filename():
+            return part.get_payload(decode=True), part.get_content_type()
+    return None
+
+
+def _handler_for(model: LocalModel):
+    class LocalModelHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            self._send(200, b"{}", "application/json")
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            endpoints = [f"/models/predict/{model.name}"]
+            if model.records:
+                endpoints.append(f"/models/predict/{model.name}/record")
+            if self.path not in endpoints:
+                self._send(404, b'{"detail": "Not Found"}', "application/json")
+                return
+
+            with model._lock:
+                model.requests += 1
+                failing = model.fail_requests > 0
+                model.fail_requests = max(0, model.fail_requests - 1)
+                model.in_flight += 1
+                model.max_in_flight = max(model.max_in_flight, model.in_flight)
+            try:
+                sleep(model.latency + random.uniform(0, model.jitter))
+                if failing:
+                    self._send(503, b'{"detail": "Unavailable"}', "application/json")
+                    return
+
+                if self.path.endswith("/record"):
+                    self._send(200, model.score_records(json.loads(body)), JSON_TYPE)
+                    return
+
+                upload = _uploaded_file(self.headers.get("Content-Type", ""), body)
+                if upload is None:
+                    self._send(422, b'{"detail": "No file"}', "application/json")
+                    return
+                data, media_type = upload
+                # Uploads labelled with another type, like the spreadsheet type browsers give CSV files, are CSV
+                if media_type not in WIRE_FORMATS.values():
+                    media_type = CSV_TYPE
+                if media_type not in model.formats:
+                    self._send(415, b'{"detail": "Unsupported"}', "application/json")
+                    return
+                answer_type = negotiate_media_type(
+                    self.headers.get("Accept", ""), model.formats
+                )
+                with model._lock:
+                    model.media_types.append((media_type, answer_type))
+                columns, rows = decode_table(data, media_type)
+                self._send(200, model.score(columns, rows, answer_type), answer_type)
+            finally:
+                with model._lock:
+                    model.in_flight -= 1
+
+        def _send(self, status: int, data: bytes, content_type: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return LocalModelHandler
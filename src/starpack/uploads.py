@@ -0,0 +1,296 @@
+import hashlib
+import json
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import requests
+from rich import print
+
+from starpack._config import APP_DIR
+from starpack.compression import CompressionStats, choose_codec
+from starpack.errors import UploadFailedError
+
+# Upload protocol for engines that accept artifacts over HTTP, which works for remote engines as well as local ones.
+# Files are kept in the engine's content-addressed artifact store (see `starpack.store`):
+#   GET  /artifacts/index                          -> the store index
+#   GET  /artifacts/{project}/manifest             -> the project's manifest, 404 if it was never uploaded
+#   PUT  /blobs/{sha256}                           -> stores a small file in a single request
+#   POST /uploads {"sha256", "size", "chunk_size"} -> {"upload_id": "...", "received": [chunk indices]}
+#   PUT  /uploads/{upload_id}/chunks/{index}       -> stores a chunk, checked against its X-Chunk-Sha256 header (422
+#                                                     when it doesn't match)
+#   POST /uploads/{upload_id}/complete             -> assembles the chunks into a blob once its SHA256 checks out,
+#                                                     409 {"missing": [chunk indices]} if some chunks never arrived
+#   POST /artifacts/{project} {"manifest": {...}}  -> links the project's files to their blobs, removes the files that
+#                                                     are no longer listed, and records the project in the index
+# Sending the `upload_id` of an interrupted upload along with POST /uploads resumes it: the engine lists the chunks
+# it already has, and only the others are sent again. Engines that accept compressed files and chunks list the codecs
+# in the `Accept-Encoding` header of GET /artifacts/index; each PUT body can then be compressed with one of them, given
+# in its `Content-Encoding` header, while its X-Chunk-Sha256 remains the checksum of the uncompressed data.
+UPLOADS_DIR = APP_DIR / "uploads"
+CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_CONCURRENCY = 4
+MAX_CHUNK_ATTEMPTS = 3
+
+
+class BlobUpload(NamedTuple):
+    """
+    A file to store on the engine under its SHA256 digest
+    """
+
+    sha256: str
+    size: int
+    path: Path
+
+
+class TransferError(Exception):
+    """
+    A file could not be sent to the engine, even after trying again
+    """
+
+    def __init__(self, path: Path, reason: str) -> None:
+        super().__init__(f"{path}: {reason}")
+        self.path = path
+        self.reason = reason
+
+
+class ChunkedUploader:
+    """
+    Sends files to the engine's artifact store over HTTP. Files larger than a chunk are split into fixed-size chunks
+    that are sent in parallel, each with its own checksum, and retried on failure. The chunks the engine acknowledged
+    are recorded in a resume manifest under the Starpack configuration folder, so an interrupted upload picks up from
+    where it stopped on the next try. Once done, `bytes_sent`, `elapsed`, and `throughput` describe the transfer.
+
+    Given the `codecs` the engine accepts, each file is compressed with the first of them unless it looks
+    incompressible (see `starpack.compression`), in the upload threads. `compression` tallies what that saved.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        url: str,
+        timeouts: Tuple[float, Optional[float]],
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        codecs: Sequence[str] = (),
+    ) -> None:
+        self.session = session
+        self.url = url
+        self.timeouts = timeouts
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.concurrency = concurrency or UPLOAD_CONCURRENCY
+        self.codecs = list(codecs)
+        self.compression = CompressionStats()
+        self.bytes_sent = 0
+        self.elapsed = 0.0
+        self._lock = Lock()
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes per second sent to the engine
+        """
+        return self.bytes_sent / self.elapsed if self.elapsed else 0.0
+
+    def upload(self, blobs: List[BlobUpload]) -> None:
+        """
+        Stores every file on the engine, small files several at a time, then each large file with its chunks sent in
+        parallel
+        """
+        start = perf_counter()
+        small = [blob for blob in blobs if blob.size <= self.chunk_size]
+        large = [blob for blob in blobs if blob.size > self.chunk_size]
+
+        try:
+            self._upload(small, large)
+        except TransferError as error:
+            raise UploadFailedError(error.path, error.reason)
+        finally:
+            self.elapsed = perf_counter() - start
+
+    def _upload(self, small: List[BlobUpload], large: List[BlobUpload]) -> None:
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="starpack-upload"
+        ) as executor:
+            for future in as_completed(
+                [executor.submit(self._put_blob, blob) for blob in small]
+            ):
+                future.result()
+            for blob in large:
+                self._upload_chunked(blob, executor)
+
+    def _put_blob(self, blob: BlobUpload) -> None:
+        codec = self._choose_codec(blob)
+        data = blob.path.read_bytes()
+        self._send(
+            f"{self.url}/blobs/{blob.sha256}", data, blob.sha256, blob.path, codec
+        )
+
+    def _choose_codec(self, blob: BlobUpload) -> Optional[str]:
+        codec = choose_codec(blob.path, blob.size, self.codecs)
+        if codec:
+            self.compression.count_file(codec)
+        return codec
+
+    def _upload_chunked(self, blob: BlobUpload, executor: ThreadPoolExecutor) -> None:
+        record_path = resume_record_path(self.url, blob.sha256)
+        record = load_resume_record(record_path)
+        chunk_size = record.get("chunk_size", self.chunk_size)
+
+        response = self.session.post(
+            f"{self.url}/uploads",
+            json={
+                "sha256": blob.sha256,
+                "size": blob.size,
+                "chunk_size": chunk_size,
+                "upload_id": record.get("upload_id"),
+            },
+            timeout=self.timeouts,
+        )
+        response.raise_for_status()
+        session = response.json()
+        upload_id = session["upload_id"]
+        received = set(session.get("received") or [])
+        if received:
+            print(
+                f"Resuming the upload of {blob.path} ({len(received)} chunks sent before)"
+            )
+
+        codec = self._choose_codec(blob)
+        chunk_count = max(1, -(-blob.size // chunk_size))
+        for _ in range(MAX_CHUNK_ATTEMPTS):
+            missing = [index for index in range(chunk_count) if index not in received]
+            futures: Dict["Future[None]", int] = {
+                executor.submit(
+                    self._send_chunk, upload_id, blob, index, chunk_size, codec
+                ): index
+                for index in missing
+            }
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    received.add(futures[future])
+                    save_resume_record(
+                        record_path,
+                        {
+                            "upload_id": upload_id,
+                            "chunk_size": chunk_size,
+                            "received": sorted(received),
+                        },
+                    )
+            finally:
+                for future in futures:
+                    future.cancel()
+
+            response = self.session.post(
+                f"{self.url}/uploads/{upload_id}/complete", timeout=self.timeouts
+            )
+            if response.status_code == 409:
+                # The engine lost some chunks, so send them again
+                received -= set(response.json().get("missing") or [])
+                continue
+            if response.status_code // 100 != 2:
+                raise TransferError(blob.path, response.text)
+
+            clear_resume_record(record_path)
+            return
+
+        raise TransferError(blob.path, "the engine kept missing chunks")
+
+    def _send_chunk(
+        self,
+        upload_id: str,
+        blob: BlobUpload,
+        index: int,
+        chunk_size: int,
+        codec: Optional[str],
+    ) -> None:
+        with open(blob.path, "rb") as file_data:
+            file_data.seek(index * chunk_size)
+            data = file_data.read(chunk_size)
+
+        self._send(
+            f"{self.url}/uploads/{upload_id}/chunks/{index}",
+            data,
+            hashlib.sha256(data).hexdigest(),
+            blob.path,
+            codec,
+        )
+
+    def _send(
+        self, url: str, data: bytes, sha256: str, path: Path, codec: Optional[str]
+    ) -> None:
+        """
+        PUTs data along with its checksum, compressed with `codec` if given, trying again when it gets lost or
+        corrupted on the way
+        """
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "X-Chunk-Sha256": sha256,
+        }
+        if codec:
+            compressed = self.compression.compress(data, codec)
+            if compressed is not data:
+                data = compressed
+                headers["Content-Encoding"] = codec
+
+        reason = ""
+        for _ in range(MAX_CHUNK_ATTEMPTS):
+            try:
+                response = self.session.put(
+                    url,
+                    data=data,
+                    headers=headers,
+                    timeout=self.timeouts,
+                )
+            except (requests.ConnectionError, requests.Timeout) as error:
+                reason = str(error)
+                continue
+
+            if response.status_code // 100 == 2:
+                with self._lock:
+                    self.bytes_sent += len(data)
+                return
+            reason = f"{response.status_code} {response.text}"
+            if response.status_code != 422 and response.status_code < 500:
+                break
+
+        raise TransferError(path, reason)
+
+
+def resume_record_path(url: str, sha256: str) -> Path:
+    """
+    Location of the resume manifest for uploading a file to a given engine
+    """
+    key = hashlib.sha1(f"{url}/{sha256}".encode()).hexdigest()
+    return UPLOADS_DIR / f"{key}.json"
+
+
+def load_resume_record(record_path: Path) -> Dict[str, Any]:
+    """
+    Loads the progress of an interrupted upload, if there is one
+    """
+    try:
+        return json.loads(record_path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def save_resume_record(record_path: Path, record: Dict[str, Any]) -> None:
+    """
+    Saves the progress of an upload
+    """
+    record_path.parent.mkdir(parents=True, exist_ok=True)
+    record_path.write_text(json.dumps(record))
+
+
+def clear_resume_record(record_path: Path) -> None:
+    """
+    Forgets the progress of a finished upload
+    """
+    try:
+        record_path.unlink()
+    except FileNotFoundError:
+        pass
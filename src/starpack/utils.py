@@ -1,7 +1,13 @@
-from typing import Any, Dict
+from glob import glob
+import os
+import subprocess
+import sys
+from typing import Any, Dict, Iterable, List
 from yaml import load, Loader
 from pathlib import Path
 
+from starpack.errors import InvalidPayloadError
+
 
 def load_yaml(yaml_path: Path) -> Dict[str, Any]:
     """
@@ -11,3 +17,70 @@ def load_yaml(yaml_path: Path) -> Dict[str, Any]:
         output_dict = load(yaml_file, Loader)
 
     return output_dict
+
+
+def validate_payload(
+    payload: Any, yaml_path: Path, sections: Iterable[str] = ("package",)
+) -> None:
+    """
+    Checks that a loaded Starpack YAML has the given sections, each with a named metadata block
+    """
+    if not isinstance(payload, dict):
+        raise InvalidPayloadError(yaml_path, "expected a mapping at the top level")
+
+    for section in sections:
+        section_data = payload.get(section)
+        if not isinstance(section_data, dict):
+            raise InvalidPayloadError(yaml_path, f"missing the `{section}` section")
+
+        metadata = section_data.get("metadata")
+        if not isinstance(metadata, dict) or not metadata.get("name"):
+            raise InvalidPayloadError(
+                yaml_path, f"`{section}.metadata.name` is required"
+            )
+
+
+def is_glob(path: Path) -> bool:
+    """
+    Whether a path contains glob pattern characters
+    """
+    return any(char in str(path) for char in "*?[")
+
+
+def expand_paths(paths: Iterable[Path]) -> List[Path]:
+    """
+    Expands any glob patterns among the given paths into the matching directories, dropping duplicates but
+    keeping the given order
+    """
+    expanded: List[Path] = []
+    for path in paths:
+        if path.exists() or not is_glob(path):
+            matches = [path]
+        else:
+            matches = [Path(match) for match in sorted(glob(str(path)))]
+            matches = [match for match in matches if match.is_dir()]
+
+        for match in matches:
+            if match not in expanded:
+                expanded.append(match)
+
+    return expanded
+
+
+def run_detached(*args: str) -> None:
+    """
+    Runs a Starpack command in a separate process that outlives this one, for work the current command shouldn't wait
+    on. Its output is discarded.
+    """
+    options: Dict[str, Any] = {
+        "stdin": subprocess.DEVNULL,
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+        "close_fds": True,
+    }
+    if os.name == "nt":
+        options["creationflags"] = subprocess.DETACHED_PROCESS
+    else:
+        options["start_new_session"] = True
+
+    subprocess.Popen([sys.executable, "-m", "starpack", *args], **options)
@@ -0,0 +1,102 @@
+import csv
+import io
+import re
+from typing import Any, Dict, List, Tuple
+
+# How deployed wrappers are called, shared by the CLI and by the clients that run next to a deployment, like its Gradio
+# interface. Only the standard library is imported here, so that `starpack.prediction` can be used without the
+# dependencies of the CLI.
+
+# Deployed wrappers answer predictions at `/models/predict/<package name>`, taking a table as the `file` upload of a
+# form and answering with the table of predictions, one row per input row, in the same order. The upload's content
+# type says the format of the table: CSV, or for wrappers that support them, JSON, an Arrow IPC stream, or Parquet,
+# which keep the types of the columns. The `Accept` header of the request lists the formats the predictions can come
+# back in, and the wrapper answers in the first of them it supports, or in CSV. A wrapper answers a table in a format
+# it can't read with 415; older wrappers read every upload as CSV and fail with another client error.
+PREDICT_PATH = "/models/predict/{model}"
+CONNECT_TIMEOUT = 10
+
+# Media types of the tables sent to and received from deployed wrappers. JSON tables are sent as `columns` and `data`
+# rows, the "split" orientation of pandas.
+CSV_TYPE = "text/csv"
+JSON_TYPE = "application/json"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_TYPE = "application/vnd.apache.parquet"
+WIRE_FORMATS = {
+    "csv": CSV_TYPE,
+    "json": JSON_TYPE,
+    "arrow": ARROW_TYPE,
+    "parquet": PARQUET_TYPE,
+}
+WIRE_EXTENSIONS = {
+    CSV_TYPE: ".csv",
+    JSON_TYPE: ".json",
+    ARROW_TYPE: ".arrows",
+    PARQUET_TYPE: ".parquet",
+}
+# Text read back as a number: plain decimal numbers, without the underscores, padding, or leading zeros that Python
+# would accept, so that codes like "007" stay text
+INTEGER_PATTERN = re.compile(r"[+-]?(?:0|[1-9][0-9]*)")
+FLOAT_PATTERN = re.compile(
+    r"[+-]?(?:(?:0|[1-9][0-9]*)(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?"
+)
+
+
+def encode_csv(columns: List[str], rows: List[List[Any]]) -> bytes:
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return output.getvalue().encode()
+
+
+def decode_csv(data: bytes) -> Tuple[List[str], List[List[str]]]:
+    reader = csv.reader(io.StringIO(data.decode()))
+    columns = next(reader, [])
+    return columns, [row for row in reader if row]
+
+
+def parse_value(value: Any) -> Any:
+    """
+    Turns a value read from CSV back into a number where it is one, and an empty one into None
+    """
+    if not isinstance(value, str):
+        return value
+    if value == "":
+        return None
+    if INTEGER_PATTERN.fullmatch(value):
+        return int(value)
+    if FLOAT_PATTERN.fullmatch(value):
+        return float(value)
+    return value
+
+
+def negotiate_media_type(accept: str, supported: List[str]) -> str:
+    """
+    Picks the format to answer in from an `Accept` header, by its quality values and then by the order of
+    `supported`, falling back to CSV, which every wrapper answers in
+    """
+    preferences: Dict[str, float] = {}
+    for entry in accept.split(","):
+        media_type, *parameters = [part.strip() for part in entry.split(";")]
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type:
+            preferences[media_type.lower()] = quality
+
+    wildcard = preferences.get("*/*", 0.0)
+    ranked = sorted(
+        (
+            (-preferences.get(media_type, wildcard), index, media_type)
+            for index, media_type in enumerate(supported)
+        )
+    )
+    if ranked and ranked[0][0] < 0:
+        return ranked[0][2]
+    return CSV_TYPE
@@ -0,0 +1,22 @@
+import atexit
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+import pytest
+
+from starpack.testing import use_app_dir
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path: Path, monkeypatch) -> Iterator[Path]:
+    """
+    Keeps what every test writes to Starpack's configuration folder in a temporary one
+    """
+    use_app_dir(monkeypatch, tmp_path / "app_dir")
+    # Clients left open release their engine leases at exit, which is run at the end of the test instead, while
+    # their leases are still found in the temporary folder
+    exit_handlers: List[Callable[[], None]] = []
+    monkeypatch.setattr(atexit, "register", exit_handlers.append)
+    yield tmp_path / "app_dir"
+    for handler in exit_handlers:
+        handler()
@@ -0,0 +1,49 @@
+from io import BytesIO
+from pathlib import Path
+import tarfile
+
+import pytest
+
+from starpack.archive import TarStream, format_throughput
+
+
+def test_tar_stream_builds_archive(tmp_path: Path):
+    model_path = tmp_path / "model.joblib"
+    model_path.write_bytes(b"\x01" * 300_000)
+
+    stream = TarStream(
+        [("project/model.joblib", model_path), ("project/notes.txt", b"hello")],
+        chunk_size=64 * 1024,
+    )
+    chunks = list(stream)
+
+    assert all(len(chunk) <= 64 * 1024 for chunk in chunks)
+    assert stream.bytes_sent == sum(len(chunk) for chunk in chunks)
+    assert "MB/s" in format_throughput(stream)
+
+    with tarfile.open(fileobj=BytesIO(b"".join(chunks))) as tar:
+        assert tar.getnames() == ["project/model.joblib", "project/notes.txt"]
+        assert tar.extractfile("project/notes.txt").read() == b"hello"
+        assert len(tar.extractfile("project/model.joblib").read()) == 300_000
+
+
+def test_tar_stream_raises_archiving_errors(tmp_path: Path):
+    stream = TarStream([("project/missing.txt", tmp_path / "missing.txt")])
+
+    with pytest.raises(FileNotFoundError):
+        list(stream)
+
+
+def test_tar_stream_close_stops_writer(tmp_path: Path):
+    model_path = tmp_path / "model.joblib"
+    model_path.write_bytes(b"\x01" * 1_000_000)
+
+    stream = TarStream(
+        [("project/model.joblib", model_path)], chunk_size=1024, max_queued_chunks=1
+    )
+    iterator = iter(stream)
+    next(iterator)
+    iterator.close()
+
+    stream._thread.join(timeout=5)
+    assert not stream._thread.is_alive()
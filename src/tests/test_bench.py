@@ -0,0 +1,136 @@
+import json
+from pathlib import Path
+import random
+
+import pytest
+from typer.testing import CliRunner
+
+from starpack import bench, core
+from starpack.__main__ import app
+from starpack.bench import BenchReport, LatencyHistogram
+from starpack.errors import DeploymentUnreachableError, MissingBenchDataError
+from starpack.testing.model import LocalModel
+
+project_yaml = """
+package:
+  metadata:
+    name: heart_disease
+  artifacts:
+    validation_data: heart_disease_score.csv
+"""
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "starpack.yaml").write_text(project_yaml)
+    (project / "heart_disease_score.csv").write_text(
+        "age,sex,chol,oldpeak\n62,0,209,0.0\n57,1,236,1.5\n41,0,204,1.4\n"
+    )
+    return project
+
+
+def test_histogram_percentiles_are_precise_and_survive_saving():
+    generator = random.Random(0)
+    latencies = sorted(generator.uniform(0.0005, 2.0) for _ in range(5000))
+    histogram = LatencyHistogram()
+    for latency in latencies:
+        histogram.record(latency)
+
+    for percentile in (50, 95, 99):
+        exact = latencies[int(len(latencies) * percentile / 100) - 1] * 1_000_000
+        assert histogram.percentile(percentile) == pytest.approx(exact, rel=0.002)
+    assert histogram.percentile(100) == histogram.max
+
+    saved = LatencyHistogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    assert saved.percentile(99) == histogram.percentile(99)
+    saved.merge(histogram)
+    assert saved.total == 10000 and saved.percentile(50) == histogram.percentile(50)
+
+
+def test_closed_loop_bench_of_validation_data(project: Path, tmp_path: Path):
+    with LocalModel(name="heart_disease", latency=0.005) as model:
+        report = core.bench(
+            model.url,
+            project_dir=project,
+            model="heart_disease",
+            concurrency=3,
+            requests=30,
+            output_path=tmp_path / "report.json",
+        )
+
+    assert (report.requests, report.errors) == (30, 0)
+    assert model.max_in_flight <= 3
+    # Every row of the validation data is replayed, after the request checking the deployment
+    assert model.record_batches == [1] * 31
+    assert 5 <= report.metrics()["p50_ms"] < 100
+    saved = json.loads((tmp_path / "report.json").read_text())
+    assert saved["mode"] == "closed-loop"
+    assert saved["metrics"]["p99_ms"] == report.metrics()["p99_ms"]
+
+
+def test_fixed_rate_bench_counts_errors_and_compares(
+    project: Path, tmp_path: Path, capsys
+):
+    data_path = project / "heart_disease_score.csv"
+    with LocalModel(records=False) as model:
+        baseline = core.bench(
+            model.predict_url,
+            data_path=data_path,
+            rate=200,
+            duration=0.2,
+            output_path=tmp_path / "baseline.json",
+            label="before",
+        )
+        model.fail_requests = 4
+        report = core.bench(
+            model.predict_url,
+            data_path=data_path,
+            rate=200,
+            duration=0.2,
+            output_path=tmp_path / "after.json",
+            compare_path=tmp_path / "baseline.json",
+            label="after",
+        )
+
+    assert 30 <= baseline.requests <= 41 and baseline.errors == 0
+    # The request checking the deployment got the first 503
+    assert report.errors == 3 and report.statuses[503] == 3
+    output = capsys.readouterr().out
+    assert "before" in output and "after" in output and "503: 3" in output
+    assert BenchReport.load(tmp_path / "after.json").errors == 3
+
+
+def test_bench_needs_rows_and_a_deployment(project: Path, tmp_path: Path):
+    (project / "starpack.yaml").write_text(project_yaml.split("  artifacts")[0])
+    with pytest.raises(MissingBenchDataError):
+        core.bench("http://127.0.0.1:1/models/predict/x", project_dir=project)
+
+    with LocalModel() as model:
+        url = model.predict_url
+    with pytest.raises(DeploymentUnreachableError):
+        core.bench(url, data_path=project / "heart_disease_score.csv")
+
+
+def test_bench_command_takes_its_defaults_from_bench(
+    project: Path, tmp_path: Path, monkeypatch
+):
+    monkeypatch.setattr(bench, "DEFAULT_CONCURRENCY", 1)
+    monkeypatch.setattr(bench, "DEFAULT_DURATION", 0.2)
+    with LocalModel(latency=0.005) as model:
+        result = CliRunner().invoke(
+            app,
+            [
+                "bench",
+                model.predict_url,
+                "--project",
+                str(project),
+                "--output",
+                str(tmp_path / "report.json"),
+            ],
+        )
+
+    assert result.exit_code == 0, result.output
+    assert model.max_in_flight == 1
+    assert 0.2 <= BenchReport.load(tmp_path / "report.json").seconds < 1
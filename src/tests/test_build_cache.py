@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import docker
+import pytest
+
+from starpack import core
+from starpack.build_cache import BUILD_DIGEST_LABEL, label_payload, package_digest
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+payload = """
+package:
+  metadata:
+    name: cached_package
+  artifacts:
+    inference:
+      script_name: predict.py
+  steps:
+    - name: fastapi
+deployment:
+  metadata:
+    name: cached_deployment
+"""
+
+manifest = {"predict.py": {"sha256": "abc", "size": 3, "mtime_ns": 1}}
+spec = {"package": {"metadata": {"name": "a", "version": 1}, "steps": [{"name": "x"}]}}
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    with LocalEngine() as engine:
+        docker_client.add_engine(engine)
+        yield engine
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "starpack.yaml").write_text(payload)
+    (project / "predict.py").write_text("def predict(): ...")
+    return project
+
+
+def posted(engine: LocalEngine):
+    return [path for method, path, _ in engine.requests if method == "POST"]
+
+
+def test_package_digest_is_canonical():
+    reordered = {
+        "package": {"steps": [{"name": "x"}], "metadata": {"version": 1, "name": "a"}}
+    }
+    changed_file = {"predict.py": {"sha256": "def", "size": 3, "mtime_ns": 1}}
+    touched_file = {"predict.py": {"sha256": "abc", "size": 3, "mtime_ns": 2}}
+
+    digest = package_digest(spec, manifest)
+    assert package_digest(reordered, manifest) == digest
+    assert package_digest(spec, touched_file) == digest
+    assert package_digest(label_payload(spec, "old"), manifest) == digest
+    assert (
+        package_digest(spec, {**manifest, "starpack.yaml": {"sha256": "x"}}) == digest
+    )
+    assert package_digest(spec, changed_file) != digest
+
+
+def test_label_payload():
+    labelled = label_payload(spec, "digest")
+
+    assert labelled["package"]["metadata"]["labels"] == {BUILD_DIGEST_LABEL: "digest"}
+    assert "labels" not in spec["package"]["metadata"]
+
+
+def test_unchanged_package_is_skipped(engine: LocalEngine, project_dir: Path, capsys):
+    core.package_directory(project_dir)
+    core.package_directory(project_dir)
+
+    assert posted(engine) == ["/jobs/package"]
+    assert "is unchanged since" in capsys.readouterr().out
+
+    core.package_directory(project_dir, force=True)
+    (project_dir / "predict.py").write_text("def predict(): return 1")
+    core.package_directory(project_dir)
+
+    assert posted(engine) == ["/jobs/package"] * 3
+
+
+def test_deploy_reuses_built_image(engine: LocalEngine, project_dir: Path):
+    core.package_directories([project_dir])
+    requests_before = len(engine.requests)
+    core.deploy_directory(project_dir)
+
+    assert [
+        path
+        for method, path, _ in engine.requests[requests_before:]
+        if method == "POST"
+    ] == ["/deploy"]
+
+
+def test_package_summary_shows_cached(engine: LocalEngine, project_dir: Path, capsys):
+    core.package_directories([project_dir])
+    results = core.package_directories([project_dir])
+
+    assert results[0].succeeded and results[0].cached
+    assert "up to date" in capsys.readouterr().out
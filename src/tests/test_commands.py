@@ -8,11 +8,14 @@ from starpack.client import StarpackClient
 
 
 class FakeContainer:
+    id = "starpack-engine-id"
+    name = "starpack-engine-1"
     labels = {
         "desktop.docker.io/wsl-distro": "Ubuntu-20.04",
         "app": "starpack-engine",
     }
     attrs = {
+        "Image": "sha256:starpack-engine",
         "HostConfig": {
             "PortBindings": {"1976/tcp": [{"HostIp": "", "HostPort": "1976"}]},
         }
@@ -26,11 +29,20 @@ class FakeContainer:
     def put_archive(*args, **kwargs):
         ...
 
+    def get_archive(*args, **kwargs):
+        raise docker.errors.NotFound("No manifest")
+
+    def exec_run(*args, **kwargs):
+        ...
+
 
 class FakeContainerModule:
     def list(*args, **kwargs):
         return [FakeContainer]
 
+    def get(*args, **kwargs):
+        return FakeContainer
+
     def run(*args, **kwargs):
         pass
 
@@ -39,6 +51,9 @@ class FakeImageModule:
     def pull(*args):
         pass
 
+    def list(*args, **kwargs):
+        return []
+
 
 class FakeVolume:
     def remove(*args, **kwargs):
@@ -66,6 +81,7 @@ def mock_docker(monkeypatch, requests_mock):
     requests_mock.get(
         "http://localhost:1976/healthcheck", text='{"healthy": "true"}', status_code=200
     )
+    requests_mock.post("http://localhost:1976/jobs/package", status_code=404)
 
 
 @pytest.fixture
@@ -163,7 +179,7 @@ def test_command_package(test_runner: CliRunner, tmp_path, monkeypatch, requests
     yaml_path = tmp_path / "starpack.yaml"
     yaml_path.write_text(fake_payload)
 
-    monkeypatch.setattr(StarpackClient, "package", lambda x, y: ...)
+    monkeypatch.setattr(StarpackClient, "package", lambda x, y, **kwargs: ...)
     result = test_runner.invoke(app, ["package", str(tmp_path)])
 
     assert result.exit_code == 0
@@ -180,3 +196,33 @@ def test_command_deploy(test_runner: CliRunner, tmp_path, monkeypatch, requests_
     result = test_runner.invoke(app, ["deploy", str(tmp_path)])
 
     assert result.exit_code == 0
+
+
+def test_command_package_many(test_runner: CliRunner, tmp_path, requests_mock):
+    requests_mock.post("http://localhost:1976/package", status_code=200, text="")
+
+    for name in ("model_a", "model_b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "starpack.yaml").write_text(fake_payload)
+    (tmp_path / "model_c").mkdir()
+
+    result = test_runner.invoke(
+        app, ["package", str(tmp_path / "model_*"), "--jobs", "2"]
+    )
+
+    assert result.exit_code == 1
+    assert "2/3 projects packaged successfully" in result.stdout
+    assert [r.path for r in requests_mock.request_history].count("/package") == 2
+
+
+def test_command_package_many_rejects_detach(
+    test_runner: CliRunner, tmp_path, requests_mock
+):
+    (tmp_path / "model_a").mkdir()
+    (tmp_path / "model_a" / "starpack.yaml").write_text(fake_payload)
+
+    result = test_runner.invoke(app, ["package", str(tmp_path / "model_*"), "--detach"])
+
+    assert result.exit_code == 2
+    assert "--detach" in result.output
+    assert not requests_mock.request_history
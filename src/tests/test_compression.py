@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from starpack import compression, uploads
+from starpack.client import StarpackClient
+from starpack.testing.engine import LocalEngine
+
+CSV_DATA = b"age,sex,cp,trestbps,chol\n" + b"63,1,3,145,233\n57,0,0,120,354\n" * 5000
+
+
+@pytest.fixture(autouse=True)
+def chunk_size(monkeypatch) -> None:
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 64 * 1024)
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "heart.csv").write_bytes(CSV_DATA)
+    (project / "model.pkl").write_bytes(os.urandom(100 * 1024))
+    return project
+
+
+@pytest.mark.parametrize(
+    "name,contents,compressed",
+    [
+        ("heart.csv", CSV_DATA, True),
+        ("archive.gz", CSV_DATA, False),
+        ("model.joblib", os.urandom(200 * 1024), False),
+        ("model.joblib", b"\x00\x01" * 100 * 1024, True),
+        ("small.csv", b"a,b\n", False),
+    ],
+)
+def test_choose_codec(tmp_path: Path, name: str, contents: bytes, compressed: bool):
+    path = tmp_path / name
+    path.write_bytes(contents)
+
+    codec = compression.choose_codec(path, len(contents), ["gzip"])
+    assert codec == ("gzip" if compressed else None)
+
+
+def test_negotiate_codecs():
+    available = compression.AVAILABLE_CODECS
+
+    assert compression.negotiate_codecs("gzip, zstd") == available
+    assert compression.negotiate_codecs("gzip;q=1.0", "gzip") == ["gzip"]
+    assert compression.negotiate_codecs(None) == []
+    assert compression.negotiate_codecs("gzip, zstd", "none") == []
+
+
+@pytest.mark.parametrize("codec", compression.AVAILABLE_CODECS)
+def test_round_trip(codec: str):
+    assert compression.decompress(compression.compress(CSV_DATA, codec), codec) == (
+        CSV_DATA
+    )
+
+
+def test_compressed_upload(project_dir: Path, capsys):
+    with LocalEngine() as engine:
+        StarpackClient(host=engine.url, port=None).upload_artifacts(project_dir)
+
+        uploaded = engine.artifacts_dir / "project"
+        assert (uploaded / "heart.csv").read_bytes() == CSV_DATA
+        assert (uploaded / "model.pkl").read_bytes() == (
+            project_dir / "model.pkl"
+        ).read_bytes()
+        assert engine.bytes_received < len(CSV_DATA) / 4 + 100 * 1024 + 1024
+
+    output = capsys.readouterr().out
+    assert "compressed 1 with" in output
+    assert "saving" in output
+
+
+@pytest.mark.parametrize(
+    "engine_codecs,mode", [([], "auto"), (["gzip"], "none")], ids=["engine", "client"]
+)
+def test_compression_turned_off(project_dir: Path, engine_codecs, mode: str):
+    with LocalEngine(codecs=engine_codecs) as engine:
+        client = StarpackClient(host=engine.url, port=None)
+        client.upload_artifacts(project_dir, compression=mode)
+
+        assert engine.bytes_received == len(CSV_DATA) + 100 * 1024
@@ -1,2 +1,66 @@
-from starpack import core
+import threading
+
+from starpack import core, errors, utils
 import pytest
+
+
+def test_prepare_directory_overlaps_engine_startup(tmp_path, monkeypatch):
+    yaml_loaded = threading.Event()
+
+    class SlowStartingClient:
+        def __init__(self, *args, **kwargs) -> None:
+            # Only finishes starting if the YAML is loaded while we are starting up
+            self.overlapped = yaml_loaded.wait(timeout=5)
+
+    load_yaml = utils.load_yaml
+
+    def loading_yaml(yaml_path):
+        output = load_yaml(yaml_path)
+        yaml_loaded.set()
+        return output
+
+    monkeypatch.setattr(core, "StarpackClient", SlowStartingClient)
+    monkeypatch.setattr(utils, "load_yaml", loading_yaml)
+    (tmp_path / "starpack.yaml").write_text("package:\n  metadata:\n    name: test\n")
+    (tmp_path / "predict.py").write_text("")
+
+    client, payload, current_manifest = core._prepare_directory(
+        tmp_path, None, sections=("package",)
+    )
+
+    assert client.overlapped
+    assert payload["package"]["metadata"]["name"] == "test"
+    assert sorted(current_manifest) == ["predict.py", "starpack.yaml"]
+
+
+def test_prepare_directory_without_yaml_starts_no_engine(tmp_path, monkeypatch):
+    started = []
+    monkeypatch.setattr(core, "StarpackClient", lambda **kwargs: started.append(kwargs))
+
+    with pytest.raises(errors.PathExistsError):
+        core._prepare_directory(tmp_path, None, sections=("package",))
+
+    assert started == []
+
+
+@pytest.mark.parametrize(
+    ("payload", "sections"),
+    [
+        ([], ("package",)),
+        ({"package": {"metadata": {"name": "test"}}}, ("package", "deployment")),
+        ({"package": {"metadata": {}}}, ("package",)),
+    ],
+)
+def test_validate_payload_errors(tmp_path, payload, sections):
+    with pytest.raises(errors.InvalidPayloadError):
+        utils.validate_payload(payload, tmp_path / "starpack.yaml", sections)
+
+
+def test_expand_paths(tmp_path):
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a").mkdir()
+    (tmp_path / "c.txt").touch()
+
+    expanded = utils.expand_paths([tmp_path / "b", tmp_path / "*"])
+
+    assert expanded == [tmp_path / "b", tmp_path / "a"]
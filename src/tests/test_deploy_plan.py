@@ -0,0 +1,264 @@
+from pathlib import Path
+from time import perf_counter
+
+import docker
+import pytest
+import yaml
+
+from starpack import core, leases
+from starpack.build_cache import BUILD_DIGEST_LABEL
+from starpack.deploy_plan import (
+    CREATE,
+    DEPLOYMENT_LABEL,
+    REMOVE,
+    REPLACE,
+    UNCHANGED,
+    WRAPPER_LABEL,
+    DesiredContainer,
+    RunningContainer,
+    deployment_payload,
+    desired_state,
+    plan_deployment,
+)
+from starpack.errors import PackageFailedError
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+payload = """
+package:
+  metadata:
+    name: planned_package
+  steps:
+    - name: fastapi
+deployment:
+  metadata:
+    name: planned_deployment
+  steps:
+    - name: local_docker_find
+      wrapper: fastapi
+    - name: local_docker_deploy
+      env:
+        LOG_LEVEL: info
+      wrapper:
+        - name: fastapi
+          port: 1996
+        - name: streamlit
+          port: 1997
+"""
+
+
+def running(desired: DesiredContainer, **changes) -> RunningContainer:
+    container = RunningContainer(
+        f"id-{desired.wrapper}",
+        desired.wrapper,
+        desired.wrapper,
+        desired.image,
+        "" if desired.port is None else str(desired.port),
+        desired.env_digest,
+        True,
+    )
+    return container._replace(**changes)
+
+
+@pytest.fixture
+def docker_client(monkeypatch) -> FakeDockerClient:
+    docker_client = FakeDockerClient()
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    return docker_client
+
+
+@pytest.fixture
+def engine(docker_client: FakeDockerClient):
+    with LocalEngine() as engine:
+        docker_client.add_engine(engine)
+        yield engine
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "starpack.yaml").write_text(payload)
+    (project / "predict.py").write_text("def predict(): ...")
+    return project
+
+
+def posted(engine: LocalEngine, since: int = 0):
+    return [path for method, path, _ in engine.requests[since:] if method == "POST"]
+
+
+def test_desired_state():
+    desired = desired_state(yaml.safe_load(payload), "digest")
+
+    assert [(c.wrapper, c.image, c.port) for c in desired] == [
+        ("fastapi", "digest", 1996),
+        ("streamlit", "digest", 1997),
+    ]
+    assert desired[0].env == {"LOG_LEVEL": "info"}
+
+
+def test_plan_deployment():
+    fastapi, streamlit, gradio = (
+        DesiredContainer(wrapper, "digest", port, {})
+        for wrapper, port in (("fastapi", 1), ("streamlit", 2), ("gradio", 3))
+    )
+    current = [
+        running(fastapi),
+        running(streamlit, port="20"),
+        running(gradio, wrapper="old"),
+    ]
+
+    plan = plan_deployment("deployment", [fastapi, streamlit, gradio], current)
+
+    assert [(change.wrapper, change.action) for change in plan.changes] == [
+        ("fastapi", UNCHANGED),
+        ("streamlit", REPLACE),
+        ("gradio", CREATE),
+        ("old", REMOVE),
+    ]
+    assert plan.changes[1].reasons == ["port 20 -> 2"]
+    assert plan.to_deploy == ["streamlit", "gradio"]
+    assert [container.wrapper for container in plan.to_remove] == ["streamlit", "old"]
+
+
+def test_plan_deployment_detects_outdated_containers():
+    desired = DesiredContainer("fastapi", "new-digest", None, {"A": "1"})
+    current = running(desired, image="old-digest", env_digest="x", running=False)
+
+    (change,) = plan_deployment("deployment", [desired], [current]).changes
+
+    assert change.action == REPLACE
+    assert change.reasons == [
+        "not running",
+        "image old-digest -> new-digest",
+        "environment changed",
+    ]
+
+
+def test_plan_deployment_force_and_unknown():
+    desired = DesiredContainer("fastapi", "digest", 1, {})
+
+    forced = plan_deployment("deployment", [desired], [running(desired)], force=True)
+    unknown = plan_deployment("deployment", [desired], None)
+
+    assert forced.changes[0].action == REPLACE
+    assert unknown.to_deploy == ["fastapi"] and not unknown.up_to_date
+
+
+def test_plan_deployment_replaces_every_replica():
+    single = DesiredContainer("fastapi", "digest", 1996, {})
+    replicated = single._replace(replicas=3)
+    current = [
+        running(replicated, replicas="3")._replace(id=f"id-{index}")
+        for index in range(3)
+    ]
+
+    unchanged = plan_deployment("deployment", [replicated], current)
+    scaled = plan_deployment("deployment", [single], current)
+    degraded = plan_deployment("deployment", [replicated], current[:2])
+
+    assert unchanged.up_to_date
+    assert [(change.action, change.reasons) for change in scaled.changes] == [
+        (REMOVE, ["duplicate container"]),
+        (REMOVE, ["duplicate container"]),
+        (REPLACE, ["replicas 3 -> 1"]),
+    ]
+    assert degraded.changes[0].reasons == ["2 of 3 replicas running"]
+    assert [container.id for container in degraded.to_remove] == ["id-0", "id-1"]
+
+
+def test_deployment_payload_only_deploys_changes():
+    input_dict = yaml.safe_load(payload)
+    desired = desired_state(input_dict, "digest")
+    plan = plan_deployment("planned_deployment", desired, [running(desired[0])])
+
+    wrappers = deployment_payload(input_dict, plan)["deployment"]["steps"][1]["wrapper"]
+
+    assert [wrapper["name"] for wrapper in wrappers] == ["streamlit"]
+    assert wrappers[0]["labels"][WRAPPER_LABEL] == "streamlit"
+    assert wrappers[0]["labels"][BUILD_DIGEST_LABEL] == "digest"
+    assert len(input_dict["deployment"]["steps"][1]["wrapper"]) == 2
+
+
+def test_redeploying_unchanged_project_is_a_no_op(
+    engine: LocalEngine, project_dir: Path, docker_client: FakeDockerClient
+):
+    core.deploy_directory(project_dir)
+    containers = docker_client.containers.list(
+        filters={"label": f"{DEPLOYMENT_LABEL}=planned_deployment"}
+    )
+    requests_before = len(engine.requests)
+
+    start = perf_counter()
+    core.deploy_directory(project_dir)
+    elapsed = perf_counter() - start
+
+    assert len(containers) == 2
+    assert posted(engine, requests_before) == []
+    assert elapsed < 1
+
+
+def test_deploy_only_replaces_changed_wrappers(
+    engine: LocalEngine, project_dir: Path, docker_client: FakeDockerClient
+):
+    core.deploy_directory(project_dir)
+    (project_dir / "starpack.yaml").write_text(payload.replace("1997", "2997"))
+    requests_before = len(engine.requests)
+
+    core.deploy_directory(project_dir)
+
+    assert posted(engine, requests_before) == ["/deploy"]
+    deployed = engine.deployments[-1]["deployment"]["steps"][1]["wrapper"]
+    assert [wrapper["name"] for wrapper in deployed] == ["streamlit"]
+    containers = docker_client.containers.list(
+        filters={"label": f"{DEPLOYMENT_LABEL}=planned_deployment"}
+    )
+    assert sorted(container.labels[WRAPPER_LABEL] for container in containers) == [
+        "fastapi",
+        "streamlit",
+    ]
+
+
+def test_failed_package_leaves_running_containers(
+    engine: LocalEngine, project_dir: Path, docker_client: FakeDockerClient
+):
+    core.deploy_directory(project_dir)
+    before = docker_client.containers.list(
+        filters={"label": f"{DEPLOYMENT_LABEL}=planned_deployment"}
+    )
+    (project_dir / "predict.py").write_text("def predict(): return 1")
+    engine.fail_step = "fastapi"
+    requests_before = len(engine.requests)
+
+    with pytest.raises(PackageFailedError):
+        core.deploy_directory(project_dir)
+    with pytest.raises(PackageFailedError):
+        core.package_directory(project_dir)
+
+    assert "/deploy" not in posted(engine, requests_before)
+    assert all(container.status == "running" for container in before)
+    assert (
+        docker_client.containers.list(
+            filters={"label": f"{DEPLOYMENT_LABEL}=planned_deployment"}
+        )
+        == before
+    )
+
+
+def test_plan_deploy_changes_nothing(engine: LocalEngine, project_dir: Path, capsys):
+    plan = core.plan_deploy(project_dir)
+
+    assert plan.to_deploy == ["fastapi", "streamlit"]
+    assert posted(engine) == []
+    assert "Deployment plan" in capsys.readouterr().out
+
+
+def test_plan_deploy_starts_no_engine(
+    docker_client: FakeDockerClient, project_dir: Path
+):
+    plan = core.plan_deploy(project_dir)
+
+    assert plan.to_deploy == ["fastapi", "streamlit"]
+    assert docker_client.containers.containers == {}
+    assert docker_client.images.pulled == []
+    assert leases.load_leases()["leases"] == {}
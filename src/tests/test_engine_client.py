@@ -1,9 +1,18 @@
-from starpack.client import StarpackClient
+import asyncio
+
+from starpack.async_client import AsyncStarpackClient
+from starpack.client import CONNECT_TIMEOUT, StarpackClient
 import requests
 import pytest
 from typing import Optional
 
 
+@pytest.fixture(autouse=True)
+def legacy_engine(requests_mock):
+    # Unless a test says otherwise, the engine predates package jobs
+    requests_mock.post("http://localhost:1976/jobs/package", status_code=404)
+
+
 @pytest.fixture
 def starpack_client():
     client = StarpackClient()
@@ -70,3 +79,34 @@ def test_client_package(
     print_out = capsys.readouterr().out
 
     assert output in print_out
+
+
+def test_client_reuses_pooled_session(requests_mock):
+    client = StarpackClient(pool_size=4, timeout=30)
+    requests_mock.post("http://localhost:1976/package", status_code=201, text="")
+    payload = {"package": {"metadata": {"name": "test"}}}
+
+    assert client.package(payload)
+    assert client.package(payload)
+    assert client.session.get_adapter("http://localhost")._pool_maxsize == 4
+    assert requests_mock.last_request.timeout == (CONNECT_TIMEOUT, 30)
+
+
+def test_async_client_runs_concurrently(requests_mock):
+    requests_mock.post("http://localhost:1976/package", status_code=200, text="")
+    requests_mock.post("http://localhost:1976/deploy", status_code=500, text="")
+    payloads = [{"package": {"metadata": {"name": f"test_{i}"}}} for i in range(5)]
+
+    async def run_all():
+        async with AsyncStarpackClient(max_concurrency=3) as client:
+            packaged = await asyncio.gather(
+                *(client.package(payload) for payload in payloads)
+            )
+            deployed = await client.deploy({"deployment": {"metadata": {"name": "x"}}})
+        return packaged, deployed
+
+    packaged, deployed = asyncio.run(run_all())
+
+    assert packaged == [True] * 5
+    assert not deployed
+    assert [r.path for r in requests_mock.request_history].count("/package") == 5
@@ -33,3 +33,11 @@ def test_engine_initialization_error() -> None:
         raise errors.EngineInitializationError()
 
     assert e.value.exit_code == 1
+
+
+def test_invalid_payload_error(capsys) -> None:
+    with pytest.raises(errors.InvalidPayloadError) as e:
+        raise errors.InvalidPayloadError(Path("starpack.yaml"), "missing a name")
+
+    assert "missing a name" in capsys.readouterr().out
+    assert e.value.exit_code == 1
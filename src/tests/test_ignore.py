@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import pytest
+
+from starpack import manifest
+from starpack.ignore import IgnoreRules, strict_paths
+
+artifacts = {
+    "root_location": "project",
+    "validation_data": "heart_disease_score.csv",
+    "training_data": "heart.csv",
+    "gradio_script_name": "gradio_example",
+    "inference": {
+        "function_name": "predict",
+        "script_name": "predict.py",
+        "model_data": "model",
+    },
+    "dependencies": "requirements.txt",
+}
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(manifest, "MANIFEST_DIR", tmp_path / "manifests")
+    project = tmp_path / "project"
+    files = [
+        "starpack.yaml",
+        "predict.py",
+        "gradio_example.py",
+        "requirements.txt",
+        "heart.csv",
+        "heart_disease_score.csv",
+        "model/weights.bin",
+        "notebooks/explore.ipynb",
+        "notebooks/.ipynb_checkpoints/explore-checkpoint.ipynb",
+        ".git/HEAD",
+        "__pycache__/predict.cpython-39.pyc",
+        "data/raw/train.csv",
+        "data/raw/keep.csv",
+    ]
+    for name in files:
+        path = project / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+
+    return project
+
+
+@pytest.mark.parametrize(
+    "pattern,path,is_dir,ignored",
+    [
+        ("*.csv", "heart.csv", False, True),
+        ("*.csv", "data/raw/train.csv", False, True),
+        ("/heart.csv", "data/heart.csv", False, False),
+        ("data/*.csv", "data/raw/train.csv", False, False),
+        ("data/**/*.csv", "data/raw/train.csv", False, True),
+        ("**/raw", "data/raw", True, True),
+        ("build/", "build", False, False),
+        ("build/", "build", True, True),
+        ("model.[jp]kl", "model.pkl", False, True),
+        ("model.[!p]kl", "model.pkl", False, False),
+        ("\\#notes", "#notes", False, True),
+    ],
+)
+def test_patterns(pattern: str, path: str, is_dir: bool, ignored: bool):
+    assert IgnoreRules([pattern]).ignored(path, is_dir) == ignored
+
+
+def test_negation_last_match_wins():
+    rules = IgnoreRules(["*.csv", "!keep.csv", "# a comment", ""])
+
+    assert rules.ignored("data/train.csv", False)
+    assert not rules.ignored("data/keep.csv", False)
+
+
+def test_defaults_and_ignore_files(project_dir: Path):
+    (project_dir / ".starpackignore").write_text("*.csv\n!heart_disease_score.csv\n")
+    (project_dir / "data" / ".starpackignore").write_text("!raw/keep.csv\n")
+
+    files = set(manifest.directory_manifest(project_dir))
+
+    assert files == {
+        ".starpackignore",
+        "starpack.yaml",
+        "predict.py",
+        "gradio_example.py",
+        "requirements.txt",
+        "heart_disease_score.csv",
+        "model/weights.bin",
+        "notebooks/explore.ipynb",
+        "data/.starpackignore",
+        "data/raw/keep.csv",
+    }
+
+
+def test_strict_mode(project_dir: Path):
+    files = set(manifest.directory_manifest(project_dir, artifacts))
+
+    assert files == {
+        "starpack.yaml",
+        "predict.py",
+        "gradio_example.py",
+        "requirements.txt",
+        "heart_disease_score.csv",
+        "model/weights.bin",
+    }
+
+
+def test_strict_paths_skip_unset_artifacts():
+    assert strict_paths({"streamlit": None, "inference": {"script_name": "./app"}}) == {
+        "starpack.yaml",
+        ".starpackignore",
+        "app.py",
+    }
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+
+from starpack.testing.importtime import (
+    COMMAND_BUDGETS,
+    CommandBudget,
+    check_budget,
+    parse_importtime,
+    profile_command,
+)
+
+SAMPLE_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   starpack._config
+import time:       200 |        300 | starpack
+import time:        50 |         50 | typer
+"""
+
+
+def test_parse_importtime():
+    profile = parse_importtime(SAMPLE_OUTPUT)
+
+    assert profile.modules == {"starpack._config": 100, "starpack": 300, "typer": 50}
+    assert profile.total_us == 350
+
+
+def test_check_budget():
+    profile = parse_importtime(SAMPLE_OUTPUT)
+
+    assert check_budget(CommandBudget(("--version",), 1), profile) == []
+    assert check_budget(CommandBudget(("--version",), 0.1), profile)[0].startswith(
+        "spends"
+    )
+    assert check_budget(CommandBudget(("--version",), 0.1), profile, False) == []
+    assert check_budget(CommandBudget(("--version",), 1, ("typer",)), profile) == [
+        "imports typer"
+    ]
+
+
+@pytest.mark.parametrize(
+    "budget", COMMAND_BUDGETS, ids=[b.name for b in COMMAND_BUDGETS]
+)
+def test_command_import_budget(budget: CommandBudget, tmp_path: Path):
+    profile = profile_command(budget.args, tmp_path)
+
+    # Import times depend on the machine, and are checked by `python -m starpack.testing.importtime`
+    assert check_budget(budget, profile, check_time=False) == []
@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pytest
+
+from starpack import core, jobs
+from starpack.client import StarpackClient
+from starpack.testing.engine import LocalEngine
+
+payload = {
+    "package": {
+        "metadata": {"name": "test"},
+        "steps": [
+            {"name": "gradio_middleware"},
+            {"name": "fastapi"},
+            {"name": "docker_desktop_push"},
+        ],
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def last_job_file(tmp_path: Path, monkeypatch) -> Path:
+    job_file = tmp_path / "last_job.json"
+    monkeypatch.setattr(jobs, "LAST_JOB_FILE", job_file)
+    return job_file
+
+
+def engine_client(engine: LocalEngine) -> StarpackClient:
+    return StarpackClient(host="http://127.0.0.1", port=engine.port)
+
+
+def test_package_job_streams_steps(capsys):
+    with LocalEngine(step_seconds=0.01) as engine:
+        assert engine_client(engine).package(payload)
+
+    output = capsys.readouterr().out
+    assert "Running fastapi" in output
+    assert "docker_desktop_push" in output
+    assert "Successfully packaged test" in output
+    assert ("POST", "/package", payload) not in engine.requests
+
+
+def test_package_job_failure(capsys):
+    with LocalEngine(fail_step="fastapi") as engine:
+        assert not engine_client(engine).package(payload)
+
+    assert "fastapi failed" in capsys.readouterr().out
+
+
+def test_package_job_reattaches_after_dropped_stream():
+    with LocalEngine(drop_events_after=2) as engine:
+        client = engine_client(engine)
+        job_id = client.submit_package_job(payload)
+
+        progress_offsets = []
+        original_handle = jobs.JobProgress.handle
+
+        def recording_handle(self, event):
+            progress_offsets.append(event["offset"])
+            original_handle(self, event)
+
+        jobs.JobProgress.handle = recording_handle
+        try:
+            assert client.follow_job(job_id)
+        finally:
+            jobs.JobProgress.handle = original_handle
+
+    # Every event is seen exactly once across the reconnections
+    assert progress_offsets == list(range(len(progress_offsets)))
+    event_requests = [r for r in engine.requests if r[1].endswith("/events")]
+    assert len(event_requests) > 1
+
+
+def test_package_detach_and_attach():
+    with LocalEngine() as engine:
+        client = engine_client(engine)
+        assert client.package(payload, detach=True)
+        assert jobs.load_last_job() == ("job-1", engine.url)
+
+        assert core.attach_package_job(client=client)
+
+
+def test_package_falls_back_without_jobs():
+    with LocalEngine(jobs=False) as engine:
+        client = engine_client(engine)
+        assert client.package(payload)
+        assert client.package(payload)
+
+    posted = [path for method, path, _ in engine.requests if method == "POST"]
+    assert posted == ["/jobs/package", "/package", "/package"]
@@ -0,0 +1,149 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+from threading import Thread
+from time import sleep
+
+import docker
+import pytest
+
+from starpack import client as client_module
+from starpack import leases
+from starpack._config import settings
+from starpack.client import StarpackClient
+from starpack.errors import EngineLockTimeoutError
+from starpack.leases import FileLock
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+HOLD_LOCK = """
+import sys, time
+from pathlib import Path
+from starpack.leases import FileLock
+
+with FileLock(Path(sys.argv[1])):
+    Path(sys.argv[2]).touch()
+    time.sleep(30)
+"""
+
+
+@pytest.fixture
+def engine_container(app_dir: Path, monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    with LocalEngine() as engine:
+        yield docker_client.add_engine(engine)
+
+
+def test_lock_excludes_other_processes(tmp_path: Path):
+    lock_path = tmp_path / "engine.lock"
+    locked = tmp_path / "locked"
+    holder = subprocess.Popen(
+        [sys.executable, "-c", HOLD_LOCK, str(lock_path), str(locked)],
+        env={**os.environ, "PYTHONPATH": str(Path(__file__).parents[1])},
+    )
+    try:
+        while not locked.exists():
+            assert holder.poll() is None
+            sleep(0.01)
+        with pytest.raises(EngineLockTimeoutError):
+            FileLock(lock_path, timeout=0.2).acquire()
+    finally:
+        holder.kill()
+        holder.wait()
+
+    with FileLock(lock_path, timeout=5):
+        pass
+
+
+def test_lock_is_reentrant_and_excludes_threads(tmp_path: Path):
+    lock = FileLock(tmp_path / "engine.lock", timeout=0.2)
+    errors = []
+
+    def contend():
+        try:
+            lock.acquire()
+        except EngineLockTimeoutError as error:
+            errors.append(error)
+
+    with lock:
+        with lock:
+            thread = Thread(target=contend)
+            thread.start()
+            thread.join()
+
+    assert len(errors) == 1
+    with lock:
+        pass
+
+
+def test_leases_are_counted(app_dir: Path):
+    with leases.engine_lock():
+        first = leases.acquire_lease("engine")
+        second = leases.acquire_lease("engine")
+
+    assert leases.lease_count("engine") == 2
+    assert leases.idle_seconds("engine") is None
+    assert leases.release_lease(first) == 1
+    assert leases.release_lease(second) == 0
+    assert 0 <= leases.idle_seconds("engine") < 60
+
+
+def test_leases_of_dead_processes_are_dropped(app_dir: Path):
+    finished = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True
+    )
+    state = leases.load_leases()
+    state["leases"]["stale"] = {
+        "engine": "engine",
+        "pid": int(finished.stdout),
+        "acquired": "",
+    }
+    leases.save_leases(state)
+
+    assert leases.lease_count("engine") == 0
+    assert leases.idle_seconds("engine") is not None
+
+
+def test_forced_start_keeps_engine_in_use(engine_container, monkeypatch):
+    monkeypatch.setattr(settings, "pull_image", False)
+    first = StarpackClient(start=True, docker=True)
+    second = StarpackClient(start=True, docker=True, force=True)
+
+    assert engine_container.status == "running"
+    assert second.engine is engine_container
+    assert leases.lease_count(engine_container.id) == 2
+
+    first.close()
+    second.close()
+    assert leases.lease_count(engine_container.id) == 0
+
+
+def test_idle_engine_is_reaped(engine_container, monkeypatch):
+    reapers = []
+    monkeypatch.setattr(
+        client_module, "run_detached", lambda *args: reapers.append(args)
+    )
+    monkeypatch.setattr(settings, "engine_idle_timeout", 60.0)
+    client = StarpackClient(start=True, docker=True)
+
+    assert client.reap_idle_engines(0) == []
+    client.close()
+
+    assert reapers == [("engine", "reap")]
+    assert client.reap_idle_engines(60) == []
+    assert client.reap_idle_engines(0) == [engine_container.name]
+    assert engine_container.status == "removed"
+
+
+def test_terminate_keeps_engines_in_use_and_their_data(engine_container, capsys):
+    leases.acquire_lease(engine_container.id)
+
+    StarpackClient().terminate(all=True)
+
+    output = capsys.readouterr().out
+    assert engine_container.status == "running"
+    assert engine_container.name in output
+    assert "Removed all instances" not in output
+    assert not docker.from_env().volumes.get("starpack-model-artifacts").removed
@@ -0,0 +1,100 @@
+from io import BytesIO
+from pathlib import Path
+import tarfile
+from typing import List
+
+import pytest
+
+from starpack import manifest
+from starpack.client import StarpackClient
+from starpack.store import INDEX_NAME, STORE_DIR
+from starpack.testing.fake_docker import FakeContainer
+
+
+class RecordingContainer(FakeContainer):
+    """
+    Stands in for the engine container, keeping the project files sent in each uploaded archive
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.archives: List[List[str]] = []
+        self.removed: List[str] = []
+
+    def put_archive(self, path: str, data) -> bool:
+        data = b"".join(data)
+        with tarfile.open(fileobj=BytesIO(data)) as tar:
+            names = tar.getnames()
+        if names != [INDEX_NAME]:
+            self.archives.append(
+                sorted(
+                    name.split("/", 1)[1]
+                    for name in names
+                    if not name.startswith(STORE_DIR)
+                    and not name.endswith(manifest.MANIFEST_NAME)
+                )
+            )
+        return super().put_archive(path, data)
+
+    def exec_run(self, cmd: List[str], workdir: str = "/", **kwargs):
+        self.removed.extend(cmd[3:])
+        return super().exec_run(cmd, workdir, **kwargs)
+
+    def uploaded_files(self) -> List[str]:
+        return self.archives[-1]
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(manifest, "MANIFEST_DIR", tmp_path / "manifests")
+    project = tmp_path / "project"
+    (project / "models").mkdir(parents=True)
+    (project / "predict.py").write_text("def predict(): ...")
+    (project / "models" / "model.joblib").write_bytes(b"\x00" * 2048)
+
+    return project
+
+
+def test_build_manifest(project_dir: Path):
+    output = manifest.build_manifest(project_dir)
+
+    assert sorted(output) == ["models/model.joblib", "predict.py"]
+    assert output["models/model.joblib"]["size"] == 2048
+    assert output["predict.py"]["sha256"] == manifest.hash_file(
+        project_dir / "predict.py"
+    )
+
+
+def test_build_manifest_reuses_unchanged_hashes(project_dir: Path, monkeypatch):
+    previous = manifest.build_manifest(project_dir)
+    previous["predict.py"]["sha256"] = "cached"
+
+    monkeypatch.setattr(manifest, "hash_file", lambda path: "rehashed")
+    output = manifest.build_manifest(project_dir, previous=previous)
+
+    assert output["predict.py"]["sha256"] == "cached"
+
+
+def test_diff_manifests():
+    old = {"a": {"sha256": "1"}, "b": {"sha256": "2"}, "c": {"sha256": "3"}}
+    new = {"a": {"sha256": "1"}, "b": {"sha256": "changed"}, "d": {"sha256": "4"}}
+
+    assert manifest.diff_manifests(old, new) == (["b", "d"], ["c"])
+
+
+def test_upload_artifacts_only_sends_changes(project_dir: Path, capsys):
+    client = StarpackClient()
+    client.engine = RecordingContainer()
+
+    client.upload_artifacts(project_dir)
+    assert client.engine.uploaded_files() == ["models/model.joblib", "predict.py"]
+
+    (project_dir / "predict.py").write_text("def predict(): return 1")
+    (project_dir / "models" / "model.joblib").unlink()
+    client.upload_artifacts(project_dir)
+    assert client.engine.uploaded_files() == ["predict.py"]
+    assert client.engine.removed == ["models/model.joblib"]
+
+    client.upload_artifacts(project_dir)
+    assert len(client.engine.archives) == 2
+    assert "up to date" in capsys.readouterr().out
@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from typing import List
+
+import docker
+import pytest
+
+from starpack import client as client_module
+from starpack import core, jobs
+from starpack._config import settings
+from starpack.client import StarpackClient
+from starpack.pool import POOL_SIZE_LABEL, EnginePool, PoolMember
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+IMAGE = "starpack/starpack-engine:latest"
+
+
+def package_payload(name: str):
+    return {"package": {"metadata": {"name": name}, "steps": [{"name": "fastapi"}]}}
+
+
+@pytest.fixture
+def docker_client(monkeypatch) -> FakeDockerClient:
+    docker_client = FakeDockerClient()
+    docker_client.images.pull(IMAGE)
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    monkeypatch.setattr(settings, "engine_image", IMAGE)
+    monkeypatch.setattr(settings, "pull_image", False)
+    monkeypatch.setattr(settings, "engine_startup_timeout", 5.0)
+    monkeypatch.setattr(client_module, "run_detached", lambda *args: None)
+    return docker_client
+
+
+@pytest.fixture
+def engines(docker_client: FakeDockerClient) -> List[LocalEngine]:
+    engines = [LocalEngine(step_seconds=0.05).start() for _ in range(4)]
+    # The first engine of a pool takes the client's port, and the others the ports Docker picks
+    docker_client.engine_ports.extend(engine.port for engine in engines[1:])
+    yield engines
+    for engine in engines:
+        try:
+            engine.stop()
+        except OSError:
+            pass
+
+
+def pool_client(engines: List[LocalEngine], replicas: int = 3) -> StarpackClient:
+    return StarpackClient(
+        port=engines[0].port, start=True, docker=True, replicas=replicas
+    )
+
+
+def test_acquire_picks_least_outstanding():
+    members = [PoolMember(None, f"http://engine-{index}") for index in range(3)]
+    pool = EnginePool(members, session=None)
+
+    first, second, third = pool.acquire(), pool.acquire(), pool.acquire()
+    assert {first, second, third} == set(members)
+
+    pool.release(second)
+    assert pool.acquire() is second
+
+    pool.evict(first)
+    pool.release(third)
+    assert pool.acquire() is third
+
+
+def test_pool_is_started_and_reused(
+    engines: List[LocalEngine], docker_client: FakeDockerClient
+):
+    client = pool_client(engines)
+
+    assert len(client.pool) == 3
+    assert [member.url for member in client.pool.members] == [
+        f"http://localhost:{engine.port}" for engine in engines[:3]
+    ]
+    containers = docker_client.containers.list(all=True)
+    assert [container.labels[POOL_SIZE_LABEL] for container in containers] == ["3"] * 3
+
+    reused = StarpackClient(port=engines[0].port, start=True, docker=True)
+
+    assert len(reused.pool) == 3
+    assert len(docker_client.containers.list(all=True)) == 3
+    client.close()
+    reused.close()
+
+
+def test_package_jobs_are_spread_across_engines(engines: List[LocalEngine]):
+    client = pool_client(engines)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(
+            executor.map(
+                client.package, [package_payload(f"model_{i}") for i in range(6)]
+            )
+        )
+
+    assert all(results)
+    assert [len(engine.jobs) for engine in engines[:3]] == [2, 2, 2]
+    assert all(member.outstanding == 0 for member in client.pool.members)
+    client.close()
+
+
+def test_attach_follows_the_job_on_its_engine(engines: List[LocalEngine]):
+    urls = [f"http://localhost:{engine.port}" for engine in engines]
+    client = pool_client(engines)
+    # Detached jobs take turns between engines, so one of the first few lands on an engine other than the first
+    for index in range(3):
+        assert client.package(package_payload(f"model_{index}"), detach=True)
+        last_job = jobs.load_last_job()
+        if last_job.url != urls[0]:
+            break
+    client.close()
+    requests_before = [len(engine.requests) for engine in engines]
+
+    attaching = pool_client(engines)
+    assert core.attach_package_job(client=attaching)
+    attaching.close()
+
+    followed = [
+        url
+        for url, engine, before in zip(urls, engines, requests_before)
+        for _, path, _ in engine.requests[before:]
+        if path == f"/jobs/{last_job.job_id}/events"
+    ]
+    assert followed and set(followed) == {last_job.url}
+
+
+def test_unhealthy_engine_is_replaced(
+    engines: List[LocalEngine], docker_client: FakeDockerClient
+):
+    client = pool_client(engines)
+    lost = client.pool.members[1]
+    engines[1].stop()
+
+    client.pool.check_health()
+    assert lost in client.pool.members
+    client.pool.check_health()
+    assert lost not in client.pool.members
+
+    for _ in range(100):
+        if len(client.pool) == 3:
+            break
+        sleep(0.05)
+
+    assert client.pool.members[-1].url == f"http://localhost:{engines[3].port}"
+    assert lost.engine.status == "removed"
+    assert lost.engine.id not in client.leases
+    assert client.pool.members[-1].engine.id in client.leases
+    client.close()
+
+
+def test_request_moves_on_from_a_dropped_engine(engines: List[LocalEngine]):
+    client = pool_client(engines, replicas=2)
+    engines[0].stop()
+
+    assert client.package(package_payload("model"))
+    assert len(engines[1].jobs) == 1
+    client.close()
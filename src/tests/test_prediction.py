@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+import starpack
+from starpack.prediction import PREDICT_URL_ENV, PredictionClient
+from starpack.testing.model import LocalModel
+
+patient = {"age": 62, "sex": 0, "chol": 209, "oldpeak": 0.5}
+
+
+def test_single_rows_as_json_records(monkeypatch):
+    with LocalModel() as model:
+        monkeypatch.setenv(PREDICT_URL_ENV, model.predict_url)
+        with PredictionClient() as client:
+            first = client.predict(patient)
+            second = client.predict({**patient, "age": 63})
+
+    assert first == {**patient, "prediction": 271.5}
+    assert second["prediction"] == 272.5
+    assert model.record_batches == [1, 1]
+
+    monkeypatch.delenv(PREDICT_URL_ENV)
+    with pytest.raises(ValueError):
+        PredictionClient()
+
+
+def test_older_deployments_get_a_table_upload():
+    with LocalModel(records=False) as model, PredictionClient(
+        model.predict_url
+    ) as client:
+        assert client.predict(patient) == {**patient, "prediction": 271.5}
+        assert client.predict_many([patient, patient])[1]["prediction"] == 271.5
+
+    assert not client.records_supported
+    assert model.requests == 2
+    assert model.record_batches == []
+
+
+def test_concurrent_rows_are_batched():
+    with LocalModel(latency=0.02) as model, PredictionClient(
+        model.predict_url, batch_window=0.05, max_batch=4
+    ) as client:
+        rows = [{**patient, "age": age} for age in range(10)]
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            predictions = list(executor.map(client.predict, rows))
+
+    assert [prediction["age"] for prediction in predictions] == list(range(10))
+    assert all(
+        prediction["prediction"] == prediction["age"] + 209.5
+        for prediction in predictions
+    )
+    assert sum(model.record_batches) == 10
+    assert max(model.record_batches) <= 4
+    assert len(model.record_batches) < 10
+
+
+def test_importable_without_the_cli_dependencies():
+    # Wrappers use the client alone, so it must import in an environment with none of the CLI's dependencies
+    blocked = ["typer", "rich", "click", "docker", "pydantic", "yaml"]
+    code = (
+        f"import sys; sys.modules.update(dict.fromkeys({blocked!r})); "
+        "from starpack.prediction import PredictionClient"
+    )
+    source_dir = str(Path(starpack.__file__).resolve().parents[1])
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "PYTHONPATH": source_dir},
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,159 @@
+from pathlib import Path
+import socket
+from time import sleep
+from typing import List
+
+import docker
+import pytest
+import requests
+
+from starpack import core, proxy
+from starpack.deploy_plan import DEPLOYMENT_LABEL, REPLICAS_LABEL
+from starpack.proxy import ACTIVE, DRAINING, LoadBalancer, ProxyServer
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+payload = """
+package:
+  metadata:
+    name: replicated_package
+  steps:
+    - name: fastapi
+deployment:
+  metadata:
+    name: replicated_deployment
+  steps:
+    - name: local_docker_deploy
+      env:
+        LOG_LEVEL: {log_level}
+      wrapper:
+        - name: fastapi
+          port: {port}
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_through(port: int) -> requests.Response:
+    # A new connection per request, as the proxy balances connections
+    return requests.get(
+        f"http://127.0.0.1:{port}/healthcheck",
+        headers={"Connection": "close"},
+        timeout=5,
+    )
+
+
+def healthchecks(engine: LocalEngine) -> int:
+    return sum(path == "/healthcheck" for _, path, _ in engine.requests)
+
+
+@pytest.fixture(autouse=True)
+def proxies_in_threads(monkeypatch) -> None:
+    # Proxies run in a thread of the test rather than in their own process
+    monkeypatch.setattr(proxy, "start_proxy", lambda name: ProxyServer(name).start())
+
+
+@pytest.fixture
+def replicas() -> List[LocalEngine]:
+    replicas = [LocalEngine().start() for _ in range(4)]
+    yield replicas
+    for replica in replicas:
+        try:
+            replica.stop()
+        except OSError:
+            pass
+
+
+def test_least_connections_and_draining():
+    balancer = LoadBalancer(["127.0.0.1:1", "127.0.0.1:2"])
+    first = balancer.pick()
+    first.connections += 1
+
+    assert balancer.pick().address == "127.0.0.1:2"
+
+    balancer.set_backends(["127.0.0.1:2", "127.0.0.1:3"])
+
+    assert first.state == DRAINING
+    assert balancer.pick(exclude={"127.0.0.1:2"}).address == "127.0.0.1:3"
+    first.connections -= 1
+    balancer._drop_if_drained(first)
+    assert list(balancer.status()) == ["127.0.0.1:2", "127.0.0.1:3"]
+    assert balancer.status()["127.0.0.1:3"]["state"] == ACTIVE
+
+
+def test_proxy_spreads_connections_and_ejects_dead_replicas(
+    replicas: List[LocalEngine],
+):
+    port = free_port()
+    proxy.route(
+        "model.fastapi", port, [f"127.0.0.1:{replica.port}" for replica in replicas[:3]]
+    )
+    assert proxy.ensure_proxy("model.fastapi")
+
+    for _ in range(6):
+        assert get_through(port).status_code == 200
+    assert all(healthchecks(replica) for replica in replicas[:3])
+
+    replicas[0].stop()
+    for _ in range(3):
+        assert get_through(port).status_code == 200
+    dead = f"127.0.0.1:{replicas[0].port}"
+    # The proxy reports the state of its replicas a moment later
+    for _ in range(40):
+        if proxy.load_status("model.fastapi")["backends"][dead]["state"] == "ejected":
+            break
+        sleep(0.05)
+    assert proxy.load_status("model.fastapi")["backends"][dead]["state"] == "ejected"
+
+    assert proxy.stop_proxy("model.fastapi")
+    with pytest.raises(requests.ConnectionError):
+        get_through(port)
+
+
+def test_deploy_replicas_behind_proxy_with_rolling_replacement(
+    tmp_path: Path, monkeypatch, replicas: List[LocalEngine]
+):
+    docker_client = FakeDockerClient()
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    port = free_port()
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "starpack.yaml").write_text(payload.format(log_level="info", port=port))
+    (project / "predict.py").write_text("def predict(): ...")
+    # Replicas are handed the ports of running stand-ins, in the order they are started
+    docker_client.engine_ports.extend(replica.port for replica in replicas)
+
+    with LocalEngine() as engine:
+        docker_client.add_engine(engine)
+
+        core.deploy_directory(project, replicas=2)
+
+        first = docker_client.containers.list(
+            filters={"label": f"{DEPLOYMENT_LABEL}=replicated_deployment"}
+        )
+        assert [container.labels[REPLICAS_LABEL] for container in first] == ["2", "2"]
+        assert proxy.load_config("replicated_deployment.fastapi")["backends"] == [
+            f"127.0.0.1:{replica.port}" for replica in replicas[:2]
+        ]
+        assert get_through(port).status_code == 200
+
+        (project / "starpack.yaml").write_text(
+            payload.format(log_level="debug", port=port)
+        )
+        core.deploy_directory(project, replicas=2)
+
+        assert all(container.status == "removed" for container in first)
+        assert proxy.load_config("replicated_deployment.fastapi")["backends"] == [
+            f"127.0.0.1:{replica.port}" for replica in replicas[2:]
+        ]
+        assert get_through(port).status_code == 200
+        assert sum(healthchecks(replica) for replica in replicas[2:]) == 1
+
+        core.deploy_directory(project)
+
+        assert proxy.load_config("replicated_deployment.fastapi") is None
+        assert not proxy.proxy_running("replicated_deployment.fastapi")
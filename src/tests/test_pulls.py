@@ -0,0 +1,83 @@
+import pytest
+
+from starpack import pulls
+from starpack._config import settings
+from starpack.pulls import ImagePuller, ensure_engine_image, record_pull
+from starpack.testing.fake_docker import FakeDockerClient
+
+IMAGE = "starpack/starpack-engine:latest"
+
+
+@pytest.fixture
+def docker_client(monkeypatch) -> FakeDockerClient:
+    docker_client = FakeDockerClient()
+    docker_client.images.registry[IMAGE] = "sha256:first"
+    return docker_client
+
+
+@pytest.fixture
+def pulled_image(docker_client: FakeDockerClient) -> FakeDockerClient:
+    docker_client.images.pull(IMAGE)
+    docker_client.images.pulled.clear()
+    return docker_client
+
+
+def test_missing_image_is_pulled(docker_client: FakeDockerClient):
+    assert ImagePuller(docker_client, IMAGE, policy="if-missing").ensure()
+
+    assert docker_client.images.pulled == [IMAGE]
+    assert pulls.load_pull_records()[IMAGE]["digest"] == "sha256:first"
+
+
+def test_if_missing_never_checks_registry(pulled_image: FakeDockerClient):
+    assert not ImagePuller(pulled_image, IMAGE, policy="if-missing").ensure()
+
+    assert pulled_image.images.registry_requests == 0
+
+
+def test_ttl_only_checks_registry_once_stale(pulled_image: FakeDockerClient):
+    record_pull(IMAGE, "sha256:first")
+    pulled_image.images.registry[IMAGE] = "sha256:second"
+
+    assert not ImagePuller(pulled_image, IMAGE, policy="ttl", ttl=60).ensure()
+    assert pulled_image.images.registry_requests == 0
+
+    assert ImagePuller(pulled_image, IMAGE, policy="ttl", ttl=0).ensure()
+    assert pulled_image.images.pulled == [IMAGE]
+
+
+def test_up_to_date_image_is_not_pulled(pulled_image: FakeDockerClient):
+    puller = ImagePuller(pulled_image, IMAGE, policy="always")
+
+    assert not puller.ensure()
+    assert not puller.ensure()
+
+    assert pulled_image.images.registry_requests == 2
+    assert pulled_image.images.pulled == []
+    assert pulls.seconds_since_check(IMAGE) < 60
+
+
+def test_offline_registry_keeps_local_image(pulled_image: FakeDockerClient):
+    pulled_image.images.registry_online = False
+
+    assert not ImagePuller(pulled_image, IMAGE, policy="always").ensure()
+    assert pulls.seconds_since_check(IMAGE) == float("inf")
+
+
+def test_stale_image_is_refreshed_in_background(
+    pulled_image: FakeDockerClient, monkeypatch
+):
+    refreshes = []
+    monkeypatch.setattr(pulls, "refresh_in_background", lambda: refreshes.append(1))
+    monkeypatch.setattr(settings, "engine_image", IMAGE)
+    monkeypatch.setattr(settings, "pull_image", True)
+    monkeypatch.setattr(settings, "pull_policy", "ttl")
+    monkeypatch.setattr(settings, "pull_in_background", True)
+    pulled_image.images.registry[IMAGE] = "sha256:second"
+
+    assert not ensure_engine_image(pulled_image)
+    assert refreshes == [1]
+    assert pulled_image.images.registry_requests == 0
+
+    assert ensure_engine_image(pulled_image, force=True)
+    assert pulled_image.images.pulled == [IMAGE]
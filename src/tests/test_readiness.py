@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, List
+
+import pytest
+
+from starpack import errors, readiness
+
+
+class FakeEngineContainer:
+    id = "engine"
+
+    def __init__(self, state: Dict[str, Any]) -> None:
+        self.attrs = {"State": state}
+
+    def reload(self) -> None:
+        pass
+
+
+class FakeEventsClient:
+    def __init__(self, events: List[Dict[str, str]]) -> None:
+        self.events_list = events
+
+    def events(self, *args, **kwargs):
+        return iter(self.events_list)
+
+
+def healthy_after(attempts: int):
+    calls = []
+
+    def check_health() -> bool:
+        calls.append(1)
+        return len(calls) >= attempts
+
+    return check_health
+
+
+def test_wait_for_engine_returns_when_healthy():
+    start = perf_counter()
+    latency = readiness.wait_for_engine(healthy_after(3), timeout=5)
+
+    # Two backoff waits of 0.05s and 0.1s rather than whole seconds
+    assert latency < 1
+    assert perf_counter() - start < 1
+
+
+def test_wait_for_engine_times_out():
+    with pytest.raises(errors.EngineInitializationError):
+        readiness.wait_for_engine(lambda: False, timeout=0.2)
+
+
+@pytest.mark.parametrize(
+    "state",
+    [{"Status": "exited"}, {"Status": "running", "Health": {"Status": "unhealthy"}}],
+)
+def test_wait_for_engine_fails_fast_on_broken_container(state):
+    start = perf_counter()
+    with pytest.raises(errors.EngineInitializationError):
+        readiness.wait_for_engine(
+            lambda: False,
+            timeout=30,
+            docker_client=FakeEventsClient([]),
+            container=FakeEngineContainer(state),
+        )
+
+    assert perf_counter() - start < 1
+
+
+def test_engine_watcher_flags_dead_container():
+    watcher = readiness.EngineWatcher(
+        FakeEventsClient([{"status": "start"}, {"status": "die"}]),
+        FakeEngineContainer({"Status": "running"}),
+    )
+    watcher.wait(1)
+
+    for _ in range(100):
+        if watcher.failed:
+            break
+        watcher.wait(0.01)
+    assert watcher.failed
+
+
+def test_record_startup_latency(tmp_path: Path):
+    metrics_file = tmp_path / "metrics" / "startup.jsonl"
+    readiness.record_startup_latency("http://localhost:1976", 0.5, metrics_file)
+    readiness.record_startup_latency("http://localhost:1976", 0.25, metrics_file)
+
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert [record["seconds"] for record in records] == [0.5, 0.25]
+
+
+def test_latency_summary(tmp_path: Path):
+    metrics_file = tmp_path / "startup.jsonl"
+    for seconds, mode in ((3.0, "cold"), (1.0, "cold"), (0.02, "standby")):
+        readiness.record_startup_latency(
+            "http://localhost:1976", seconds, metrics_file, mode
+        )
+    with open(metrics_file, "a") as metrics:
+        metrics.write("not json\n")
+
+    summary = readiness.latency_summary(readiness.load_startup_latencies(metrics_file))
+
+    assert summary["cold"] == {"starts": 2, "median": 2.0, "max": 3.0}
+    assert summary["standby"]["starts"] == 1
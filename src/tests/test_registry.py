@@ -0,0 +1,100 @@
+from pathlib import Path
+from typing import Any, Dict
+
+import docker
+import pytest
+
+from starpack import registry
+from starpack.client import StarpackClient
+
+
+class RegistryContainer:
+    labels = {"app": "starpack-engine"}
+    status = "running"
+
+    def __init__(self, container_id: str) -> None:
+        self.id = container_id
+        self.name = f"starpack-engine-{container_id}"
+        self.attrs = {"Image": "sha256:engine"}
+
+
+class RegistryContainers:
+    def __init__(self, containers: Dict[str, RegistryContainer]) -> None:
+        self.containers = containers
+        self.list_filters: Any = None
+
+    def get(self, container_id: str) -> RegistryContainer:
+        if container_id not in self.containers:
+            raise docker.errors.NotFound("Missing")
+        return self.containers[container_id]
+
+    def list(self, all: bool = False, filters: Any = None):
+        self.list_filters = filters
+        return list(self.containers.values())
+
+
+class RegistryDockerClient:
+    def __init__(self, containers: Dict[str, RegistryContainer]) -> None:
+        self.containers = RegistryContainers(containers)
+
+
+@pytest.fixture(autouse=True)
+def registry_file(tmp_path: Path, monkeypatch) -> Path:
+    registry_path = tmp_path / "engines.json"
+    monkeypatch.setattr(registry, "REGISTRY_FILE", registry_path)
+    return registry_path
+
+
+def test_record_and_forget_engine():
+    registry.record_engine(RegistryContainer("abc"), 1976)
+
+    engines = registry.load_engines()
+    assert engines["abc"]["port"] == "1976"
+    assert engines["abc"]["image"] == "sha256:engine"
+
+    registry.forget_engine("abc")
+    assert registry.load_engines() == {}
+
+
+def test_load_engines_handles_corrupt_registry(registry_file: Path):
+    registry_file.write_text("{not json")
+
+    assert registry.load_engines() == {}
+
+
+def test_connect_registered_engine(requests_mock):
+    requests_mock.get("http://localhost:2001/healthcheck", status_code=200)
+    container = RegistryContainer("abc")
+    registry.record_engine(container, 2001)
+    registry.record_engine(RegistryContainer("gone"), 2002)
+
+    client = StarpackClient()
+    client.docker_client = RegistryDockerClient({"abc": container})
+
+    assert client._connect_registered_engine()
+    assert client.url == "http://localhost:2001"
+    assert client.engine is container
+    assert list(registry.load_engines()) == ["abc"]
+    assert client.docker_client.containers.list_filters is None
+
+
+def test_connect_registered_engine_keeps_port_when_unhealthy(requests_mock):
+    requests_mock.get("http://localhost:2001/healthcheck", status_code=500)
+    container = RegistryContainer("abc")
+    registry.record_engine(container, 2001)
+
+    client = StarpackClient()
+    client.docker_client = RegistryDockerClient({"abc": container})
+
+    assert not client._connect_registered_engine()
+    assert client.port == 1976
+
+
+def test_find_engines_filters_on_label():
+    client = StarpackClient()
+    client.docker_client = RegistryDockerClient({})
+    client._find_engines()
+
+    assert client.docker_client.containers.list_filters == {
+        "label": "app=starpack-engine"
+    }
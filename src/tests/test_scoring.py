@@ -0,0 +1,199 @@
+import json
+from pathlib import Path
+
+import docker
+import pytest
+
+from starpack import core
+from starpack.client import StarpackClient
+from starpack.deploy_plan import DEPLOYMENT_LABEL, PORT_LABEL
+from starpack.errors import (
+    DeploymentNotFoundError,
+    MissingModelError,
+    PredictionFailedError,
+    UnsupportedFormatError,
+)
+from starpack.scoring import BatchScorer
+from starpack.tabular import TableWriter, decode_table, encode_table, read_chunks
+from starpack.testing.fake_docker import FakeDockerClient
+from starpack.testing.model import LocalModel
+from starpack.wire import (
+    ARROW_TYPE,
+    CSV_TYPE,
+    JSON_TYPE,
+    PARQUET_TYPE,
+    negotiate_media_type,
+    parse_value,
+)
+
+
+def write_csv(path: Path, rows: int) -> Path:
+    path.write_text(
+        "id,x,y\n" + "".join(f"{row},{row},{row * 10}\n" for row in range(rows))
+    )
+    return path
+
+
+def test_predictions_come_back_in_order_with_bounded_concurrency(tmp_path: Path):
+    input_path = write_csv(tmp_path / "input.csv", 250)
+
+    # Random latency makes later chunks come back before earlier ones
+    with LocalModel(jitter=0.02) as model:
+        report = core.predict(
+            model.url,
+            input_path,
+            model="model",
+            chunk_rows=10,
+            concurrency=4,
+        )
+
+    lines = (tmp_path / "input_predictions.csv").read_text().splitlines()
+    assert lines[0] == "id,x,y,prediction"
+    assert lines[1:] == [f"{row},{row},{row * 10},{row * 12}" for row in range(250)]
+    assert (report.rows, report.chunks) == (250, 25)
+    assert 1 < model.max_in_flight <= 4
+
+
+def test_failed_chunks_are_retried(tmp_path: Path):
+    input_path = write_csv(tmp_path / "input.csv", 30)
+
+    with LocalModel(fail_requests=2) as model, BatchScorer(
+        model.predict_url, concurrency=1, retries=3
+    ) as scorer, TableWriter(tmp_path / "output.jsonl") as writer:
+        report = scorer.score(read_chunks(input_path, 10), writer)
+
+    assert (report.rows, report.retries) == (30, 2)
+    records = [
+        json.loads(line)
+        for line in (tmp_path / "output.jsonl").read_text().splitlines()
+    ]
+    assert records[29] == {"id": 29, "x": 29, "y": 290, "prediction": 348}
+
+    with LocalModel(fail_requests=5) as model, BatchScorer(
+        model.predict_url, retries=1
+    ) as scorer, TableWriter(tmp_path / "failed.csv") as writer:
+        with pytest.raises(PredictionFailedError):
+            scorer.score(read_chunks(input_path, 10), writer)
+
+
+def test_predict_a_local_deployment_from_json_lines(tmp_path: Path, monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    input_path = tmp_path / "input.jsonl"
+    input_path.write_text(
+        "".join(json.dumps({"x": row, "y": 1.5}) + "\n" for row in range(5))
+    )
+
+    with LocalModel(name="iris") as model:
+        docker_client.containers.run(
+            "registry.example.com/iris:latest",
+            labels={DEPLOYMENT_LABEL: "iris_deployment", PORT_LABEL: str(model.port)},
+        )
+        client = StarpackClient(docker=True)
+
+        core.predict(
+            "iris_deployment",
+            input_path,
+            output_path=tmp_path / "output.csv",
+            client=client,
+        )
+
+        with pytest.raises(DeploymentNotFoundError):
+            core.predict("missing_deployment", input_path, client=client)
+        with pytest.raises(MissingModelError):
+            core.predict(model.url, input_path)
+
+    assert (tmp_path / "output.csv").read_text().splitlines()[1:3] == [
+        "0,1.5,1.5",
+        "1,1.5,2.5",
+    ]
+    with pytest.raises(UnsupportedFormatError):
+        core.predict("http://localhost/models/predict/iris", tmp_path / "input.xlsx")
+
+
+@pytest.mark.parametrize("media_type", [JSON_TYPE, ARROW_TYPE, PARQUET_TYPE])
+def test_typed_wire_formats_keep_column_types(media_type: str):
+    if media_type != JSON_TYPE:
+        pytest.importorskip("pyarrow")
+    columns = ["id", "chol", "name", "mixed"]
+    rows = [["1", "233.5", "a", "1"], ["2", "", "b", "x"]]
+
+    data = encode_table(columns, rows, media_type)
+
+    assert decode_table(data, f"{media_type}; charset=utf-8") == (
+        columns,
+        [[1, 233.5, "a", "1" if media_type != JSON_TYPE else 1], [2, None, "b", "x"]],
+    )
+
+
+def test_content_negotiation():
+    supported = [CSV_TYPE, JSON_TYPE, ARROW_TYPE]
+
+    assert (
+        negotiate_media_type(f"{ARROW_TYPE}, {CSV_TYPE};q=0.5", supported) == ARROW_TYPE
+    )
+    assert (
+        negotiate_media_type(f"{PARQUET_TYPE}, {CSV_TYPE};q=0.5", supported) == CSV_TYPE
+    )
+    assert negotiate_media_type("*/*", supported) == CSV_TYPE
+    assert negotiate_media_type(f"{JSON_TYPE};q=0.9, */*;q=0.1", supported) == JSON_TYPE
+    assert negotiate_media_type("", supported) == CSV_TYPE
+
+
+def test_arrow_chunks_fall_back_to_csv_for_older_deployments(tmp_path: Path):
+    pytest.importorskip("pyarrow")
+    input_path = write_csv(tmp_path / "input.csv", 30)
+
+    with LocalModel() as model:
+        core.predict(model.predict_url, input_path, chunk_rows=10, wire_format="arrow")
+    assert model.media_types == [(ARROW_TYPE, ARROW_TYPE)] * 3
+
+    with LocalModel(formats=[CSV_TYPE]) as model:
+        core.predict(
+            model.predict_url,
+            input_path,
+            output_path=tmp_path / "output.parquet",
+            chunk_rows=10,
+            concurrency=1,
+            wire_format="arrow",
+        )
+    # The first chunk is rejected, and sent again as CSV like the others
+    assert model.requests == 4
+    assert model.media_types == [(CSV_TYPE, CSV_TYPE)] * 3
+    last = list(read_chunks(tmp_path / "output.parquet", 30))[0].rows[-1]
+    assert last == [29, 29, 290, 348]
+
+
+def test_parquet_columns_whose_type_changes_between_chunks(tmp_path: Path):
+    pytest.importorskip("pyarrow")
+    output_path = tmp_path / "output.parquet"
+
+    with TableWriter(output_path) as writer:
+        writer.write(["id", "score", "note", "code"], [["1", "1", "", "7"]])
+        writer.write(["id", "score", "note", "code"], [["2", "1.5", "late", "x"]])
+        writer.write(["id", "score", "note", "code"], [["3", "2", "", "9"]])
+
+    (chunk,) = read_chunks(output_path, 10)
+    assert chunk.rows == [
+        [1, 1.0, None, "7"],
+        [2, 1.5, "late", "x"],
+        [3, 2.0, None, "9"],
+    ]
+    assert not list(tmp_path.glob("tmp*"))
+
+
+def test_only_plain_numbers_are_parsed():
+    assert [parse_value(value) for value in ("7", "-3", "1.5", "2e3", ".5")] == [
+        7,
+        -3,
+        1.5,
+        2000.0,
+        0.5,
+    ]
+    assert [parse_value(value) for value in ("1_000", " 7 ", "007", "nan", "")] == [
+        "1_000",
+        " 7 ",
+        "007",
+        "nan",
+        None,
+    ]
@@ -0,0 +1,107 @@
+import docker
+import pytest
+
+from starpack import client as client_module
+from starpack import core, readiness
+from starpack._config import settings
+from starpack.client import ENGINE_PREFIX, STANDBY_PREFIX, StarpackClient
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+IMAGE = "starpack/starpack-engine:latest"
+
+
+@pytest.fixture
+def docker_client(monkeypatch) -> FakeDockerClient:
+    docker_client = FakeDockerClient()
+    docker_client.images.pull(IMAGE)
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    monkeypatch.setattr(settings, "engine_image", IMAGE)
+    monkeypatch.setattr(settings, "pull_image", False)
+    monkeypatch.setattr(settings, "engine_startup_timeout", 5.0)
+    return docker_client
+
+
+@pytest.fixture
+def detached(monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        client_module, "run_detached", lambda *args: commands.append(args)
+    )
+    return commands
+
+
+@pytest.fixture
+def engine(docker_client: FakeDockerClient):
+    with LocalEngine() as engine:
+        docker_client.engine_ports.append(engine.port)
+        yield engine
+
+
+def test_paused_standby_is_promoted(
+    engine: LocalEngine, docker_client: FakeDockerClient, detached, monkeypatch
+):
+    monkeypatch.setattr(settings, "engine_standby", "paused")
+    standby = StarpackClient(docker=True).prepare_standby()
+
+    assert standby.status == "paused"
+    assert standby.name.startswith(STANDBY_PREFIX)
+    assert StarpackClient(docker=True).prepare_standby() is standby
+
+    client = StarpackClient(start=True, docker=True)
+
+    assert client.engine is standby and standby.status == "running"
+    assert standby.name.startswith(ENGINE_PREFIX)
+    assert not standby.name.startswith(STANDBY_PREFIX)
+    assert client.port == str(engine.port)
+    assert detached == [("engine", "standby")]
+    assert readiness.load_startup_latencies()[-1]["mode"] == "standby"
+
+
+def test_created_standby_claims_engine_port(
+    engine: LocalEngine, docker_client: FakeDockerClient, detached, monkeypatch
+):
+    monkeypatch.setattr(settings, "engine_standby", "created")
+    docker_client.engine_ports.clear()
+    standby = StarpackClient(port=engine.port, docker=True).prepare_standby()
+
+    assert standby.status == "created"
+
+    client = StarpackClient(port=engine.port, start=True, docker=True)
+
+    assert client.engine is standby and standby.status == "running"
+
+
+def test_outdated_standby_is_replaced(
+    engine: LocalEngine, docker_client: FakeDockerClient, detached, monkeypatch
+):
+    monkeypatch.setattr(settings, "engine_standby", "created")
+    client = StarpackClient(docker=True)
+    outdated = client.prepare_standby()
+
+    docker_client.images.registry[IMAGE] = "sha256:newer"
+    docker_client.images.pull(IMAGE)
+
+    assert not client._promote_standby()
+    replacement = client.prepare_standby()
+    assert replacement is not outdated
+    assert outdated.status == "removed"
+
+    monkeypatch.setattr(settings, "engine_standby", "off")
+    assert client.prepare_standby() is None
+    assert replacement.status == "removed"
+
+
+def test_engine_status(engine: LocalEngine, detached, monkeypatch, capsys):
+    monkeypatch.setattr(settings, "engine_standby", "paused")
+    client = StarpackClient(docker=True)
+    client.prepare_standby()
+    readiness.record_startup_latency("http://localhost:1976", 2.0, mode="cold")
+    readiness.record_startup_latency("http://localhost:1976", 0.01, mode="standby")
+
+    core.engine_status(client)
+
+    output = capsys.readouterr().out
+    assert "standby" in output and "paused" in output
+    assert "2000ms" in output and "10ms" in output
+    assert "Last start: 10ms from standby" in output
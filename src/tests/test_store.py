@@ -0,0 +1,143 @@
+from pathlib import Path
+
+import pytest
+
+from starpack import manifest
+from starpack.client import StarpackClient
+from starpack.store import StoreIndex, blob_path, format_size, parse_size
+from starpack.testing.fake_docker import FakeDockerClient
+
+ARTIFACTS = "/app/engine/external/artifacts"
+
+
+@pytest.fixture
+def client(tmp_path: Path, monkeypatch) -> StarpackClient:
+    monkeypatch.setattr(manifest, "MANIFEST_DIR", tmp_path / "manifests")
+    docker_client = FakeDockerClient()
+    client = StarpackClient()
+    client.docker_client = docker_client
+    docker_client.volumes.create(client.volumes["artifacts"]["host"])
+    client.engine = docker_client.containers.run(
+        "engine",
+        volumes={
+            client.volumes["artifacts"]["host"]: {"bind": ARTIFACTS, "mode": "rw"}
+        },
+    )
+    return client
+
+
+def make_project(root: Path, name: str, files) -> Path:
+    project = root / name
+    for file_name, contents in files.items():
+        (project / file_name).parent.mkdir(parents=True, exist_ok=True)
+        (project / file_name).write_bytes(contents)
+    return project
+
+
+def test_identical_files_are_stored_once(client: StarpackClient, tmp_path: Path):
+    model = b"\x01" * 1024 * 1024
+    first = make_project(tmp_path, "first", {"model.bin": model, "predict.py": b"a"})
+    second = make_project(tmp_path, "second", {"model.bin": model, "predict.py": b"b"})
+
+    client.upload_artifacts(first)
+    received = client.engine.bytes_received
+    client.upload_artifacts(second)
+
+    files = client.engine.files
+    assert files[f"{ARTIFACTS}/second/model.bin"] == model
+    assert client.engine.bytes_received - received < len(model)
+
+    store = client._fetch_store_index()
+    assert sorted(store.projects) == ["first", "second"]
+    assert len(store.blobs) == 3
+
+
+def test_stale_index_falls_back_to_full_upload(
+    client: StarpackClient, tmp_path: Path, capsys
+):
+    project = make_project(tmp_path, "project", {"model.bin": b"model"})
+    client.upload_artifacts(project)
+
+    sha256 = manifest.hash_file(project / "model.bin")
+    del client.engine.files[f"{ARTIFACTS}/{blob_path(sha256)}"]
+
+    # The index still lists the blob, but linking to it fails, so it is sent again
+    client.upload_artifacts(make_project(tmp_path, "other", {"copy.bin": b"model"}))
+    assert "out of date" in capsys.readouterr().out
+    assert client.engine.files[f"{ARTIFACTS}/other/copy.bin"] == b"model"
+
+
+def test_gc_evicts_least_recently_used_unreferenced_blobs():
+    store = StoreIndex()
+    store.record_project("old", {"a": {"sha256": "a", "size": 10}}, now=1)
+    store.record_project("newer", {"b": {"sha256": "b", "size": 10}}, now=2)
+    store.record_project("current", {"c": {"sha256": "c", "size": 10}}, now=3)
+    # Both projects moved on, leaving "a" and "b" unreferenced
+    store.record_project("old", {"c": {"sha256": "c", "size": 10}}, now=4)
+    store.record_project("newer", {"c": {"sha256": "c", "size": 10}}, now=4)
+
+    assert store.plan_gc(max_size=20) == ["a"]
+    assert store.plan_gc(max_size=0) == ["a", "b"]
+
+
+def test_gc_removes_blobs_and_reports_usage(
+    client: StarpackClient, tmp_path: Path, capsys
+):
+    project = make_project(tmp_path, "project", {"model.bin": b"v1" * 100})
+    client.upload_artifacts(project)
+    (project / "model.bin").write_bytes(b"v2" * 100)
+    client.upload_artifacts(project)
+    old_blob = f"{ARTIFACTS}/{blob_path(manifest.hash_file(project / 'model.bin'))}"
+
+    assert len(client.collect_garbage(max_size=10, dry_run=True)) == 1
+    evicted = client.collect_garbage(max_size=10)
+
+    output = capsys.readouterr().out
+    assert "Removed 1 unreferenced blobs" in output
+    assert "over its quota" in output
+    assert f"{ARTIFACTS}/{blob_path(evicted[0])}" not in client.engine.files
+    assert old_blob in client.engine.files
+    assert evicted[0] not in client._fetch_store_index().blobs
+
+
+def test_usage_counts_unique_blobs():
+    store = StoreIndex()
+    shared = {"sha256": "shared", "size": 100}
+    store.record_project("a", {"m": shared, "x": {"sha256": "x", "size": 5}})
+    store.record_project("b", {"m": shared})
+
+    usage = {project.name: project for project in store.usage()}
+    assert (usage["a"].size, usage["a"].unique_size) == (105, 5)
+    assert (usage["b"].size, usage["b"].unique_size) == (100, 0)
+
+
+@pytest.mark.parametrize(
+    "size,expected",
+    [("1024", 1024), ("10GB", 10 * 1024**3), ("1.5m", 1572864), ("512 KiB", 524288)],
+)
+def test_parse_size(size: str, expected: int):
+    assert parse_size(size) == expected
+
+
+def test_parse_size_invalid():
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_format_size():
+    assert format_size(512) == "512 B"
+    assert format_size(1536) == "1.5 KB"
+
+
+def test_terminate_all_removes_artifacts_volume(
+    client: StarpackClient, tmp_path: Path, monkeypatch
+):
+    monkeypatch.setattr("starpack.registry.REGISTRY_FILE", tmp_path / "engines.json")
+    monkeypatch.setattr("docker.from_env", lambda: client.docker_client)
+    client.upload_artifacts(make_project(tmp_path, "project", {"model.bin": b"m"}))
+
+    client.terminate(all=True)
+
+    volume = client.docker_client.volumes.get(client.volumes["artifacts"]["host"])
+    assert volume.removed
+    assert client.engine.files == {}
@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import docker
+import pytest
+
+from starpack import core
+from starpack.archive import TarStream
+from starpack.testing.engine import LocalEngine
+from starpack.testing.fake_docker import FakeDockerClient
+
+payload = """
+package:
+  metadata:
+    name: harness_test
+  steps:
+    - name: fastapi
+deployment:
+  metadata:
+    name: harness_deployment
+"""
+
+
+@pytest.fixture
+def docker_client(monkeypatch) -> FakeDockerClient:
+    docker_client = FakeDockerClient()
+    monkeypatch.setattr(docker, "from_env", lambda: docker_client)
+    return docker_client
+
+
+def test_fake_docker_filters_labels(docker_client: FakeDockerClient):
+    docker_client.add_unrelated_containers(3)
+    engine = docker_client.containers.run("engine", labels={"app": "starpack-engine"})
+
+    assert docker_client.containers.list(filters={"label": "app=starpack-engine"}) == [
+        engine
+    ]
+    assert len(docker_client.containers.list(filters={"label": "app"})) == 4
+
+
+def test_fake_container_archives(tmp_path: Path):
+    docker_client = FakeDockerClient()
+    docker_client.volumes.create("artifacts")
+    container = docker_client.containers.run("engine", volumes={"artifacts": {}})
+
+    container.put_archive("/data", iter(TarStream([("project/a.txt", b"a")])))
+    stream, _ = container.get_archive("/data/project/a.txt")
+    container.exec_run(["rm", "-f", "--", "a.txt"], workdir="/data/project")
+
+    assert b"".join(stream)
+    assert docker_client.volumes.get("artifacts").files == {}
+    with pytest.raises(docker.errors.NotFound):
+        container.get_archive("/data/project/a.txt")
+
+
+def test_deploy_directory_against_local_engine(
+    docker_client: FakeDockerClient, tmp_path: Path
+):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "starpack.yaml").write_text(payload)
+    (project / "predict.py").write_text("def predict(): ...")
+
+    with LocalEngine(latency=0.001) as engine:
+        docker_client.add_engine(engine)
+        core.deploy_directory(project)
+
+    posted = [path for method, path, _ in engine.requests if method == "POST"]
+    volume = docker_client.volumes.get("starpack-model-artifacts")
+    assert posted == ["/jobs/package", "/deploy"]
+    assert "/app/engine/external/artifacts/project/predict.py" in volume.files
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+import typer
+
+from starpack import uploads
+from starpack.client import StarpackClient
+from starpack.testing.engine import LocalEngine
+
+CHUNK_SIZE = 1024
+
+
+@pytest.fixture(autouse=True)
+def chunk_size(monkeypatch) -> None:
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", CHUNK_SIZE)
+
+
+@pytest.fixture
+def project_dir(tmp_path: Path) -> Path:
+    project = tmp_path / "project"
+    (project / "models").mkdir(parents=True)
+    (project / "predict.py").write_text("def predict(): ...")
+    (project / "models" / "model.joblib").write_bytes(bytes(range(256)) * 40)
+    return project
+
+
+def remote_client(engine: LocalEngine) -> StarpackClient:
+    return StarpackClient(host=engine.url, port=None)
+
+
+def chunk_puts(engine: LocalEngine):
+    return [path for method, path, _ in engine.requests if "/chunks/" in path]
+
+
+def test_remote_upload(project_dir: Path):
+    with LocalEngine() as engine:
+        client = remote_client(engine)
+        client.upload_artifacts(project_dir)
+
+        uploaded = engine.artifacts_dir / "project"
+        assert (uploaded / "predict.py").read_text() == "def predict(): ..."
+        assert (uploaded / "models" / "model.joblib").read_bytes() == (
+            project_dir / "models" / "model.joblib"
+        ).read_bytes()
+        assert len(chunk_puts(engine)) == 10
+
+        (project_dir / "predict.py").unlink()
+        requests_before = len(engine.requests)
+        client.upload_artifacts(project_dir)
+
+        assert not (uploaded / "predict.py").exists()
+        assert not [
+            request
+            for request in engine.requests[requests_before:]
+            if request[0] == "PUT"
+        ]
+        assert sorted(engine.store.projects) == ["project"]
+
+
+def test_interrupted_upload_resumes(project_dir: Path):
+    with LocalEngine(fail_chunks_after=4) as engine:
+        client = remote_client(engine)
+        with pytest.raises(typer.Exit):
+            client.upload_artifacts(project_dir)
+
+        first_attempt = len(chunk_puts(engine))
+        assert list(uploads.UPLOADS_DIR.iterdir())
+
+        engine.fail_chunks_after = None
+        client.upload_artifacts(project_dir)
+
+        resumed = chunk_puts(engine)[first_attempt:]
+        model = engine.artifacts_dir / "project" / "models" / "model.joblib"
+        assert len(resumed) == 10 - 4
+        assert (
+            model.read_bytes() == (project_dir / "models" / "model.joblib").read_bytes()
+        )
+        assert not list(uploads.UPLOADS_DIR.iterdir())
+
+
+def test_corrupted_chunks_are_sent_again(project_dir: Path):
+    with LocalEngine(corrupt_chunks=2) as engine:
+        remote_client(engine).upload_artifacts(project_dir)
+
+        model = engine.artifacts_dir / "project" / "models" / "model.joblib"
+        assert len(chunk_puts(engine)) == 12
+        assert (
+            model.read_bytes() == (project_dir / "models" / "model.joblib").read_bytes()
+        )
+
+
+def test_remote_engine_without_uploads(project_dir: Path):
+    with LocalEngine(uploads=False) as engine:
+        with pytest.raises(typer.Exit):
+            remote_client(engine).upload_artifacts(project_dir)